@@ -0,0 +1,304 @@
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+from starlette.responses import JSONResponse
+from starlette.routing import Match
+
+from . import config
+from .auth import load_user
+from .cache import TTLCache
+from .database import SessionLocal
+
+# Admission control in front of the routers, so one tenant's bulk script cannot
+# take every database connection of the process. Requests are keyed by the
+# caller's tenant, resolved from the user-id header through the auth cache,
+# and by route template. Each tenant has a token bucket and a number of
+# requests it may run at once, and each route a number of requests across all
+# tenants; a request over a concurrency limit waits in a bounded queue until a
+# slot frees up or its deadline passes. Limits and counters are per process.
+
+# Probes, metrics and the long-lived /events streams are never limited.
+EXEMPT_PATHS = ("/healthz", "/readyz", "/metrics", "/events")
+
+# Seconds a client is told to wait after being turned away by a queue.
+QUEUE_RETRY_AFTER = 1
+
+ANONYMOUS = "anonymous"
+
+# user-id headers that matched no user, so made-up ids cost no query before the
+# request is admitted. A user created since is limited as anonymous until its
+# entry expires; the handler looks the caller up again either way.
+_unknown_users = TTLCache(maxsize=config.AUTH_CACHE_SIZE, ttl=config.AUTH_CACHE_TTL)
+
+
+class TokenBucket:
+    # rate tokens per second, up to burst of them saved.
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+
+    def take(self) -> float:
+        # Takes a token; returns 0, or the seconds until one is available.
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+
+class Slots:
+    # At most limit holders at once, and at most queue_size waiting for a slot
+    # in arrival order. A released slot is handed to the oldest waiter.
+
+    def __init__(self, limit: int, queue_size: int):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self, timeout: float) -> Optional[str]:
+        # None once a slot is held, otherwise why none was: "queue_full" or
+        # "timeout".
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return None
+        if len(self._waiters) >= self.queue_size or timeout <= 0:
+            return "queue_full"
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self._abandon(future)
+            return "timeout"
+        except BaseException:
+            self._abandon(future)
+            raise
+        return None
+
+    def _abandon(self, future: asyncio.Future) -> None:
+        if future.done() and not future.cancelled():
+            # The slot was handed over as the wait ended; pass it on.
+            self.release()
+            return
+        future.cancel()
+        try:
+            self._waiters.remove(future)
+        except ValueError:
+            pass
+
+    def release(self) -> None:
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+
+class Admission:
+    # The buckets and slots of one process, created for tenants and routes as
+    # they are first seen, and the outcome counters reported at
+    # /healthz/admission and /metrics.
+
+    def __init__(
+        self,
+        tenant_rate: float,
+        tenant_burst: int,
+        tenant_concurrency: int,
+        route_concurrency: int,
+        queue_size: int,
+        queue_timeout: float,
+    ):
+        self.tenant_rate = tenant_rate
+        self.tenant_burst = tenant_burst
+        self.tenant_concurrency = tenant_concurrency
+        self.route_concurrency = route_concurrency
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._tenants: Dict[str, Slots] = {}
+        self._routes: Dict[str, Slots] = {}
+        self._lock = threading.Lock()
+        self._outcomes: Dict[Tuple[str, str], int] = {}
+
+    def _count(self, outcome: str, reason: str = "") -> None:
+        with self._lock:
+            key = (outcome, reason)
+            self._outcomes[key] = self._outcomes.get(key, 0) + 1
+
+    async def enter(self, tenant: str, route: Optional[str]):
+        # The slots held for the request, to be passed to leave; or the
+        # response turning it away.
+        if self.tenant_rate > 0:
+            bucket = self._buckets.get(tenant)
+            if bucket is None:
+                bucket = self._buckets[tenant] = TokenBucket(
+                    self.tenant_rate, self.tenant_burst
+                )
+            wait = bucket.take()
+            if wait:
+                return self._reject(429, "tenant_rate", math.ceil(wait))
+
+        deadline = time.monotonic() + self.queue_timeout
+        held = []
+        for kind, limits, key, limit, status in (
+            ("tenant", self._tenants, tenant, self.tenant_concurrency, 429),
+            ("route", self._routes, route, self.route_concurrency, 503),
+        ):
+            if limit <= 0 or key is None:
+                continue
+            slots = limits.get(key)
+            if slots is None:
+                slots = limits[key] = Slots(limit, self.queue_size)
+            queued = slots.active >= slots.limit or slots.waiting > 0
+            failure = await slots.acquire(deadline - time.monotonic())
+            if failure is not None:
+                self.leave(held)
+                return self._reject(status, f"{kind}_{failure}", QUEUE_RETRY_AFTER)
+            if queued:
+                self._count("queued", kind)
+            held.append(slots)
+
+        self._count("admitted")
+        return held
+
+    def leave(self, held) -> None:
+        for slots in reversed(held):
+            slots.release()
+
+    def _reject(self, status: int, reason: str, retry_after: int) -> JSONResponse:
+        self._count("rejected", reason)
+        detail = "Too many requests" if status == 429 else "Server busy"
+        return JSONResponse(
+            status_code=status,
+            content={"detail": f"{detail}, retry later"},
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            outcomes = dict(self._outcomes)
+        busiest = sorted(
+            self._tenants.items(), key=lambda item: item[1].active, reverse=True
+        )
+        return {
+            "admitted": outcomes.get(("admitted", ""), 0),
+            "queued": {
+                reason: count
+                for (outcome, reason), count in outcomes.items()
+                if outcome == "queued"
+            },
+            "rejected": {
+                reason: count
+                for (outcome, reason), count in outcomes.items()
+                if outcome == "rejected"
+            },
+            "tenants": {
+                key: {"active": slots.active, "waiting": slots.waiting}
+                for key, slots in busiest[:10]
+                if slots.active or slots.waiting
+            },
+            "routes": {
+                key: {"active": slots.active, "waiting": slots.waiting}
+                for key, slots in sorted(self._routes.items())
+                if slots.active or slots.waiting
+            },
+        }
+
+    def render(self) -> str:
+        with self._lock:
+            outcomes = sorted(self._outcomes.items())
+        lines = [
+            "# HELP admission_requests_total Requests admitted, queued and rejected "
+            "by admission control.",
+            "# TYPE admission_requests_total counter",
+        ]
+        for (outcome, reason), count in outcomes:
+            labels = f'outcome="{outcome}"'
+            if reason:
+                labels += f',reason="{reason}"'
+            lines.append(f"admission_requests_total{{{labels}}} {count}")
+        return "\n".join(lines) + "\n"
+
+
+admission = Admission(
+    tenant_rate=config.ADMISSION_TENANT_RATE,
+    tenant_burst=config.ADMISSION_TENANT_BURST,
+    tenant_concurrency=config.ADMISSION_TENANT_CONCURRENCY,
+    route_concurrency=config.ADMISSION_ROUTE_CONCURRENCY,
+    queue_size=config.ADMISSION_QUEUE_SIZE,
+    queue_timeout=config.ADMISSION_QUEUE_TIMEOUT,
+)
+
+
+async def caller_tenant(scope) -> str:
+    # The caller's tenant, or the user for callers without one. Anonymous and
+    # unknown callers share one key; the handler answers the latter with 404.
+    value = dict(scope["headers"]).get(b"user-id")
+    if value is None or not value.isdigit():
+        return ANONYMOUS
+    user_id = int(value)
+    if _unknown_users.get(user_id):
+        return ANONYMOUS
+    async with SessionLocal() as db:
+        user = await load_user(db, user_id)
+    if user is None:
+        _unknown_users.set(user_id, True)
+        return ANONYMOUS
+    if user.tenant_id is None:
+        return f"user:{user.id}"
+    return f"tenant:{user.tenant_id}"
+
+
+def matched_route(scope):
+    # The route the request will reach, if any.
+    for route in scope["app"].router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route
+    return None
+
+
+class AdmissionMiddleware:
+    # Slots are held until the response body has been sent, so streamed
+    # exports count against their limits for as long as they read.
+
+    def __init__(self, app, admission: Admission = admission):
+        self.app = app
+        self.admission = admission
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(EXEMPT_PATHS):
+            await self.app(scope, receive, send)
+            return
+
+        route = matched_route(scope)
+        result = await self.admission.enter(
+            await caller_tenant(scope),
+            f"{scope['method']} {route.path}" if route is not None else None,
+        )
+        if isinstance(result, JSONResponse):
+            # Routing never runs for the request, so the route it was turned
+            # away from is set here for the request metrics.
+            if route is not None:
+                scope["route"] = route
+            await result(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.admission.leave(result)
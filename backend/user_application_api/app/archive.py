@@ -0,0 +1,226 @@
+import argparse
+import asyncio
+import logging
+import time
+from datetime import date, datetime
+from typing import Optional
+
+from sqlalchemy import delete, func, literal, select
+from sqlalchemy.exc import IntegrityError
+
+from . import config
+from .database import (
+    Application,
+    ApplicationStatus,
+    ArchivedApplication,
+    SessionLocal,
+    engine,
+    month_key,
+)
+
+logger = logging.getLogger(__name__)
+
+# Nearly all reads are of recent months, so completed applications older than
+# the horizon are moved to applications_archive, keeping the hot table and its
+# indexes small. Rows keep their ids and versions, and every list read that can
+# reach a month before the horizon reads both tables in one statement, so a
+# move changes no response and bumps no change version. Archived applications
+# are read-only through the API.
+#
+#     python -m app.archive
+
+_hot = Application.__table__
+_archive = ArchivedApplication.__table__
+COLUMNS = (
+    "id",
+    "application_date",
+    "application_month",
+    "version",
+    "target_product",
+    "status",
+    "user_id",
+)
+
+
+def archive_horizon(today: Optional[date] = None) -> Optional[date]:
+    # First day of the oldest month kept whole in the hot table; None when
+    # archiving is off.
+    months = config.ARCHIVE_AFTER_MONTHS
+    if months <= 0:
+        return None
+    today = today or date.today()
+    index = today.year * 12 + today.month - 1 - months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def reads_archive(month: Optional[int]) -> bool:
+    # Whether applications of the month, a month_key or None for every month,
+    # can be in the archive. Rows archived before archiving was turned off
+    # stay there, so then every month is read from both tables.
+    horizon = archive_horizon()
+    return horizon is None or month is None or month < month_key(horizon)
+
+
+async def _move(source, target, conditions, batch_size: int) -> int:
+    # Moves up to batch_size rows matching conditions in one transaction.
+    async with SessionLocal() as db:
+        ids = (
+            await db.scalars(
+                select(source.c.id)
+                .filter(*conditions)
+                .order_by(source.c.application_date, source.c.id)
+                .limit(batch_size)
+                # Concurrent movers on PostgreSQL and MySQL take different rows.
+                .with_for_update(skip_locked=True)
+            )
+        ).all()
+        if not ids:
+            return 0
+
+        columns = [source.c[name] for name in COLUMNS]
+        names = list(COLUMNS)
+        if target is _archive:
+            columns.append(literal(datetime.now()))
+            names.append("archived_at")
+        await db.execute(
+            target.insert().from_select(
+                names, select(*columns).filter(source.c.id.in_(ids))
+            )
+        )
+        await db.execute(delete(source).filter(source.c.id.in_(ids)))
+        await db.commit()
+        return len(ids)
+
+
+class Archiver:
+    # Moves completed applications across the horizon in throttled batches,
+    # and moves rows back when the horizon is raised, every interval seconds
+    # starting at startup.
+
+    def __init__(self, batch_size: int, pause: float, interval: float):
+        self.batch_size = batch_size
+        self.pause = pause
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self._runs = 0
+        self._archived = 0
+        self._restored = 0
+        self._failures = 0
+        self._last_run_ms = 0.0
+
+    async def _drain(self, source, target, conditions) -> int:
+        moved = 0
+        while True:
+            count = await _move(source, target, conditions, self.batch_size)
+            moved += count
+            if count < self.batch_size:
+                return moved
+            # Leaves room for request traffic between batches.
+            await asyncio.sleep(self.pause)
+
+    async def run(self) -> int:
+        horizon = archive_horizon()
+        if horizon is None:
+            return 0
+        started = time.perf_counter()
+        # The newest id stays in the hot table, so a database that hands out
+        # max(id) + 1 (SQLite, MySQL before 8.0 after a restart) never reuses
+        # an archived id.
+        newest = select(func.max(_hot.c.id)).scalar_subquery()
+        try:
+            archived = await self._drain(
+                _hot,
+                _archive,
+                [
+                    _hot.c.status == ApplicationStatus.COMPLETED,
+                    _hot.c.application_date < horizon,
+                    _hot.c.id < newest,
+                ],
+            )
+            restored = await self._drain(
+                _archive,
+                _hot,
+                [
+                    _archive.c.application_date >= horizon,
+                ],
+            )
+        except IntegrityError:
+            # Another process moved the same rows first (SQLite has no
+            # SKIP LOCKED); the next run continues where it left off.
+            logger.info("Archive batch already moved by another process")
+            return 0
+        except Exception:
+            self._failures += 1
+            logger.exception("Archiving applications failed")
+            return 0
+
+        self._runs += 1
+        self._archived += archived
+        self._restored += restored
+        self._last_run_ms = (time.perf_counter() - started) * 1000
+        if archived or restored:
+            logger.info(
+                "Archived %d applications, restored %d (horizon %s)",
+                archived,
+                restored,
+                horizon,
+            )
+        return archived + restored
+
+    async def _loop(self) -> None:
+        while True:
+            await self.run()
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        horizon = archive_horizon()
+        return {
+            "horizon": horizon.isoformat() if horizon else None,
+            "runs": self._runs,
+            "archived": self._archived,
+            "restored": self._restored,
+            "failures": self._failures,
+            "last_run_ms": round(self._last_run_ms, 3),
+        }
+
+
+archiver = Archiver(
+    batch_size=config.ARCHIVE_BATCH_SIZE,
+    pause=config.ARCHIVE_BATCH_PAUSE,
+    interval=config.ARCHIVE_INTERVAL,
+)
+
+
+async def _main(batch_size: int, pause: float) -> None:
+    archiver.batch_size = batch_size
+    archiver.pause = pause
+    moved = await archiver.run()
+    await engine.dispose()
+    print(f"Moved {moved} applications across the horizon {archive_horizon()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Move applications across the archive horizon once."
+    )
+    parser.add_argument("--batch-size", type=int, default=config.ARCHIVE_BATCH_SIZE)
+    parser.add_argument("--pause", type=float, default=config.ARCHIVE_BATCH_PAUSE)
+    args = parser.parse_args()
+    asyncio.run(_main(args.batch_size, args.pause))
+
+
+if __name__ == "__main__":
+    main()
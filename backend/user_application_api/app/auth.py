@@ -0,0 +1,83 @@
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import Depends, Header, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import config
+from .cache import TTLCache
+from .database import User, UserType, get_db
+
+
+@dataclass(frozen=True)
+class CurrentUser:
+    # Identity and role of the caller. Shared between requests through the
+    # cache, so it is immutable and carries no ORM state.
+    id: int
+    tenant_id: Optional[int]
+    project: str
+    user_type: str
+
+
+_user_cache = TTLCache(maxsize=config.AUTH_CACHE_SIZE, ttl=config.AUTH_CACHE_TTL)
+
+
+def invalidate_user(user_id: int) -> None:
+    _user_cache.delete(user_id)
+
+
+def auth_cache_stats() -> dict:
+    return _user_cache.stats()
+
+
+async def load_user(db: AsyncSession, user_id: int) -> Optional[CurrentUser]:
+    user = _user_cache.get(user_id)
+    if user is None:
+        row = (
+            await db.execute(
+                select(User.id, User.tenant_id, User.project, User.user_type).filter(
+                    User.id == user_id
+                )
+            )
+        ).first()
+        if row is None:
+            return None
+        user = CurrentUser(*row)
+        _user_cache.set(user_id, user)
+    return user
+
+
+async def get_current_user(
+    current_user_id: Optional[int] = Header(None, alias="user-id"),
+    db: AsyncSession = Depends(get_db),
+) -> Optional[CurrentUser]:
+    if current_user_id is None:
+        return None
+
+    user = await load_user(db, current_user_id)
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
+
+
+async def check_admin_permission(current_user: CurrentUser = Depends(get_current_user)):
+    if current_user is None:
+        raise HTTPException(status_code=401, detail="Authentication required")
+
+    if current_user.user_type not in [UserType.SUPERADMIN, UserType.PROJECT_ADMIN]:
+        raise HTTPException(status_code=403, detail="Admin permission required")
+
+    return current_user
+
+
+async def check_superadmin_permission(
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    if current_user is None:
+        raise HTTPException(status_code=401, detail="Authentication required")
+
+    if current_user.user_type != UserType.SUPERADMIN:
+        raise HTTPException(status_code=403, detail="Super admin permission required")
+
+    return current_user
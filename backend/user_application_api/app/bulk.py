@@ -0,0 +1,93 @@
+import json
+from typing import Any, List, Optional, Type, Union
+
+from fastapi import HTTPException, Request
+from pydantic import BaseModel, ValidationError
+
+from . import config
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+class BulkItemResult(BaseModel):
+    index: int
+    status: str
+    id: Optional[int] = None
+    detail: Optional[str] = None
+
+
+class BulkResponse(BaseModel):
+    succeeded: int
+    failed: int
+    items: List[BulkItemResult]
+
+
+class BulkResults:
+    # Collects one result per input item, in input order.
+
+    def __init__(self, size: int):
+        self._items: List[Optional[BulkItemResult]] = [None] * size
+
+    def ok(self, index: int, status: str, id: int) -> None:
+        self._items[index] = BulkItemResult(index=index, status=status, id=id)
+
+    def error(self, index: int, detail: str, id: Optional[int] = None) -> None:
+        self._items[index] = BulkItemResult(
+            index=index, status="error", id=id, detail=detail
+        )
+
+    def response(self) -> BulkResponse:
+        failed = sum(1 for item in self._items if item.status == "error")
+        return BulkResponse(
+            succeeded=len(self._items) - failed, failed=failed, items=self._items
+        )
+
+
+def bulk_openapi(item: Union[Type[BaseModel], dict]) -> dict:
+    # The body is read by hand to accept NDJSON, so describe it explicitly.
+    if isinstance(item, dict):
+        item_schema = item
+    else:
+        item_schema = item.schema(ref_template="#/components/schemas/{model}")
+        item_schema.pop("$defs", None)
+    schema = {"type": "array", "items": item_schema}
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": schema},
+                NDJSON_MEDIA_TYPE: {"schema": {"type": "string"}},
+            },
+        }
+    }
+
+
+async def read_bulk_items(request: Request) -> List[Any]:
+    body = await request.body()
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+
+    try:
+        if content_type == NDJSON_MEDIA_TYPE:
+            items = [json.loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            items = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Malformed request body")
+
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Expected an array of items")
+
+    if len(items) > config.BULK_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {config.BULK_MAX_ITEMS} items per request",
+        )
+
+    return items
+
+
+def validation_detail(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}"
+        for err in error.errors()
+    )
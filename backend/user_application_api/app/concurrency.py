@@ -0,0 +1,84 @@
+from typing import Any, Dict, Optional, Sequence, Set
+
+from fastapi import HTTPException
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# The detail of a conflict found by the update itself, after the row was read.
+CHANGED_DETAIL = "Version conflict: the row was changed by another request"
+
+
+def check_version(expected: Optional[int], current: int) -> None:
+    # expected is the version the client last read, when it sent one.
+    if expected is not None and expected != current:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Version conflict: the current version is {current}",
+        )
+
+
+async def compare_and_set(
+    db: AsyncSession,
+    model,
+    row_id: int,
+    version: int,
+    values: Dict[str, Any],
+    columns: Sequence,
+):
+    # Applies values only if the row is still at version, bumps the version
+    # and returns the new row, in one UPDATE ... RETURNING. MySQL has no
+    # RETURNING for UPDATE, so there the row is read back afterwards.
+    statement = (
+        update(model)
+        .where(model.id == row_id, model.version == version)
+        .values(**values, version=model.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if db.bind.dialect.update_returning:
+        row = (await db.execute(statement.returning(*columns))).first()
+    else:
+        result = await db.execute(statement)
+        row = None
+        if result.rowcount:
+            query = select(*columns).filter(model.id == row_id)
+            row = (await db.execute(query)).first()
+
+    if row is None:
+        raise HTTPException(status_code=409, detail=CHANGED_DETAIL)
+    return row
+
+
+async def compare_and_set_many(
+    db: AsyncSession, model, rows: Sequence[Dict[str, Any]], versions: Dict[int, int]
+) -> Set[int]:
+    # The bulk form of compare_and_set. Each row holds an id and the values to
+    # write, its new version among them, and is written only if it is still at
+    # versions[id]. Returns the ids of the rows that had changed, which are left
+    # as they are. The rows go in one executemany; only when some of them did
+    # not match is it rolled back and run again row by row to find which, so it
+    # must be the first write of the transaction.
+    if not rows:
+        return set()
+    table = model.__table__
+    statement = update(table).where(
+        table.c.id == bindparam("row_id"), table.c.version == bindparam("row_version")
+    )
+    params = [
+        dict(
+            {name: value for name, value in row.items() if name != "id"},
+            row_id=row["id"],
+            row_version=versions[row["id"]],
+        )
+        for row in rows
+    ]
+    if db.bind.dialect.supports_sane_multi_rowcount:
+        result = await db.execute(statement, params)
+        if result.rowcount == len(params):
+            return set()
+        await db.rollback()
+
+    changed = set()
+    for row_params in params:
+        if not (await db.execute(statement, row_params)).rowcount:
+            changed.add(row_params["row_id"])
+    return changed
@@ -0,0 +1,89 @@
+import os
+
+
+def env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+
+def env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+def env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./sql_app.db")
+# Optional read replica for GET endpoints. Callers read from the primary for
+# REPLICA_STICKY_SECONDS after one of their writes.
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL", "")
+REPLICA_STICKY_SECONDS = env_int("REPLICA_STICKY_SECONDS", 5)
+# Off in the workers started by app.serve, which prepares the database first.
+DB_INIT_ON_STARTUP = env_bool("DB_INIT_ON_STARTUP", True)
+DB_POOL_SIZE = env_int("DB_POOL_SIZE", 5)
+DB_MAX_OVERFLOW = env_int("DB_MAX_OVERFLOW", 10)
+DB_POOL_TIMEOUT = env_float("DB_POOL_TIMEOUT", 30.0)
+DB_POOL_RECYCLE = env_int("DB_POOL_RECYCLE", 1800)
+DB_POOL_PRE_PING = env_bool("DB_POOL_PRE_PING", True)
+DB_STATEMENT_TIMEOUT_MS = env_int("DB_STATEMENT_TIMEOUT_MS", 30000)
+
+AUTH_CACHE_SIZE = env_int("AUTH_CACHE_SIZE", 10000)
+AUTH_CACHE_TTL = env_float("AUTH_CACHE_TTL", 60.0)
+
+TENANT_CACHE_SIZE = env_int("TENANT_CACHE_SIZE", 1000)
+TENANT_CACHE_TTL = env_float("TENANT_CACHE_TTL", 300.0)
+
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")
+RESPONSE_CACHE_URL = os.getenv("RESPONSE_CACHE_URL", "redis://localhost:6379/0")
+RESPONSE_CACHE_SIZE = env_int("RESPONSE_CACHE_SIZE", 1000)
+RESPONSE_CACHE_TTL = env_float("RESPONSE_CACHE_TTL", 30.0)
+
+EVENTS_BACKEND = os.getenv("EVENTS_BACKEND", "memory")
+EVENTS_URL = os.getenv("EVENTS_URL", "redis://localhost:6379/0")
+EVENTS_BUFFER_SIZE = env_int("EVENTS_BUFFER_SIZE", 10000)
+EVENTS_HEARTBEAT = env_float("EVENTS_HEARTBEAT", 15.0)
+
+# Matches of GET /users/search that can be paged through; a query matching
+# more users returns the SEARCH_MAX_MATCHES best.
+SEARCH_MAX_MATCHES = env_int("SEARCH_MAX_MATCHES", 1000)
+
+# Completed applications older than ARCHIVE_AFTER_MONTHS whole months move to
+# applications_archive, ARCHIVE_BATCH_SIZE rows per transaction with
+# ARCHIVE_BATCH_PAUSE seconds between batches, every ARCHIVE_INTERVAL seconds.
+# ARCHIVE_AFTER_MONTHS=0 turns archiving off; ARCHIVE_INTERVAL=0 leaves it to
+# python -m app.archive.
+ARCHIVE_AFTER_MONTHS = env_int("ARCHIVE_AFTER_MONTHS", 12)
+ARCHIVE_BATCH_SIZE = env_int("ARCHIVE_BATCH_SIZE", 1000)
+ARCHIVE_BATCH_PAUSE = env_float("ARCHIVE_BATCH_PAUSE", 0.1)
+ARCHIVE_INTERVAL = env_float("ARCHIVE_INTERVAL", 3600.0)
+
+# Per process: requests per second and burst of each tenant, requests each
+# tenant and each route may run at once, and how many requests may wait for a
+# slot, for at most ADMISSION_QUEUE_TIMEOUT seconds. 0 turns a limit off.
+ADMISSION_TENANT_RATE = env_float("ADMISSION_TENANT_RATE", 0.0)
+ADMISSION_TENANT_BURST = env_int("ADMISSION_TENANT_BURST", 50)
+ADMISSION_TENANT_CONCURRENCY = env_int("ADMISSION_TENANT_CONCURRENCY", 8)
+ADMISSION_ROUTE_CONCURRENCY = env_int("ADMISSION_ROUTE_CONCURRENCY", 12)
+ADMISSION_QUEUE_SIZE = env_int("ADMISSION_QUEUE_SIZE", 64)
+ADMISSION_QUEUE_TIMEOUT = env_float("ADMISSION_QUEUE_TIMEOUT", 2.0)
+
+BULK_MAX_ITEMS = env_int("BULK_MAX_ITEMS", 10000)
+
+# Seconds a POST with an Idempotency-Key is remembered for retries.
+IDEMPOTENCY_KEY_TTL = env_int("IDEMPOTENCY_KEY_TTL", 86400)
+
+FAST_SERIALIZATION = env_bool("FAST_SERIALIZATION", False)
+
+SLOW_QUERY_MS = env_float("SLOW_QUERY_MS", 500.0)
+N_PLUS_ONE_THRESHOLD = env_int("N_PLUS_ONE_THRESHOLD", 10)
+
+USAGE_FLUSH_INTERVAL = env_float("USAGE_FLUSH_INTERVAL", 1.0)
+USAGE_FLUSH_MAX_USERS = env_int("USAGE_FLUSH_MAX_USERS", 1000)
+USAGE_DURABLE = env_bool("USAGE_DURABLE", False)
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = env_int("PORT", 8000)
+WEB_CONCURRENCY = env_int("WEB_CONCURRENCY", os.cpu_count() or 1)
@@ -1,163 +1,432 @@
-from sqlalchemy import create_engine, Column, Integer, String, Date, Float, ForeignKey, Enum, Boolean
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
 import enum
-import os
 from datetime import datetime
+from typing import Optional
+
+from fastapi import Request, Response
+from sqlalchemy import (
+    Column,
+    Date,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Text,
+    UniqueConstraint,
+    event,
+    make_url,
+    select,
+    text,
+)
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import relationship, validates
+
+from . import config, migrations
+from .pool import InstrumentedQueuePool
+from .search import SearchIndex
+from .sql_stats import statement_counter
+
+SQLALCHEMY_DATABASE_URL = config.DATABASE_URL
+
+# Sync drivers in DATABASE_URL are swapped for their asyncio counterparts, so
+# the same URL works for the app and for sync scripts such as the benchmarks.
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "psycopg", "mysql": "aiomysql"}
+SYNC_DRIVERS = {"pysqlite", "psycopg2", "pymysql", "mysqldb"}
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./sql_app.db"
 
+def async_url(url: str):
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend in ASYNC_DRIVERS and (
+        "+" not in parsed.drivername or parsed.get_driver_name() in SYNC_DRIVERS
+    ):
+        parsed = parsed.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+    return parsed
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    # WAL lets readers proceed while a writer holds the lock.
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={config.DB_STATEMENT_TIMEOUT_MS}")
+    cursor.execute("PRAGMA cache_size=-64000")  # 64 MB
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+def create_db_engine(url: str):
+    url = async_url(url)
+    backend = url.get_backend_name()
+    connect_args = {}
+
+    if backend == "postgresql":
+        connect_args["options"] = (
+            f"-c statement_timeout={config.DB_STATEMENT_TIMEOUT_MS}"
+        )
+    elif backend == "mysql":
+        connect_args["init_command"] = (
+            f"SET SESSION max_execution_time={config.DB_STATEMENT_TIMEOUT_MS}"
+        )
+
+    if backend == "sqlite" and url.database in (None, "", ":memory:"):
+        # In-memory databases live in a single connection and cannot be pooled.
+        db_engine = create_async_engine(url)
+    else:
+        db_engine = create_async_engine(
+            url,
+            connect_args=connect_args,
+            poolclass=InstrumentedQueuePool,
+            pool_size=config.DB_POOL_SIZE,
+            max_overflow=config.DB_MAX_OVERFLOW,
+            pool_timeout=config.DB_POOL_TIMEOUT,
+            pool_recycle=config.DB_POOL_RECYCLE,
+            pool_pre_ping=config.DB_POOL_PRE_PING,
+        )
+
+    if backend == "sqlite":
+        event.listen(db_engine.sync_engine, "connect", _set_sqlite_pragmas)
+
+    return db_engine
+
+
+engine = create_db_engine(SQLALCHEMY_DATABASE_URL)
+statement_counter.attach(engine)
+# Objects stay loaded after commit: async sessions cannot lazy-load on access.
+SessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+replica_engine = None
+ReplicaSessionLocal = None
+if config.DATABASE_REPLICA_URL:
+    replica_engine = create_db_engine(config.DATABASE_REPLICA_URL)
+    statement_counter.attach(replica_engine)
+    ReplicaSessionLocal = async_sessionmaker(
+        replica_engine, autoflush=False, expire_on_commit=False
+    )
+
+# Set on responses to writes and sent back by the caller's browser; API
+# clients can send the header instead.
+READ_PRIMARY_COOKIE = "read_primary"
+READ_PRIMARY_HEADER = "read-primary"
 Base = declarative_base()
 
+
 class ApplicationStatus(str, enum.Enum):
     PENDING = "申请中"
     COMPLETED = "已完成"
 
+
 class UserType(str, enum.Enum):
     SUPERADMIN = "超级管理员"
     PROJECT_ADMIN = "项目管理员"
     REGULAR = "普通用户"
 
+
 class TargetProduct(str, enum.Enum):
     C = "C"
     W = "W"
 
+
 class User(Base):
     __tablename__ = "users"
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(100), nullable=False)
     email = Column(String(100), unique=True, nullable=False)
+    # Name of the tenant, kept in step with tenants.name; joins use tenant_id.
     tenant = Column(String(100), nullable=False)
+    tenant_id = Column(Integer, ForeignKey("tenants.id"), index=True)
     department = Column(String(100), nullable=False)
     project = Column(String(100), nullable=False)
     role = Column(String(100), nullable=False)
-    user_type = Column(String(20), default=UserType.REGULAR)
+    user_type = Column(String(20), default=UserType.REGULAR, index=True)
     tabs_accepted = Column(Integer, default=0)
     premium_requests_used = Column(Integer, default=0)
-    
+    # Bumped by every admin write, which only applies if it is unchanged.
+    # Usage increments leave it alone.
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+
     applications = relationship("Application", back_populates="user")
 
+    __table_args__ = (Index("ix_users_project_user_type", "project", "user_type"),)
+
+
 class Tenant(Base):
     __tablename__ = "tenants"
-    
+
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(100), unique=True, nullable=False)
     update_cycle = Column(Integer, default=30)  # Default to monthly (30 days)
 
+
+def month_key(day) -> Optional[int]:
+    # Year and month of a date as one integer, e.g. 202405 for May 2024.
+    return day.year * 100 + day.month if day else None
+
+
+def _default_month(context):
+    # Covers Core inserts that pass application_date without the month.
+    return month_key(context.get_current_parameters().get("application_date"))
+
+
 class Application(Base):
     __tablename__ = "applications"
 
     id = Column(Integer, primary_key=True, index=True)
     application_date = Column(Date, default=datetime.now().date)
+    # Derived from application_date, so a month is one index lookup.
+    application_month = Column(Integer, default=_default_month)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     target_product = Column(String(1), nullable=False)
     status = Column(String(20), default=ApplicationStatus.PENDING)
-    user_id = Column(Integer, ForeignKey("users.id"))
-    
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+
     user = relationship("User", back_populates="applications")
 
-def create_tables():
-    Base.metadata.create_all(bind=engine)
+    __table_args__ = (
+        Index("ix_applications_application_date_id", "application_date", "id"),
+        Index("ix_applications_status_application_date", "status", "application_date"),
+        Index(
+            "ix_applications_month_date_id",
+            "application_month",
+            "application_date",
+            "id",
+        ),
+        Index(
+            "ix_applications_month_status_product",
+            "application_month",
+            "status",
+            "target_product",
+        ),
+    )
 
-def get_db():
-    db = SessionLocal()
-    try:
+    @validates("application_date")
+    def _set_month(self, key, value):
+        self.application_month = month_key(value)
+        return value
+
+
+class ArchivedApplication(Base):
+    # Completed applications older than ARCHIVE_AFTER_MONTHS, moved out of
+    # applications by app.archive with their ids and versions. The list
+    # endpoints read both tables for months before the horizon.
+    __tablename__ = "applications_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    application_date = Column(Date)
+    application_month = Column(Integer)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    target_product = Column(String(1), nullable=False)
+    status = Column(String(20))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    archived_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_applications_archive_application_date_id", "application_date", "id"),
+        Index(
+            "ix_applications_archive_month_date_id",
+            "application_month",
+            "application_date",
+            "id",
+        ),
+        Index(
+            "ix_applications_archive_month_status_product",
+            "application_month",
+            "status",
+            "target_product",
+        ),
+    )
+
+
+class UsageRollup(Base):
+    # Usage totals per tenant billing cycle, department and project, kept in
+    # step with user writes so usage reports read one row per group.
+    __tablename__ = "usage_rollups"
+
+    id = Column(Integer, primary_key=True)
+    tenant_id = Column(Integer, nullable=False)
+    cycle_start = Column(Date, nullable=False)
+    department = Column(String(100), nullable=False)
+    project = Column(String(100), nullable=False)
+    users = Column(Integer, nullable=False, default=0)
+    tabs_accepted = Column(Integer, nullable=False, default=0)
+    premium_requests_used = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint(
+            "tenant_id",
+            "cycle_start",
+            "department",
+            "project",
+            name="uq_usage_rollups_group",
+        ),
+    )
+
+
+class ChangeVersion(Base):
+    # Write counter per list and scope (all rows, one project, one tenant).
+    # Read endpoints derive their ETags from it without reading the rows.
+    __tablename__ = "change_versions"
+
+    table_name = Column(String(50), primary_key=True)
+    scope = Column(String(200), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+class IdempotencyKey(Base):
+    # Response to a POST sent with an Idempotency-Key, stored with the row it
+    # created, so a retry is answered from here instead of writing again.
+    __tablename__ = "idempotency_keys"
+
+    scope = Column(String(200), primary_key=True)
+    key = Column(String(200), primary_key=True)
+    fingerprint = Column(String(64), nullable=False)
+    status_code = Column(Integer, nullable=False)
+    body = Column(Text, nullable=False)
+    created_at = Column(DateTime, nullable=False, index=True)
+
+
+async def run_migrations():
+    async with engine.connect() as conn:
+        await conn.run_sync(migrations.upgrade)
+
+
+async def ping(db_engine):
+    async with db_engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
-def init_db():
-    db = SessionLocal()
-    
-    if db.query(Tenant).first() is None:
-        tenant1 = Tenant(
-            name="租户A",
-            update_cycle=30  # Monthly
-        )
-        
-        tenant2 = Tenant(
-            name="租户B",
-            update_cycle=15  # Bi-weekly
+
+def mark_read_primary(response: Response) -> None:
+    # Keeps the caller on the primary until the replica has caught up with
+    # the write this response answers.
+    if ReplicaSessionLocal is not None:
+        response.set_cookie(
+            READ_PRIMARY_COOKIE,
+            "1",
+            max_age=config.REPLICA_STICKY_SECONDS,
+            httponly=True,
+            samesite="lax",
         )
-        
+        response.headers[READ_PRIMARY_HEADER] = str(config.REPLICA_STICKY_SECONDS)
+
+
+def read_sessionmaker(request: Request) -> async_sessionmaker:
+    if ReplicaSessionLocal is None:
+        return SessionLocal
+    if READ_PRIMARY_COOKIE in request.cookies or request.headers.get(
+        READ_PRIMARY_HEADER
+    ):
+        return SessionLocal
+    return ReplicaSessionLocal
+
+
+async def get_read_db(request: Request):
+    # For GET handlers: the replica when one is configured, unless the caller
+    # wrote recently.
+    async with read_sessionmaker(request)() as db:
+        yield db
+
+
+async def init_db():
+    db = SessionLocal()
+
+    if (await db.execute(select(Tenant).limit(1))).first() is None:
+        tenant1 = Tenant(name="租户A", update_cycle=30)  # Monthly
+
+        tenant2 = Tenant(name="租户B", update_cycle=15)  # Bi-weekly
+
         db.add(tenant1)
         db.add(tenant2)
-        db.commit()
-    
-    if db.query(User).first() is None:
+        await db.commit()
+
+    if (await db.execute(select(User).limit(1))).first() is None:
+        tenant_ids = dict((await db.execute(select(Tenant.name, Tenant.id))).all())
+
         superadmin = User(
             name="管理员",
             email="admin@example.com",
             tenant="租户A",
+            tenant_id=tenant_ids.get("租户A"),
             department="管理部",
             project="系统管理",
             role="系统管理员",
             user_type=UserType.SUPERADMIN,
             tabs_accepted=0,
-            premium_requests_used=0
+            premium_requests_used=0,
         )
-        
+
         project_admin = User(
             name="项目管理",
             email="project@example.com",
             tenant="租户A",
+            tenant_id=tenant_ids.get("租户A"),
             department="研发部",
             project="项目1",
             role="项目管理员",
             user_type=UserType.PROJECT_ADMIN,
             tabs_accepted=5,
-            premium_requests_used=2
+            premium_requests_used=2,
         )
-        
+
         user1 = User(
             name="张三",
             email="zhangsan@example.com",
             tenant="租户A",
+            tenant_id=tenant_ids.get("租户A"),
             department="研发部",
             project="项目1",
             role="开发工程师",
             user_type=UserType.REGULAR,
             tabs_accepted=10,
-            premium_requests_used=5
+            premium_requests_used=5,
         )
-        
+
         user2 = User(
             name="李四",
             email="lisi@example.com",
             tenant="租户B",
+            tenant_id=tenant_ids.get("租户B"),
             department="产品部",
             project="项目2",
             role="产品经理",
             user_type=UserType.REGULAR,
             tabs_accepted=8,
-            premium_requests_used=3
+            premium_requests_used=3,
         )
-        
+
         db.add(superadmin)
         db.add(project_admin)
         db.add(user1)
         db.add(user2)
-        db.commit()
-        
+        await db.flush()
+        search = SearchIndex(new=True)
+        for user in (superadmin, project_admin, user1, user2):
+            search.user(user)
+        await search.apply(db)
+        await db.commit()
+
         app1 = Application(
             application_date=datetime.now().date(),
             target_product=TargetProduct.C,
             status=ApplicationStatus.COMPLETED,
-            user_id=3  # user1 (张三)
+            user_id=3,  # user1 (张三)
         )
-        
+
         app2 = Application(
             application_date=datetime.now().date(),
             target_product=TargetProduct.W,
             status=ApplicationStatus.PENDING,
-            user_id=4  # user2 (李四)
+            user_id=4,  # user2 (李四)
         )
-        
+
         db.add(app1)
         db.add(app2)
-        db.commit()
-    
-    db.close()
+        await db.commit()
+
+    await db.close()
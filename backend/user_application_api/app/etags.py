@@ -0,0 +1,52 @@
+import hashlib
+import json
+from typing import Any, Iterable, Optional
+
+from fastapi import Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .versions import current_versions
+
+# Clients may keep a copy but must revalidate it on every use; the answer
+# depends on the caller, identified by the user-id header.
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(table: str, versions: dict, *key: Any) -> str:
+    raw = json.dumps([table, sorted(versions.items()), key], default=str)
+    return '"%s"' % hashlib.sha1(raw.encode()).hexdigest()
+
+
+def validator_headers(etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Vary": "user-id"}
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = {tag.strip() for tag in header.split(",")}
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+async def conditional_get(
+    request: Request,
+    response: Response,
+    db: AsyncSession,
+    table: str,
+    scopes: Iterable[str],
+    *key: Any,
+) -> Optional[Response]:
+    # Returns a 304 response when the client's copy is current; otherwise sets
+    # the validators on the response the handler goes on to build. key holds
+    # whatever else selects the rows: the caller's scope and the query params.
+    # Versions are read before the rows, so a concurrent write can only make
+    # the ETag older than the body, and the next poll fetches it again.
+    etag = make_etag(table, await current_versions(db, table, scopes), *key)
+    headers = validator_headers(etag)
+
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    return None
@@ -0,0 +1,295 @@
+import asyncio
+import itertools
+import json
+import uuid
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+
+from . import config
+from .database import UserType
+
+# Change records pushed to GET /events. Write handlers collect one record per
+# row they create, update or delete and publish them once their transaction
+# has committed. Each record carries the state the row was visible under
+# before and after the write, so the feed can apply the list endpoints' role
+# rules to every subscriber without reading the rows again.
+
+USER_FIELDS = (
+    "name",
+    "email",
+    "tenant",
+    "tenant_id",
+    "department",
+    "project",
+    "role",
+    "user_type",
+    "tabs_accepted",
+    "premium_requests_used",
+    "version",
+)
+APPLICATION_FIELDS = (
+    "application_date",
+    "target_product",
+    "status",
+    "user_id",
+    "user_name",
+    "project",
+    "version",
+)
+TENANT_FIELDS = ("name", "update_cycle")
+
+Record = Dict[str, Any]
+
+
+def _values(row, names) -> Dict[str, Any]:
+    # ORM objects, result rows and dicts alike.
+    if row is None:
+        return {}
+    if isinstance(row, dict):
+        return {name: row[name] for name in names if name in row}
+    return {name: getattr(row, name) for name in names if hasattr(row, name)}
+
+
+def _record(entity: str, row_id: int, op: str, before, after, names) -> Record:
+    old, new = _values(before, names), _values(after, names)
+    if op == "updated":
+        fields = {name: value for name, value in new.items() if old.get(name) != value}
+    else:
+        fields = new
+    return {
+        "entity": entity,
+        "id": row_id,
+        "op": op,
+        "fields": jsonable_encoder(fields),
+    }
+
+
+class Events:
+    # Records of one write, published together after its commit.
+
+    def __init__(self):
+        self.records: List[Record] = []
+
+    def user(self, op: str, before=None, after=None) -> None:
+        row_id = (after if after is not None else before).id
+        record = _record("users", row_id, op, before, after, USER_FIELDS)
+        record["visible"] = [
+            {"id": row_id, "project": row.project, "user_type": row.user_type}
+            for row in (before, after)
+            if row is not None
+        ]
+        self.records.append(record)
+
+    def usage(self, row, tabs_accepted: int, premium_requests_used: int) -> None:
+        # Counters move too often to send totals; subscribers add the deltas.
+        self.records.append(
+            {
+                "entity": "users",
+                "id": row.id,
+                "op": "incremented",
+                "fields": {
+                    "tabs_accepted": tabs_accepted,
+                    "premium_requests_used": premium_requests_used,
+                },
+                "visible": [
+                    {"id": row.id, "project": row.project, "user_type": row.user_type}
+                ],
+            }
+        )
+
+    def application(self, op: str, row_id: int, before=None, after=None) -> None:
+        self.records.append(
+            _record("applications", row_id, op, before, after, APPLICATION_FIELDS)
+        )
+
+    def tenant(self, op: str, row_id: int, before=None, after=None) -> None:
+        self.records.append(
+            _record("tenants", row_id, op, before, after, TENANT_FIELDS)
+        )
+
+
+def _sees_user(viewer, state: dict) -> bool:
+    # The rules of scope_users_query in routers/users.py.
+    if viewer is None:
+        return state["user_type"] == UserType.REGULAR
+    if viewer.user_type == UserType.SUPERADMIN:
+        return True
+    if viewer.user_type == UserType.PROJECT_ADMIN:
+        return (
+            state["project"] == viewer.project
+            or state["user_type"] == UserType.SUPERADMIN
+        )
+    return state["id"] == viewer.id
+
+
+def visible(record: Record, viewer) -> bool:
+    entity = record["entity"]
+    if entity == "users":
+        return any(_sees_user(viewer, state) for state in record["visible"])
+    if entity == "tenants":
+        # The rules of get_tenants.
+        if viewer is None:
+            return False
+        if viewer.user_type == UserType.SUPERADMIN:
+            return True
+        return record["id"] == viewer.tenant_id
+    # Application lists are not scoped by role.
+    return True
+
+
+def public(record: Record) -> Record:
+    return {key: value for key, value in record.items() if key != "visible"}
+
+
+class MemoryFeed:
+    # The last maxlen records of this process, numbered in order. Ids carry a
+    # per-process prefix, so an id from another process or an earlier run is
+    # recognised as unknown rather than misread.
+
+    def __init__(self, maxlen: int):
+        self.prefix = uuid.uuid4().hex[:8]
+        self._records: "deque[Tuple[int, Record]]" = deque(maxlen=maxlen)
+        self._seq = 0
+        self._published: Optional[asyncio.Condition] = None
+
+    def _condition(self) -> asyncio.Condition:
+        # Created on first use, inside the event loop of the server process.
+        if self._published is None:
+            self._published = asyncio.Condition()
+        return self._published
+
+    async def publish(self, records: Iterable[Record]) -> None:
+        condition = self._condition()
+        async with condition:
+            for record in records:
+                self._seq += 1
+                self._records.append((self._seq, record))
+            condition.notify_all()
+
+    async def last_id(self) -> str:
+        return f"{self.prefix}-{self._seq}"
+
+    def _after(self, after: str) -> Optional[List[Tuple[str, Record]]]:
+        prefix, _, seq = after.partition("-")
+        if prefix != self.prefix or not seq.isdigit() or int(seq) > self._seq:
+            return None
+        oldest = self._records[0][0] if self._records else self._seq + 1
+        if int(seq) < oldest - 1:
+            return None
+        start = int(seq) - oldest + 1
+        return [
+            (f"{self.prefix}-{number}", record)
+            for number, record in itertools.islice(self._records, start, None)
+        ]
+
+    async def read(
+        self, after: str, timeout: float
+    ) -> Optional[List[Tuple[str, Record]]]:
+        # Records published after the id, waiting up to timeout seconds for
+        # one; None when the id is unknown or its successors were dropped.
+        condition = self._condition()
+        async with condition:
+            pending = self._after(after)
+            if pending is None or pending:
+                return pending
+            try:
+                await asyncio.wait_for(condition.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+            return self._after(after)
+
+
+def _stream_id(value: str) -> Optional[Tuple[int, int]]:
+    ms, _, seq = value.partition("-")
+    if not (ms.isdigit() and seq.isdigit()):
+        return None
+    return int(ms), int(seq)
+
+
+class RedisFeed:
+    # Records shared by every process through a Redis stream capped at about
+    # maxlen entries; the stream's entry ids are the sequence numbers. Takes
+    # any client with the redis.asyncio interface.
+
+    def __init__(self, client, maxlen: int, key: str = "events"):
+        self.client = client
+        self.maxlen = maxlen
+        self.key = key
+
+    async def publish(self, records: Iterable[Record]) -> None:
+        async with self.client.pipeline(transaction=False) as pipe:
+            for record in records:
+                pipe.xadd(
+                    self.key,
+                    {"data": json.dumps(record, ensure_ascii=False)},
+                    maxlen=self.maxlen,
+                    approximate=True,
+                )
+            await pipe.execute()
+
+    async def last_id(self) -> str:
+        last = await self.client.xrevrange(self.key, count=1)
+        return _decode(last[0][0]) if last else "0-0"
+
+    async def read(
+        self, after: str, timeout: float
+    ) -> Optional[List[Tuple[str, Record]]]:
+        position = _stream_id(after)
+        if position is None:
+            return None
+        first = await self.client.xrange(self.key, count=1)
+        if first and position < _stream_id(_decode(first[0][0])) and after != "0-0":
+            # Entries up to the first kept one may have been trimmed.
+            return None
+        response = await self.client.xread(
+            {self.key: after}, count=500, block=int(timeout * 1000)
+        )
+        return [
+            (_decode(entry_id), _load(fields))
+            for _, entries in response or []
+            for entry_id, fields in entries
+        ]
+
+
+def _decode(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _load(fields: dict) -> Record:
+    # Clients created with decode_responses return str keys, others bytes.
+    return json.loads(_decode(fields.get(b"data", fields.get("data"))))
+
+
+def create_feed():
+    if config.EVENTS_BACKEND == "redis":
+        # Optional: only deployments with several workers need the client.
+        import redis.asyncio
+
+        client = redis.asyncio.Redis.from_url(config.EVENTS_URL)
+        return RedisFeed(client, maxlen=config.EVENTS_BUFFER_SIZE)
+    return MemoryFeed(maxlen=config.EVENTS_BUFFER_SIZE)
+
+
+class EventFeed:
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.published = 0
+        self.subscribers = 0
+
+    async def publish(self, events: Events) -> None:
+        if events.records:
+            await self.backend.publish(events.records)
+            self.published += len(events.records)
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.backend).__name__,
+            "published": self.published,
+            "subscribers": self.subscribers,
+        }
+
+
+event_feed = EventFeed(create_feed())
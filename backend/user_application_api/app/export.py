@@ -0,0 +1,68 @@
+import csv
+import io
+import json
+from enum import Enum
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from .database import SessionLocal
+
+EXPORT_BATCH_SIZE = 1000
+
+
+class ExportFormat(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+
+MEDIA_TYPES = {
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.CSV: "text/csv; charset=utf-8",
+}
+
+
+async def _stream_rows(
+    query: Select, columns, fmt: ExportFormat, sessionmaker: async_sessionmaker
+):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    if fmt == ExportFormat.CSV:
+        writer.writerow(columns)
+
+    # The request session is released before the body is sent, so the rows are
+    # read through a session owned by the generator itself.
+    async with sessionmaker() as db:
+        result = await db.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for rows in result.partitions():
+            for row in rows:
+                if fmt == ExportFormat.CSV:
+                    writer.writerow(row)
+                else:
+                    record = dict(zip(columns, row))
+                    buffer.write(json.dumps(record, ensure_ascii=False, default=str))
+                    buffer.write("\n")
+
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def export_response(
+    query: Select,
+    fmt: ExportFormat,
+    filename: str,
+    sessionmaker: async_sessionmaker = SessionLocal,
+) -> StreamingResponse:
+    columns = list(query.selected_columns.keys())
+    disposition = f'attachment; filename="{filename}.{fmt.value}"'
+    return StreamingResponse(
+        _stream_rows(query, columns, fmt, sessionmaker),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": disposition},
+    )
@@ -0,0 +1,65 @@
+from functools import lru_cache
+from typing import List, Optional, Sequence, Tuple, Type
+
+from fastapi import HTTPException
+from pydantic import BaseModel, create_model
+
+from .pagination import MAX_PAGE_SIZE
+
+# Sparse fieldsets and batch lookups for the list endpoints. ?fields=id,name
+# narrows both the selected columns and the serialized rows; ?ids=1,2,3 reads
+# those rows with one IN query.
+
+
+def parse_fields(
+    fields: Optional[str], model: Type[BaseModel], required: Sequence[str] = ("id",)
+) -> Optional[Tuple[str, ...]]:
+    # The requested fields of model in its own order, plus those the endpoint
+    # needs for its cursor; None when all fields are wanted.
+    if fields is None:
+        return None
+    names = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = names - model.__fields__.keys()
+    if unknown:
+        raise HTTPException(
+            status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}"
+        )
+    names.update(required)
+    return tuple(name for name in model.__fields__ if name in names)
+
+
+def parse_ids(ids: Optional[str]) -> Optional[List[int]]:
+    if ids is None:
+        return None
+    try:
+        values = sorted({int(value) for value in ids.split(",") if value.strip()})
+    except ValueError:
+        raise HTTPException(
+            status_code=400, detail="ids must be comma-separated integers"
+        )
+    if len(values) > MAX_PAGE_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_PAGE_SIZE} ids can be looked up at once",
+        )
+    return values
+
+
+@lru_cache(maxsize=256)
+def partial_model(model: Type[BaseModel], fields: Tuple[str, ...]) -> Type[BaseModel]:
+    # model narrowed to fields, so narrowed rows are validated like full ones.
+    definitions = {
+        name: (model.__fields__[name].annotation, model.__fields__[name])
+        for name in fields
+    }
+    return create_model(f"{model.__name__}Fields", **definitions)
+
+
+@lru_cache(maxsize=256)
+def page_model(item_model: Type[BaseModel]) -> Type[BaseModel]:
+    # The {"items", "next_cursor"} page of the list endpoints for item_model.
+    return create_model(
+        f"{item_model.__name__}Page",
+        items=(List[item_model], ...),
+        next_cursor=(Optional[str], None),
+    )
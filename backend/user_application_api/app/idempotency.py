@@ -0,0 +1,95 @@
+import hashlib
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import Response
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import config
+from .database import IdempotencyKey
+
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class Idempotency:
+    # A POST sent with an Idempotency-Key. Its response is stored in the same
+    # transaction as the row it creates, so a retry of the request, even one
+    # racing the original, is answered with that response instead of
+    # creating the row again. Keys are scoped per caller and endpoint.
+
+    def __init__(self, key: str, scope: str, request: Any):
+        self.key = key
+        self.scope = scope
+        self.fingerprint = hashlib.sha256(
+            json.dumps(request, sort_keys=True, default=str).encode()
+        ).hexdigest()
+
+    async def replay(self, db: AsyncSession) -> Optional[Response]:
+        cutoff = _now() - timedelta(seconds=config.IDEMPOTENCY_KEY_TTL)
+        stored = (
+            await db.execute(
+                select(IdempotencyKey).filter(
+                    IdempotencyKey.scope == self.scope,
+                    IdempotencyKey.key == self.key,
+                    IdempotencyKey.created_at >= cutoff,
+                )
+            )
+        ).scalar_one_or_none()
+        if stored is None:
+            return None
+        if stored.fingerprint != self.fingerprint:
+            raise HTTPException(
+                status_code=422,
+                detail="Idempotency-Key was already used with a different request",
+            )
+        return Response(
+            content=stored.body,
+            status_code=stored.status_code,
+            media_type="application/json",
+            headers={REPLAYED_HEADER: "true"},
+        )
+
+    async def remember(self, db: AsyncSession, response: Response) -> None:
+        now = _now()
+        # Expired keys, including an earlier use of this one, are dropped here
+        # rather than by a separate cleanup job.
+        cutoff = now - timedelta(seconds=config.IDEMPOTENCY_KEY_TTL)
+        await db.execute(
+            delete(IdempotencyKey).filter(IdempotencyKey.created_at < cutoff)
+        )
+        db.add(
+            IdempotencyKey(
+                scope=self.scope,
+                key=self.key,
+                fingerprint=self.fingerprint,
+                status_code=response.status_code,
+                body=response.body.decode(),
+                created_at=now,
+            )
+        )
+
+    async def commit(self, db: AsyncSession) -> Optional[Response]:
+        # Commits the write and its stored response. When a concurrent request
+        # with the same key committed first, the write is rolled back and its
+        # response is returned instead.
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            replayed = await self.replay(db)
+            if replayed is None:
+                raise
+            return replayed
+        return None
+
+
+def idempotency(key: Optional[str], scope: str, request: Any) -> Optional[Idempotency]:
+    return Idempotency(key, scope, request) if key else None
@@ -1,9 +1,55 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from app.database import create_tables, init_db
-from app.routers import users, applications, tenants
+from fastapi.responses import Response
+
+from app import config
+from app.admission import AdmissionMiddleware, admission
+from app.archive import archiver
+from app.auth import auth_cache_stats
+from app.database import (
+    engine,
+    init_db,
+    mark_read_primary,
+    ping,
+    replica_engine,
+    run_migrations,
+)
+from app.events import event_feed
+from app.metrics import PROMETHEUS_CONTENT_TYPE, request_metrics
+from app.pool import pool_status
+from app.response_cache import response_cache
+from app.routers import applications, events, tenants, usage, users
+from app.serialization import DefaultResponse
+from app.sql_stats import statement_counter
+from app.usage_buffer import usage_buffer
+
+# Seconds /readyz waits for a connection and a round trip to the database.
+READINESS_TIMEOUT = 5.0
+
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if config.DB_INIT_ON_STARTUP:
+        await run_migrations()
+        await init_db()
+    usage_buffer.start()
+    archiver.start()
+    yield
+    await archiver.stop()
+    await usage_buffer.stop()
+    await engine.dispose()
+    if replica_engine is not None:
+        await replica_engine.dispose()
+
+
+app = FastAPI(default_response_class=DefaultResponse, lifespan=lifespan)
+
+# Inside CORS, so turned-away requests still carry its headers and preflight
+# requests are never limited.
+app.add_middleware(AdmissionMiddleware)
 
 # Disable CORS. Do not remove this for full-stack development.
 app.add_middleware(
@@ -14,15 +60,105 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
+
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    return await request_metrics.instrument(request, call_next)
+
+
+@app.middleware("http")
+async def read_your_writes(request: Request, call_next):
+    response = await call_next(request)
+    if request.method not in ("GET", "HEAD", "OPTIONS") and response.status_code < 400:
+        mark_read_primary(response)
+    return response
+
+
 app.include_router(users.router)
 app.include_router(applications.router)
 app.include_router(tenants.router)
+app.include_router(usage.router)
+app.include_router(events.router)
+
 
 @app.get("/healthz")
 async def healthz():
     return {"status": "ok"}
 
-@app.on_event("startup")
-async def startup_event():
-    create_tables()
-    init_db()
+
+def pools() -> dict:
+    status = {"pool": pool_status(engine)}
+    if replica_engine is not None:
+        status["replica_pool"] = pool_status(replica_engine)
+    return status
+
+
+@app.get("/readyz")
+async def readyz():
+    # Unlike /healthz, fails while the database cannot be reached, so a load
+    # balancer stops routing to this process.
+    try:
+        await asyncio.wait_for(ping(engine), READINESS_TIMEOUT)
+        if replica_engine is not None:
+            await asyncio.wait_for(ping(replica_engine), READINESS_TIMEOUT)
+    except Exception as error:
+        return DefaultResponse(
+            status_code=503,
+            content={
+                "status": "unavailable",
+                "database": f"{type(error).__name__}: {error}",
+                **pools(),
+            },
+        )
+    return {"status": "ready", "database": "ok", **pools()}
+
+
+@app.get("/healthz/pool")
+async def healthz_pool():
+    status = pool_status(engine)
+    if replica_engine is not None:
+        status["replica"] = pool_status(replica_engine)
+    return status
+
+
+@app.get("/healthz/auth-cache")
+async def healthz_auth_cache():
+    return auth_cache_stats()
+
+
+@app.get("/healthz/response-cache")
+async def healthz_response_cache():
+    return await response_cache.stats()
+
+
+@app.get("/healthz/admission")
+async def healthz_admission():
+    return admission.stats()
+
+
+@app.get("/healthz/archive")
+async def healthz_archive():
+    return archiver.stats()
+
+
+@app.get("/healthz/events")
+async def healthz_events():
+    return event_feed.stats()
+
+
+@app.get("/healthz/sql")
+async def healthz_sql():
+    return statement_counter.stats()
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(
+        request_metrics.render() + admission.render(),
+        media_type=PROMETHEUS_CONTENT_TYPE,
+    )
+
+
+@app.get("/healthz/usage-buffer")
+async def healthz_usage_buffer():
+    return usage_buffer.stats()
@@ -0,0 +1,196 @@
+import logging
+import threading
+import time
+from typing import Dict, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from . import config
+from .sql_stats import RequestSQL, shorten, start_request, statement_counter
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds, in seconds, of the request duration histogram buckets.
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class _RouteStats:
+    def __init__(self):
+        self.requests = 0
+        self.duration_sum = 0.0
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.db_time = 0.0
+        self.statements = 0
+        self.rows = 0
+        self.n_plus_one = 0
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class RequestMetrics:
+    # Per-route request counts, durations and SQL accounting of this process,
+    # rendered in the Prometheus text format. Routes are labelled by their
+    # path template, so path parameters do not create new series.
+
+    def __init__(self, n_plus_one_threshold: int):
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self._lock = threading.Lock()
+        self._routes: Dict[Tuple[str, str], _RouteStats] = {}
+        self._statuses: Dict[Tuple[str, str, int], int] = {}
+
+    async def instrument(self, request: Request, call_next) -> Response:
+        start = time.perf_counter()
+        sql = start_request()
+        response = await call_next(request)
+
+        elapsed = time.perf_counter() - start
+        response.headers["Server-Timing"] = (
+            f'db;dur={sql.db_time * 1000:.1f};desc="{sql.statements} statements", '
+            f"app;dur={(elapsed - sql.db_time) * 1000:.1f}, "
+            f"total;dur={elapsed * 1000:.1f}"
+        )
+
+        route = request.scope.get("route")
+        path = route.path if route is not None else "unmatched"
+        body = response.body_iterator
+
+        async def observed_body():
+            # Streamed bodies such as the exports keep querying after the
+            # headers are sent; the request is recorded once they finish.
+            try:
+                async for chunk in body:
+                    yield chunk
+            finally:
+                self.observe(
+                    request.method,
+                    path,
+                    response.status_code,
+                    time.perf_counter() - start,
+                    sql,
+                )
+
+        response.body_iterator = observed_body()
+        return response
+
+    def observe(
+        self, method: str, path: str, status: int, elapsed: float, sql: RequestSQL
+    ) -> None:
+        repeated = sql.repeated(self.n_plus_one_threshold)
+        if repeated is not None:
+            statement, count = repeated
+            logger.warning(
+                "Possible N+1 in %s %s: statement ran %d times: %s",
+                method,
+                path,
+                count,
+                shorten(statement),
+            )
+
+        with self._lock:
+            stats = self._routes.get((method, path))
+            if stats is None:
+                stats = self._routes[(method, path)] = _RouteStats()
+            stats.requests += 1
+            stats.duration_sum += elapsed
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if elapsed <= bound:
+                    stats.buckets[i] += 1
+            stats.db_time += sql.db_time
+            stats.statements += sql.statements
+            stats.rows += sql.rows
+            if repeated is not None:
+                stats.n_plus_one += 1
+            key = (method, path, status)
+            self._statuses[key] = self._statuses.get(key, 0) + 1
+
+    def render(self) -> str:
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            routes = sorted(self._routes.items())
+            statuses = sorted(self._statuses.items())
+
+            family("http_requests_total", "counter", "Requests served.")
+            for (method, path, status), count in statuses:
+                labels = f'method="{method}",route="{_label(path)}",status="{status}"'
+                lines.append(f"http_requests_total{{{labels}}} {count}")
+
+            family(
+                "http_request_duration_seconds",
+                "histogram",
+                "Time from receiving the request to sending the last body chunk.",
+            )
+            for (method, path), stats in routes:
+                labels = f'method="{method}",route="{_label(path)}"'
+                for bound, count in zip(DURATION_BUCKETS, stats.buckets):
+                    lines.append(
+                        f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}}'
+                        f" {count}"
+                    )
+                lines.append(
+                    f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}}'
+                    f" {stats.requests}"
+                )
+                lines.append(
+                    f"http_request_duration_seconds_sum{{{labels}}} "
+                    f"{stats.duration_sum:.6f}"
+                )
+                lines.append(
+                    f"http_request_duration_seconds_count{{{labels}}} {stats.requests}"
+                )
+
+            for name, attribute, kind, help_text in (
+                (
+                    "http_request_db_seconds_total",
+                    "db_time",
+                    "counter",
+                    "Time spent executing SQL statements.",
+                ),
+                (
+                    "http_request_sql_statements_total",
+                    "statements",
+                    "counter",
+                    "SQL statements executed.",
+                ),
+                (
+                    "http_request_sql_rows_total",
+                    "rows",
+                    "counter",
+                    "Rows returned or changed, as reported by the driver.",
+                ),
+                (
+                    "http_request_n_plus_one_total",
+                    "n_plus_one",
+                    "counter",
+                    "Requests that repeated one statement N_PLUS_ONE_THRESHOLD times.",
+                ),
+            ):
+                family(name, kind, help_text)
+                for (method, path), stats in routes:
+                    labels = f'method="{method}",route="{_label(path)}"'
+                    value = getattr(stats, attribute)
+                    value = f"{value:.6f}" if isinstance(value, float) else value
+                    lines.append(f"{name}{{{labels}}} {value}")
+
+        sql = statement_counter.stats()
+        family("sql_statements_total", "counter", "SQL statements executed.")
+        lines.append(f"sql_statements_total {sql['statements']}")
+        family(
+            "sql_slow_statements_total",
+            "counter",
+            "SQL statements slower than SLOW_QUERY_MS.",
+        )
+        lines.append(f"sql_slow_statements_total {sql['slow_statements']}")
+        return "\n".join(lines) + "\n"
+
+
+request_metrics = RequestMetrics(n_plus_one_threshold=config.N_PLUS_ONE_THRESHOLD)
@@ -0,0 +1,375 @@
+import asyncio
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import (
+    Column,
+    Date,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    Text,
+    UniqueConstraint,
+    extract,
+    func,
+    inspect,
+    select,
+    text,
+)
+from sqlalchemy.engine import Connection
+
+from .search import build_index
+
+# Schema changes are applied as numbered steps recorded in schema_version, so an
+# existing database is upgraded in place instead of relying on create_all(),
+# which never alters tables that already exist. Each step describes the schema
+# as of that step and must not import the ORM models, which keep changing.
+
+schema_version = Table(
+    "schema_version",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("description", String(200), nullable=False),
+    Column("applied_at", DateTime, nullable=False, server_default=func.now()),
+)
+
+
+def _reflect(conn: Connection, name: str) -> Table:
+    return Table(name, MetaData(), autoload_with=conn)
+
+
+def _create_index(conn: Connection, name: str, table: str, *columns: str) -> None:
+    existing = {index["name"] for index in inspect(conn).get_indexes(table)}
+    if name not in existing:
+        reflected = _reflect(conn, table)
+        Index(name, *(reflected.c[column] for column in columns)).create(conn)
+
+
+def _drop_index(conn: Connection, name: str, table: str) -> None:
+    for index in _reflect(conn, table).indexes:
+        if index.name == name:
+            index.drop(conn)
+
+
+def _initial_schema(conn: Connection) -> None:
+    # Databases created before migrations existed already have these tables.
+    metadata = MetaData()
+    Table(
+        "users",
+        metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("name", String(100), nullable=False),
+        Column("email", String(100), unique=True, nullable=False),
+        Column("tenant", String(100), nullable=False),
+        Column("department", String(100), nullable=False),
+        Column("project", String(100), nullable=False),
+        Column("role", String(100), nullable=False),
+        Column("user_type", String(20)),
+        Column("tabs_accepted", Integer),
+        Column("premium_requests_used", Integer),
+    )
+    Table(
+        "tenants",
+        metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("name", String(100), unique=True, nullable=False),
+        Column("update_cycle", Integer),
+    )
+    Table(
+        "applications",
+        metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("application_date", Date),
+        Column("target_product", String(1), nullable=False),
+        Column("status", String(20)),
+        Column("user_id", Integer, ForeignKey("users.id")),
+    )
+    metadata.create_all(conn, checkfirst=True)
+
+
+def _add_filter_indexes(conn: Connection) -> None:
+    _create_index(conn, "ix_users_tenant", "users", "tenant")
+    _create_index(conn, "ix_users_project_user_type", "users", "project", "user_type")
+    _create_index(conn, "ix_users_user_type", "users", "user_type")
+    # (application_date, id) matches the keyset order of GET /applications.
+    _create_index(
+        conn,
+        "ix_applications_application_date_id",
+        "applications",
+        "application_date",
+        "id",
+    )
+    _create_index(conn, "ix_applications_user_id", "applications", "user_id")
+    _create_index(
+        conn,
+        "ix_applications_status_application_date",
+        "applications",
+        "status",
+        "application_date",
+    )
+
+
+def _add_usage_rollups(conn: Connection) -> None:
+    Table(
+        "usage_rollups",
+        MetaData(),
+        Column("id", Integer, primary_key=True),
+        Column("tenant", String(100), nullable=False),
+        Column("cycle_start", Date, nullable=False),
+        Column("department", String(100), nullable=False),
+        Column("project", String(100), nullable=False),
+        Column("users", Integer, nullable=False, default=0),
+        Column("tabs_accepted", Integer, nullable=False, default=0),
+        Column("premium_requests_used", Integer, nullable=False, default=0),
+        UniqueConstraint(
+            "tenant",
+            "cycle_start",
+            "department",
+            "project",
+            name="uq_usage_rollups_group",
+        ),
+    ).create(conn, checkfirst=True)
+
+
+def _add_user_tenant_id(conn: Connection) -> None:
+    if "tenant_id" not in _reflect(conn, "users").c:
+        if conn.dialect.name == "mysql":
+            # MySQL ignores an inline REFERENCES clause.
+            conn.execute(
+                text(
+                    "ALTER TABLE users ADD COLUMN tenant_id INTEGER NULL, "
+                    "ADD CONSTRAINT fk_users_tenant_id "
+                    "FOREIGN KEY (tenant_id) REFERENCES tenants (id)"
+                )
+            )
+        else:
+            conn.execute(
+                text(
+                    "ALTER TABLE users "
+                    "ADD COLUMN tenant_id INTEGER REFERENCES tenants (id)"
+                )
+            )
+
+    users = _reflect(conn, "users")
+    tenants = _reflect(conn, "tenants")
+    # Users whose tenant name matches no tenant keep a NULL tenant_id.
+    conn.execute(
+        users.update()
+        .where(users.c.tenant_id.is_(None))
+        .values(
+            tenant_id=select(tenants.c.id)
+            .where(tenants.c.name == users.c.tenant)
+            .scalar_subquery()
+        )
+    )
+    _create_index(conn, "ix_users_tenant_id", "users", "tenant_id")
+    _drop_index(conn, "ix_users_tenant", "users")
+
+    # Rollups are derived data: re-keyed by tenant id, they are recomputed from
+    # the users table on the next read of each tenant.
+    _reflect(conn, "usage_rollups").drop(conn)
+    Table(
+        "usage_rollups",
+        MetaData(),
+        Column("id", Integer, primary_key=True),
+        Column("tenant_id", Integer, nullable=False),
+        Column("cycle_start", Date, nullable=False),
+        Column("department", String(100), nullable=False),
+        Column("project", String(100), nullable=False),
+        Column("users", Integer, nullable=False, default=0),
+        Column("tabs_accepted", Integer, nullable=False, default=0),
+        Column("premium_requests_used", Integer, nullable=False, default=0),
+        UniqueConstraint(
+            "tenant_id",
+            "cycle_start",
+            "department",
+            "project",
+            name="uq_usage_rollups_group",
+        ),
+    ).create(conn)
+
+
+def _add_change_versions(conn: Connection) -> None:
+    Table(
+        "change_versions",
+        MetaData(),
+        Column("table_name", String(50), primary_key=True),
+        Column("scope", String(200), primary_key=True),
+        Column("version", Integer, nullable=False, default=0),
+    ).create(conn, checkfirst=True)
+
+
+def _add_application_month(conn: Connection) -> None:
+    if "application_month" not in _reflect(conn, "applications").c:
+        conn.execute(
+            text("ALTER TABLE applications ADD COLUMN application_month INTEGER")
+        )
+
+    applications = _reflect(conn, "applications")
+    day = applications.c.application_date
+    conn.execute(
+        applications.update()
+        .where(applications.c.application_month.is_(None))
+        .values(application_month=extract("year", day) * 100 + extract("month", day))
+    )
+    # (month, date, id) serves a month's page in keyset order; (month, status,
+    # product) covers the per-month counts without reading table rows.
+    _create_index(
+        conn,
+        "ix_applications_month_date_id",
+        "applications",
+        "application_month",
+        "application_date",
+        "id",
+    )
+    _create_index(
+        conn,
+        "ix_applications_month_status_product",
+        "applications",
+        "application_month",
+        "status",
+        "target_product",
+    )
+
+
+def _add_versions_and_idempotency_keys(conn: Connection) -> None:
+    for table in ("users", "applications"):
+        if "version" not in _reflect(conn, table).c:
+            conn.execute(
+                text(
+                    f"ALTER TABLE {table} ADD COLUMN version INTEGER NOT NULL DEFAULT 1"
+                )
+            )
+    Table(
+        "idempotency_keys",
+        MetaData(),
+        Column("scope", String(200), primary_key=True),
+        Column("key", String(200), primary_key=True),
+        Column("fingerprint", String(64), nullable=False),
+        Column("status_code", Integer, nullable=False),
+        Column("body", Text, nullable=False),
+        Column("created_at", DateTime, nullable=False, index=True),
+    ).create(conn, checkfirst=True)
+
+
+def _add_user_search(conn: Connection) -> None:
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        conn.execute(
+            text(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS user_search USING fts5("
+                "name, email, department, role, tokenize='unicode61', prefix='1 2 3')"
+            )
+        )
+    elif dialect == "postgresql":
+        conn.execute(
+            text(
+                "CREATE TABLE IF NOT EXISTS user_search ("
+                "user_id INTEGER PRIMARY KEY, document TSVECTOR NOT NULL)"
+            )
+        )
+        conn.execute(
+            text(
+                "CREATE INDEX IF NOT EXISTS ix_user_search_document "
+                "ON user_search USING GIN (document)"
+            )
+        )
+    elif dialect == "mysql":
+        existing = {index["name"] for index in inspect(conn).get_indexes("users")}
+        if "ft_users_search" not in existing:
+            # The ngram parser splits CJK text, which has no spaces, into bigrams.
+            conn.execute(
+                text(
+                    "ALTER TABLE users ADD FULLTEXT INDEX ft_users_search "
+                    "(name, email, department, role) WITH PARSER ngram"
+                )
+            )
+    # The user_search table of SQLite and PostgreSQL starts with every user.
+    build_index(conn)
+
+
+def _add_applications_archive(conn: Connection) -> None:
+    metadata = MetaData()
+    # Reflected so the user_id foreign key can be resolved.
+    Table("users", metadata, autoload_with=conn)
+    Table(
+        "applications_archive",
+        metadata,
+        Column("id", Integer, primary_key=True, autoincrement=False),
+        Column("application_date", Date),
+        Column("application_month", Integer),
+        Column("version", Integer, nullable=False, server_default="1"),
+        Column("target_product", String(1), nullable=False),
+        Column("status", String(20)),
+        Column("user_id", Integer, ForeignKey("users.id"), index=True),
+        Column("archived_at", DateTime, nullable=False),
+        # The same access paths as the hot table: keyset pages overall and per
+        # month, and the per-month counts.
+        Index("ix_applications_archive_application_date_id", "application_date", "id"),
+        Index(
+            "ix_applications_archive_month_date_id",
+            "application_month",
+            "application_date",
+            "id",
+        ),
+        Index(
+            "ix_applications_archive_month_status_product",
+            "application_month",
+            "status",
+            "target_product",
+        ),
+    ).create(conn, checkfirst=True)
+
+
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "initial schema", _initial_schema),
+    (2, "indexes for list endpoint filters", _add_filter_indexes),
+    (3, "usage rollup table", _add_usage_rollups),
+    (4, "users.tenant_id foreign key", _add_user_tenant_id),
+    (5, "change versions for conditional GET", _add_change_versions),
+    (6, "applications.application_month", _add_application_month),
+    (7, "row versions and idempotency keys", _add_versions_and_idempotency_keys),
+    (8, "user search index", _add_user_search),
+    (9, "applications archive table", _add_applications_archive),
+]
+
+
+def current_version(conn: Connection) -> int:
+    if not inspect(conn).has_table(schema_version.name):
+        return 0
+    return conn.execute(select(func.max(schema_version.c.version))).scalar() or 0
+
+
+def upgrade(conn: Connection, target: Optional[int] = None) -> int:
+    schema_version.create(conn, checkfirst=True)
+    version = current_version(conn)
+    conn.commit()
+
+    for step, description, migrate in MIGRATIONS:
+        if step <= version or (target is not None and step > target):
+            continue
+        # One commit per step, so a failure leaves the last good version.
+        migrate(conn)
+        conn.execute(
+            schema_version.insert().values(version=step, description=description)
+        )
+        conn.commit()
+        version = step
+
+    return version
+
+
+async def _main() -> None:
+    from .database import engine
+
+    async with engine.connect() as conn:
+        version = await conn.run_sync(upgrade)
+    await engine.dispose()
+    print(f"Database at schema version {version}")
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
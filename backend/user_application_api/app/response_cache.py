@@ -0,0 +1,201 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Type
+
+from fastapi import Response
+from pydantic import BaseModel
+
+from . import config
+from .etags import validator_headers
+from .serialization import encode
+
+# List responses are cached as encoded bodies, keyed on the endpoint, the
+# caller's scope and the query params, and tagged with the (table, scope)
+# change versions they were built from. An entry is only served while its
+# ETag, which is made from those versions, is still the current one, so a
+# write committed by any process, or a read that overlapped a write and
+# stored an older body, is never served. Write handlers also drop every entry
+# tagged with a scope they changed, to free the memory early.
+
+Entry = Tuple[str, bytes]
+
+
+def _tag(table: str, scope: str) -> str:
+    return f"{table}|{scope}"
+
+
+class MemoryBackend:
+    # Per-process LRU of encoded responses whose entries expire after ttl
+    # seconds. Invalidation scans the entries, which are bounded by maxsize.
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def get(self, key: str) -> Optional[Entry]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, _, etag, body = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return etag, body
+
+    async def set(self, key: str, tags: List[str], etag: str, body: bytes) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, frozenset(tags), etag, body)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    async def invalidate(self, tags: Iterable[str]) -> int:
+        tags = set(tags)
+        with self._lock:
+            stale = [key for key, entry in self._data.items() if entry[1] & tags]
+            for key in stale:
+                del self._data[key]
+            return len(stale)
+
+    async def sizes(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                key: len(etag) + len(body)
+                for key, (_, _, etag, body) in self._data.items()
+            }
+
+
+class RedisBackend:
+    # Entries shared by every process through Redis. Each entry is a hash of
+    # etag and body; each tag is a set of the entry keys built from it. Takes
+    # any client with the redis.asyncio interface, such as fakeredis.
+
+    def __init__(self, client, ttl: float, prefix: str = "response-cache:"):
+        self.client = client
+        self.ttl = max(1, int(ttl))
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[Entry]:
+        etag, body = await self.client.hmget(self.prefix + key, "etag", "body")
+        if etag is None or body is None:
+            return None
+        return etag.decode() if isinstance(etag, bytes) else etag, body
+
+    async def set(self, key: str, tags: List[str], etag: str, body: bytes) -> None:
+        entry_key = self.prefix + key
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.hset(entry_key, mapping={"etag": etag, "body": body})
+            pipe.expire(entry_key, self.ttl)
+            for tag in tags:
+                tag_key = f"{self.prefix}tag:{tag}"
+                pipe.sadd(tag_key, entry_key)
+                pipe.expire(tag_key, self.ttl)
+            await pipe.execute()
+
+    async def invalidate(self, tags: Iterable[str]) -> int:
+        tag_keys = [f"{self.prefix}tag:{tag}" for tag in tags]
+        if not tag_keys:
+            return 0
+        async with self.client.pipeline(transaction=False) as pipe:
+            for tag_key in tag_keys:
+                pipe.smembers(tag_key)
+            members = await pipe.execute()
+        entry_keys = set().union(*members)
+        await self.client.delete(*tag_keys, *entry_keys)
+        return len(entry_keys)
+
+    async def sizes(self, limit: int = 1000) -> Dict[str, int]:
+        sizes = {}
+        async for entry_key in self.client.scan_iter(match=self.prefix + "[[]*"):
+            if len(sizes) >= limit:
+                break
+            async with self.client.pipeline(transaction=False) as pipe:
+                pipe.hstrlen(entry_key, "etag")
+                pipe.hstrlen(entry_key, "body")
+                etag_size, body_size = await pipe.execute()
+            if isinstance(entry_key, bytes):
+                entry_key = entry_key.decode()
+            sizes[entry_key[len(self.prefix) :]] = etag_size + body_size
+        return sizes
+
+
+class ResponseCache:
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(*parts: Any) -> str:
+        return json.dumps(parts, default=str, ensure_ascii=False, separators=(",", ":"))
+
+    async def lookup(self, key: str, etag: str) -> Optional[Response]:
+        # The cached body, if it was built at the current etag, the one
+        # conditional_get has just computed.
+        entry = await self.backend.get(key)
+        if entry is None or entry[0] != etag:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return Response(
+            content=entry[1],
+            media_type="application/json",
+            headers=validator_headers(etag),
+        )
+
+    async def store(
+        self,
+        key: str,
+        table: str,
+        scopes: Iterable[str],
+        etag: str,
+        model: Type[BaseModel],
+        content: Any,
+    ) -> Response:
+        body = encode(content, model)
+        tags = [_tag(table, scope) for scope in scopes]
+        await self.backend.set(key, tags, etag, body)
+        return Response(
+            content=body, media_type="application/json", headers=validator_headers(etag)
+        )
+
+    async def invalidate(self, changes) -> int:
+        return await self.backend.invalidate(
+            _tag(table, scope) for table, scope in changes.scopes
+        )
+
+    async def stats(self, largest: int = 10) -> dict:
+        sizes = await self.backend.sizes()
+        biggest = sorted(sizes.items(), key=lambda item: item[1], reverse=True)
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "entries": len(sizes),
+            "bytes": sum(sizes.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "largest": [{"key": key, "bytes": size} for key, size in biggest[:largest]],
+        }
+
+
+def create_backend():
+    if config.RESPONSE_CACHE_BACKEND == "redis":
+        # Optional: only deployments that share the cache need the client.
+        import redis.asyncio
+
+        client = redis.asyncio.Redis.from_url(config.RESPONSE_CACHE_URL)
+        return RedisBackend(client, ttl=config.RESPONSE_CACHE_TTL)
+    return MemoryBackend(
+        maxsize=config.RESPONSE_CACHE_SIZE, ttl=config.RESPONSE_CACHE_TTL
+    )
+
+
+response_cache = ResponseCache(create_backend())
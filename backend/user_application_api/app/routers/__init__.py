@@ -1 +1,3 @@
-from . import users, applications, tenants
+from . import applications, tenants, usage, users
+
+__all__ = ["applications", "tenants", "usage", "users"]
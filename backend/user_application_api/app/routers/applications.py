@@ -1,132 +1,755 @@
-from fastapi import APIRouter, Depends, HTTPException, Header
-from sqlalchemy.orm import Session
-from typing import List, Optional
-from ..database import get_db, Application, User, TargetProduct, ApplicationStatus, UserType
-from pydantic import BaseModel, validator
-from datetime import date, datetime
+from datetime import date
 from enum import Enum
-from .users import get_current_user, check_admin_permission
+from typing import Dict, List, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from pydantic import BaseModel, ValidationError, validator
+from sqlalchemy import and_, delete, func, insert, or_, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..archive import reads_archive
+from ..bulk import (
+    BulkResponse,
+    BulkResults,
+    bulk_openapi,
+    read_bulk_items,
+    validation_detail,
+)
+from ..concurrency import (
+    CHANGED_DETAIL,
+    check_version,
+    compare_and_set,
+    compare_and_set_many,
+)
+from ..database import (
+    Application,
+    ApplicationStatus,
+    ArchivedApplication,
+    TargetProduct,
+    User,
+    get_db,
+    get_read_db,
+    month_key,
+    read_sessionmaker,
+)
+from ..etags import conditional_get
+from ..events import Events, event_feed
+from ..export import ExportFormat, export_response
+from ..fields import page_model, parse_fields, parse_ids, partial_model
+from ..idempotency import idempotency
+from ..pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, encode_cursor
+from ..response_cache import response_cache
+from ..serialization import respond
+from ..versions import ALL, Changes, project_scope
 
 router = APIRouter()
 
+
 class TargetProductEnum(str, Enum):
     C = "C"
     W = "W"
 
+
 class ApplicationStatusEnum(str, Enum):
     PENDING = "申请中"
     COMPLETED = "已完成"
 
+
 class ApplicationBase(BaseModel):
     application_date: date
     target_product: TargetProductEnum
     status: ApplicationStatusEnum
     user_id: int
 
-    @validator('target_product')
+    @validator("target_product")
     def validate_target_product(cls, v):
         if v not in [TargetProductEnum.C, TargetProductEnum.W]:
-            raise ValueError('Target product must be either C or W')
+            raise ValueError("Target product must be either C or W")
         return v
 
+
 class ApplicationCreate(ApplicationBase):
     pass
 
+
+class ApplicationUpdate(ApplicationCreate):
+    # The version the client last read; the update is refused if it changed.
+    version: Optional[int] = None
+
+
+class ApplicationPatch(BaseModel):
+    application_date: Optional[date] = None
+    target_product: Optional[TargetProductEnum] = None
+    status: Optional[ApplicationStatusEnum] = None
+    user_id: Optional[int] = None
+    version: Optional[int] = None
+
+
+class ApplicationBulkUpdate(ApplicationUpdate):
+    id: int
+
+
 class ApplicationResponse(ApplicationBase):
     id: int
+    # Cleared when the user is deleted; the application is kept.
+    user_id: Optional[int] = None
+    version: int = 1
     user_name: Optional[str] = None
     project: Optional[str] = None  # Add project field
 
     class Config:
         orm_mode = True
 
-@router.get("/applications", response_model=List[ApplicationResponse])
-def get_applications(month: Optional[str] = None, project: Optional[str] = None, db: Session = Depends(get_db)):
-    query = db.query(Application)
+
+class ApplicationPage(BaseModel):
+    items: List[ApplicationResponse]
+    next_cursor: Optional[str] = None
+
+
+class ApplicationCount(BaseModel):
+    status: ApplicationStatusEnum
+    target_product: TargetProductEnum
+    count: int
+
+
+class ApplicationStats(BaseModel):
+    month: str
+    total: int
+    by_status: Dict[ApplicationStatusEnum, int]
+    by_product: Dict[TargetProductEnum, int]
+    counts: List[ApplicationCount]
+
+
+def parse_month(month: str) -> int:
+    try:
+        year_str, month_str = month.split("-")
+        return month_key(date(int(year_str), int(month_str), 1))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid month format. Use YYYY-MM")
+
+
+def applications_query(
+    month: Optional[str], project: Optional[str], model=Application, fields=None
+):
+    # Select only the columns the response needs, with the user's name and
+    # project pulled in by the same join, instead of one user query per row.
+    # model is Application or ArchivedApplication, which share these columns.
+    columns = {
+        "id": model.id,
+        "application_date": model.application_date,
+        "target_product": model.target_product,
+        "status": model.status,
+        "user_id": model.user_id,
+        "user_name": User.name.label("user_name"),
+        "project": User.project.label("project"),
+        "version": model.version,
+    }
+    if fields is not None:
+        columns = {name: column for name, column in columns.items() if name in fields}
+    query = select(*columns.values())
+    # Rows narrowed to their own columns skip the join.
+    if project or "user_name" in columns or "project" in columns:
+        query = query.outerjoin(User, model.user_id == User.id)
 
     if month:
-        try:
-            year_str, month_str = month.split('-')
-            year = int(year_str)
-            month_num = int(month_str)
-            start_date = date(year, month_num, 1)
-
-            if month_num == 12:
-                end_date = date(year + 1, 1, 1)
-            else:
-                end_date = date(year, month_num + 1, 1)
-
-            query = query.filter(
-                Application.application_date >= start_date,
-                Application.application_date < end_date
-            )
-        except ValueError:
-            raise HTTPException(status_code=400, detail="Invalid month format. Use YYYY-MM")
-            
+        query = query.filter(model.application_month == parse_month(month))
+
     if project:
-        query = query.join(User).filter(User.project == project)
-
-    applications = query.all()
-
-    result = []
-    for app in applications:
-        user = db.query(User).filter(User.id == app.user_id).first()
-        app_dict = {
-            "id": app.id,
-            "application_date": app.application_date,
-            "target_product": app.target_product,
-            "status": app.status,
-            "user_id": app.user_id,
-            "user_name": user.name if user else None,
-            "project": user.project if user else None  # Add project field
+        query = query.filter(User.project == project)
+
+    return query
+
+
+def application_models(month: Optional[str]):
+    # The tables that can hold the month's applications: recent months are
+    # only in the hot table, older ones and the unfiltered list in both.
+    if reads_archive(parse_month(month) if month else None):
+        return [Application, ArchivedApplication]
+    return [Application]
+
+
+def application_pages(
+    month: Optional[str],
+    project: Optional[str],
+    after=None,
+    limit=None,
+    fields=None,
+    ids=None,
+):
+    # Applications in keyset order after the (date, id) pair, from every table
+    # that can hold them. Each table is read in index order and limited on its
+    # own before the results are merged, so the archive costs one index range.
+    parts = []
+    for model in application_models(month):
+        part = applications_query(month, project, model, fields)
+        if ids is not None:
+            part = part.filter(model.id.in_(ids))
+        if after:
+            last_date, last_id = after
+            part = part.filter(
+                or_(
+                    model.application_date > last_date,
+                    and_(model.application_date == last_date, model.id > last_id),
+                )
+            )
+        part = part.order_by(model.application_date, model.id).limit(limit)
+        parts.append(part)
+
+    if len(parts) == 1:
+        return parts[0]
+    # SQLite only accepts ORDER BY and LIMIT in a compound member as a subquery.
+    merged = union_all(*(select(part.subquery()) for part in parts)).subquery()
+    return select(merged).order_by(merged.c.application_date, merged.c.id).limit(limit)
+
+
+def application_response(db_application: Application, user: User) -> dict:
+    # The same fields a list row carries, without the ORM instance state.
+    return {
+        "id": db_application.id,
+        "application_date": db_application.application_date,
+        "target_product": db_application.target_product,
+        "status": db_application.status,
+        "user_id": db_application.user_id,
+        "user_name": user.name,
+        "project": user.project,
+        "version": db_application.version,
+    }
+
+
+async def application_changes(
+    db: AsyncSession, user_ids=(), application_ids=()
+) -> Changes:
+    # A write changes the list of every project involved: those of the users
+    # it assigns and those of the users of the rows it replaces or removes.
+    previous_users = select(Application.user_id).filter(
+        Application.id.in_(application_ids)
+    )
+    projects = await db.scalars(
+        select(User.project)
+        .filter(or_(User.id.in_(user_ids), User.id.in_(previous_users)))
+        .distinct()
+    )
+    changes = Changes()
+    changes.application(None)
+    for project in projects:
+        changes.application(project)
+    return changes
+
+
+@router.get("/applications", response_model=ApplicationPage)
+async def get_applications(
+    request: Request,
+    response: Response,
+    month: Optional[str] = None,
+    project: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(
+        None,
+        description=(
+            "Comma-separated fields to return; "
+            "id and application_date are always included"
+        ),
+    ),
+    ids: Optional[str] = Query(
+        None, description="Comma-separated application ids to look up"
+    ),
+    db: AsyncSession = Depends(get_read_db),
+):
+    # The cursor is built from application_date and id, so both are kept.
+    fields = parse_fields(fields, ApplicationResponse, ("id", "application_date"))
+    ids = parse_ids(ids)
+    scopes = [project_scope(project)] if project else [ALL]
+    cache_key = response_cache.key(
+        "applications", month, project, limit, cursor, fields, ids
+    )
+    not_modified = await conditional_get(
+        request,
+        response,
+        db,
+        "applications",
+        scopes,
+        month,
+        project,
+        limit,
+        cursor,
+        fields,
+        ids,
+    )
+    if not_modified:
+        return not_modified
+    cached = await response_cache.lookup(cache_key, response.headers["ETag"])
+    if cached:
+        return cached
+
+    after = decode_cursor(cursor, date.fromisoformat, int) if cursor else None
+    # Fetch one extra row to know whether another page follows.
+    rows = (
+        await db.execute(
+            application_pages(month, project, after, limit + 1, fields, ids)
+        )
+    ).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].application_date, rows[-1].id)
+
+    page = ApplicationPage
+    if fields is not None:
+        page = page_model(partial_model(ApplicationResponse, fields))
+    return await response_cache.store(
+        cache_key,
+        "applications",
+        scopes,
+        response.headers["ETag"],
+        page,
+        {"items": [row._asdict() for row in rows], "next_cursor": next_cursor},
+    )
+
+
+@router.get("/applications/stats", response_model=ApplicationStats)
+async def get_application_stats(
+    request: Request,
+    response: Response,
+    month: str,
+    db: AsyncSession = Depends(get_read_db),
+):
+    key = parse_month(month)
+    cache_key = response_cache.key("applications-stats", key)
+    not_modified = await conditional_get(
+        request, response, db, "applications", [ALL], "stats", key
+    )
+    if not_modified:
+        return not_modified
+    cached = await response_cache.lookup(cache_key, response.headers["ETag"])
+    if cached:
+        return cached
+
+    # Answered from the (month, status, product) index of each table alone.
+    found = {}
+    for model in application_models(month):
+        rows = (
+            await db.execute(
+                select(model.status, model.target_product, func.count())
+                .filter(model.application_month == key)
+                .group_by(model.status, model.target_product)
+            )
+        ).all()
+        for status, product, count in rows:
+            found[(status, product)] = found.get((status, product), 0) + count
+
+    counts = [
+        {
+            "status": status.value,
+            "target_product": product.value,
+            "count": found.get((status.value, product.value), 0),
         }
-        result.append(app_dict)
+        for status in ApplicationStatus
+        for product in TargetProduct
+    ]
+    by_status = {status.value: 0 for status in ApplicationStatus}
+    by_product = {product.value: 0 for product in TargetProduct}
+    for count in counts:
+        by_status[count["status"]] += count["count"]
+        by_product[count["target_product"]] += count["count"]
+
+    return await response_cache.store(
+        cache_key,
+        "applications",
+        [ALL],
+        response.headers["ETag"],
+        ApplicationStats,
+        {
+            "month": f"{key // 100:04d}-{key % 100:02d}",
+            "total": sum(by_status.values()),
+            "by_status": by_status,
+            "by_product": by_product,
+            "counts": counts,
+        },
+    )
+
+
+@router.get("/applications/export")
+async def export_applications(
+    request: Request,
+    month: Optional[str] = None,
+    project: Optional[str] = None,
+    format: ExportFormat = ExportFormat.NDJSON,
+):
+    query = application_pages(month, project)
+
+    filename = f"applications-{month}" if month else "applications"
+    return export_response(query, format, filename, read_sessionmaker(request))
 
-    return result
 
 @router.post("/applications", response_model=ApplicationResponse)
-def create_application(application: ApplicationCreate, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == application.user_id).first()
+async def create_application(
+    application: ApplicationCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user_id: Optional[int] = Header(None, alias="user-id"),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+):
+    retry = idempotency(
+        idempotency_key, f"{current_user_id} POST /applications", application.dict()
+    )
+    if retry:
+        replayed = await retry.replay(db)
+        if replayed:
+            return replayed
+
+    user = await db.get(User, application.user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
     db_application = Application(**application.dict())
     db.add(db_application)
-    db.commit()
-    db.refresh(db_application)
+    changes = Changes()
+    changes.application(user.project)
+    await changes.apply(db)
+    # Flushed for the id and version the response carries.
+    await db.flush()
+    content = application_response(db_application, user)
+    response = respond(content, ApplicationResponse)
+    events = Events()
+    events.application("created", db_application.id, after=content)
+    if retry:
+        await retry.remember(db, response)
+        replayed = await retry.commit(db)
+        if replayed:
+            return replayed
+    else:
+        await db.commit()
+    await response_cache.invalidate(changes)
+    await event_feed.publish(events)
+    return response
 
-    response = db_application.__dict__.copy()
-    response["user_name"] = user.name
 
-    return response
+def parse_bulk_applications(raw_items, model, results: BulkResults):
+    parsed = {}
+    for index, raw in enumerate(raw_items):
+        try:
+            parsed[index] = model.parse_obj(raw)
+        except ValidationError as e:
+            results.error(index, validation_detail(e))
+    return parsed
 
-@router.put("/applications/{application_id}", response_model=ApplicationResponse)
-def update_application(application_id: int, application: ApplicationCreate, db: Session = Depends(get_db)):
-    db_application = db.query(Application).filter(Application.id == application_id).first()
+
+async def existing_ids(db: AsyncSession, column, ids):
+    return set((await db.scalars(select(column).filter(column.in_(ids)))).all())
+
+
+@router.post(
+    "/applications/bulk",
+    response_model=BulkResponse,
+    openapi_extra=bulk_openapi(ApplicationCreate),
+)
+async def create_applications_bulk(
+    request: Request, db: AsyncSession = Depends(get_db)
+):
+    raw_items = await read_bulk_items(request)
+    results = BulkResults(len(raw_items))
+    parsed = parse_bulk_applications(raw_items, ApplicationCreate, results)
+
+    known_users = await existing_ids(db, User.id, {a.user_id for a in parsed.values()})
+
+    pending = {}
+    for index, application in parsed.items():
+        if application.user_id not in known_users:
+            results.error(index, "User not found")
+            continue
+        pending[index] = application
+
+    if pending:
+        ids = (
+            await db.scalars(
+                insert(Application).returning(
+                    Application.id, sort_by_parameter_order=True
+                ),
+                [application.dict() for application in pending.values()],
+            )
+        ).all()
+        changes = await application_changes(db, {a.user_id for a in pending.values()})
+        await changes.apply(db)
+        await db.commit()
+        await response_cache.invalidate(changes)
+        events = Events()
+        for application, application_id in zip(pending.values(), ids):
+            events.application(
+                "created", application_id, after=dict(application.dict(), version=1)
+            )
+        await event_feed.publish(events)
+        for index, application_id in zip(pending, ids):
+            results.ok(index, "created", application_id)
+
+    return results.response()
+
+
+@router.put(
+    "/applications/bulk",
+    response_model=BulkResponse,
+    openapi_extra=bulk_openapi(ApplicationBulkUpdate),
+)
+async def update_applications_bulk(
+    request: Request, db: AsyncSession = Depends(get_db)
+):
+    raw_items = await read_bulk_items(request)
+    results = BulkResults(len(raw_items))
+    parsed = parse_bulk_applications(raw_items, ApplicationBulkUpdate, results)
+
+    versions = dict(
+        (
+            await db.execute(
+                select(Application.id, Application.version).filter(
+                    Application.id.in_({a.id for a in parsed.values()})
+                )
+            )
+        ).all()
+    )
+    known_users = await existing_ids(db, User.id, {a.user_id for a in parsed.values()})
+    archived = await existing_ids(
+        db, ArchivedApplication.id, {a.id for a in parsed.values()} - versions.keys()
+    )
+
+    pending = {}
+    for index, application in parsed.items():
+        if application.id in archived:
+            results.error(index, "Application is archived", application.id)
+        elif application.id not in versions:
+            results.error(index, "Application not found", application.id)
+        elif application.user_id not in known_users:
+            results.error(index, "User not found", application.id)
+        elif application.version not in (None, versions[application.id]):
+            results.error(
+                index,
+                f"Version conflict: the current version is {versions[application.id]}",
+                application.id,
+            )
+        else:
+            pending[index] = application
+    if not pending:
+        return results.response()
+
+    # Read before the update replaces the users of the rows.
+    changes = await application_changes(
+        db,
+        {a.user_id for a in pending.values()},
+        {a.id for a in pending.values()},
+    )
+    # Core updates skip the ORM validator that keeps application_month in step
+    # with application_date. Each row is written only if it is still at the
+    # version read above.
+    changed = await compare_and_set_many(
+        db,
+        Application,
+        [
+            dict(
+                application.dict(exclude={"version"}),
+                application_month=month_key(application.application_date),
+                version=versions[application.id] + 1,
+            )
+            for application in pending.values()
+        ],
+        versions,
+    )
+    for index, application in list(pending.items()):
+        if application.id in changed:
+            results.error(index, CHANGED_DETAIL, application.id)
+            del pending[index]
+
+    if pending:
+        await changes.apply(db)
+        await db.commit()
+        await response_cache.invalidate(changes)
+        events = Events()
+        for application in pending.values():
+            after = dict(application.dict(), version=versions[application.id] + 1)
+            events.application("updated", application.id, after=after)
+        await event_feed.publish(events)
+        for index, application in pending.items():
+            results.ok(index, "updated", application.id)
+
+    return results.response()
+
+
+@router.delete(
+    "/applications/bulk",
+    response_model=BulkResponse,
+    openapi_extra=bulk_openapi({"type": "integer"}),
+)
+async def delete_applications_bulk(
+    request: Request, db: AsyncSession = Depends(get_db)
+):
+    raw_items = await read_bulk_items(request)
+    results = BulkResults(len(raw_items))
+
+    # JSON true and false pass isinstance(raw, int), so the type is compared.
+    ids = [raw for raw in raw_items if type(raw) is int]
+    known_applications = await existing_ids(db, Application.id, ids)
+    archived = await existing_ids(
+        db, ArchivedApplication.id, set(ids) - known_applications
+    )
+
+    pending = {}
+    seen = set()
+    for index, application_id in enumerate(raw_items):
+        if type(application_id) is not int:
+            results.error(index, "Expected an application id")
+        elif application_id in seen:
+            results.error(index, "Duplicate application id", application_id)
+        elif application_id in archived:
+            results.error(index, "Application is archived", application_id)
+        elif application_id not in known_applications:
+            results.error(index, "Application not found", application_id)
+        else:
+            pending[index] = application_id
+            seen.add(application_id)
+
+    if pending:
+        changes = await application_changes(db, application_ids=set(pending.values()))
+        await db.execute(
+            delete(Application).filter(Application.id.in_(pending.values()))
+        )
+        await changes.apply(db)
+        await db.commit()
+        await response_cache.invalidate(changes)
+        events = Events()
+        for application_id in pending.values():
+            events.application("deleted", application_id)
+        await event_feed.publish(events)
+        for index, application_id in pending.items():
+            results.ok(index, "deleted", application_id)
+
+    return results.response()
+
+
+async def get_hot_application(db: AsyncSession, application_id: int) -> Application:
+    db_application = await db.get(Application, application_id)
     if db_application is None:
+        if await db.get(ArchivedApplication, application_id) is not None:
+            raise HTTPException(status_code=409, detail="Application is archived")
         raise HTTPException(status_code=404, detail="Application not found")
+    return db_application
 
-    user = db.query(User).filter(User.id == application.user_id).first()
-    if not user:
+
+async def write_application(
+    db: AsyncSession, application_id: int, values: dict, version: Optional[int]
+):
+    # Shared by PUT and PATCH: values holds the fields to write. With the
+    # version the client read, the update checks it and the row is only read
+    # to explain an update that matched nothing.
+    db_application = None
+    if version is None:
+        db_application = await get_hot_application(db, application_id)
+        version = db_application.version
+
+    # A PATCH without user_id keeps the row's user, read after the update when
+    # the row was not read before it.
+    user_id = values.get("user_id")
+    if user_id is None and db_application is not None:
+        user_id = db_application.user_id
+    user = await db.get(User, user_id) if user_id is not None else None
+    if user_id is not None and user is None:
         raise HTTPException(status_code=404, detail="User not found")
 
-    for key, value in application.dict().items():
-        setattr(db_application, key, value)
+    if "application_date" in values:
+        # The validator that keeps the month in step only sees ORM writes.
+        values["application_month"] = month_key(values["application_date"])
 
-    db.commit()
-    db.refresh(db_application)
+    changes = await application_changes(
+        db, [user.id] if user is not None else [], [application_id]
+    )
+    try:
+        updated = await compare_and_set(
+            db,
+            Application,
+            application_id,
+            version,
+            values,
+            [
+                Application.id,
+                Application.application_date,
+                Application.target_product,
+                Application.status,
+                Application.user_id,
+                Application.version,
+            ],
+        )
+    except HTTPException:
+        if db_application is None:
+            # Missing, archived, or at another version than the client read.
+            check_version(
+                version, (await get_hot_application(db, application_id)).version
+            )
+        raise
+    if user is None:
+        if updated.user_id is not None:
+            user = await db.get(User, updated.user_id)
+        if user is None:
+            # Raised before the commit, so the update is rolled back.
+            raise HTTPException(status_code=404, detail="User not found")
 
-    response = db_application.__dict__.copy()
-    response["user_name"] = user.name
+    await changes.apply(db)
+    await db.commit()
+    await response_cache.invalidate(changes)
+
+    content = dict(updated._asdict(), user_name=user.name, project=user.project)
+    if db_application is None:
+        # Without the old row, the fields the update did not set stand in for
+        # it.
+        written = set(values) | {"version"}
+        if "user_id" in values:
+            written |= {"user_name", "project"}
+        before = {name: value for name, value in content.items() if name not in written}
+    elif user.id == db_application.user_id:
+        # The user's name and project only count as changed when user_id does.
+        before = application_response(db_application, user)
+    else:
+        before = db_application
+    events = Events()
+    events.application("updated", application_id, before, content)
+    await event_feed.publish(events)
+    return respond(content, ApplicationResponse)
+
+
+@router.put("/applications/{application_id}", response_model=ApplicationResponse)
+async def update_application(
+    application_id: int,
+    application: ApplicationUpdate,
+    db: AsyncSession = Depends(get_db),
+):
+    values = application.dict(exclude={"version"})
+    return await write_application(db, application_id, values, application.version)
+
+
+@router.patch("/applications/{application_id}", response_model=ApplicationResponse)
+async def patch_application(
+    application_id: int,
+    application: ApplicationPatch,
+    db: AsyncSession = Depends(get_db),
+):
+    # Only the fields sent are written; null means unchanged.
+    values = {
+        key: value
+        for key, value in application.dict(exclude={"version"}).items()
+        if value is not None
+    }
+    # A write of nothing would still bump the version and announce a change.
+    if not values:
+        raise HTTPException(status_code=422, detail="No fields to update")
+    return await write_application(db, application_id, values, application.version)
 
-    return response
 
 @router.delete("/applications/{application_id}")
-def delete_application(application_id: int, db: Session = Depends(get_db)):
-    db_application = db.query(Application).filter(Application.id == application_id).first()
-    if db_application is None:
-        raise HTTPException(status_code=404, detail="Application not found")
+async def delete_application(application_id: int, db: AsyncSession = Depends(get_db)):
+    db_application = await get_hot_application(db, application_id)
 
-    db.delete(db_application)
-    db.commit()
+    changes = await application_changes(db, application_ids=[application_id])
+    await db.delete(db_application)
+    await changes.apply(db)
+    await db.commit()
+    await response_cache.invalidate(changes)
+    events = Events()
+    events.application("deleted", application_id)
+    await event_feed.publish(events)
     return {"message": "Application deleted successfully"}
@@ -0,0 +1,86 @@
+import json
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from .. import config
+from ..auth import load_user
+from ..database import SessionLocal
+from ..events import event_feed, public, visible
+
+router = APIRouter()
+
+ENTITIES = {"users", "applications", "tenants"}
+
+
+async def _viewer(user_id: Optional[int]):
+    if user_id is None:
+        return None
+    # Served from the auth cache, so reloading per batch picks up role
+    # changes without a query per event.
+    async with SessionLocal() as db:
+        return await load_user(db, user_id)
+
+
+def _message(event: str, data: dict, event_id: Optional[str] = None) -> str:
+    lines = [f"id: {event_id}"] if event_id else []
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def _stream(user_id: Optional[int], entities: set, after: Optional[str]):
+    event_feed.subscribers += 1
+    try:
+        if after is None:
+            after = await event_feed.backend.last_id()
+        yield "retry: 3000\n\n"
+        while True:
+            batch = await event_feed.backend.read(after, config.EVENTS_HEARTBEAT)
+            if batch is None:
+                # The id is unknown or too old to resume from: the client
+                # reloads its lists and continues from the current position.
+                after = await event_feed.backend.last_id()
+                yield _message("reset", {"last_id": after}, after)
+                continue
+            if not batch:
+                yield ": keepalive\n\n"
+                continue
+
+            viewer = await _viewer(user_id)
+            for event_id, record in batch:
+                after = event_id
+                if record["entity"] in entities and visible(record, viewer):
+                    yield _message("change", public(record), event_id)
+    finally:
+        event_feed.subscribers -= 1
+
+
+@router.get("/events")
+async def events(
+    entities: Optional[str] = None,
+    since: Optional[str] = None,
+    user_id: Optional[int] = Query(None),
+    current_user_id: Optional[int] = Header(None, alias="user-id"),
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+):
+    # EventSource cannot set headers, so browsers pass the caller as ?user_id=
+    # and the position to resume from as ?since=; reconnects send
+    # Last-Event-ID themselves.
+    user_id = current_user_id if current_user_id is not None else user_id
+    if user_id is not None and await _viewer(user_id) is None:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    wanted = set(entities.split(",")) if entities else ENTITIES
+    if not wanted <= ENTITIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown entities: {', '.join(sorted(wanted - ENTITIES))}",
+        )
+
+    return StreamingResponse(
+        _stream(user_id, wanted, last_event_id or since),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,129 +1,210 @@
-from fastapi import APIRouter, Depends, HTTPException, Header
-from sqlalchemy.orm import Session
-from typing import List, Optional
-from ..database import get_db, Tenant, User, UserType
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from pydantic import BaseModel
+from sqlalchemy import false, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..auth import CurrentUser, check_superadmin_permission, get_current_user
+from ..database import Tenant, User, UserType, get_db, get_read_db
+from ..etags import conditional_get
+from ..events import Events, event_feed
+from ..response_cache import response_cache
+from ..tenants import invalidate_tenant
+from ..versions import ALL, Changes, tenant_scope
 
 router = APIRouter()
 
+
 class TenantBase(BaseModel):
     name: str
     update_cycle: int
 
+
 class TenantCreate(TenantBase):
     pass
 
+
 class TenantUpdate(TenantBase):
     pass
 
+
 class TenantResponse(TenantBase):
     id: int
-    
+
     class Config:
         orm_mode = True
 
-def get_current_user(user_id: Optional[int] = Header(None), db: Session = Depends(get_db)):
-    if user_id is None:
-        return None
-    
-    user = db.query(User).filter(User.id == user_id).first()
-    if user is None:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    return user
-
-def check_superadmin_permission(current_user: User = Depends(get_current_user)):
-    if current_user is None:
-        raise HTTPException(status_code=401, detail="Authentication required")
-    
-    if current_user.user_type != UserType.SUPERADMIN:
-        raise HTTPException(status_code=403, detail="Super admin permission required")
-    
-    return current_user
 
 @router.get("/tenants", response_model=List[TenantResponse])
-def get_tenants(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    if current_user is None or current_user.user_type != UserType.SUPERADMIN:
-        if current_user:
-            tenant = db.query(Tenant).filter(Tenant.name == current_user.tenant).first()
-            return [tenant] if tenant else []
-        return []
-    
-    tenants = db.query(Tenant).all()
-    return tenants
+async def get_tenants(
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    if current_user is None:
+        scopes, caller = [], ("anonymous",)
+    elif current_user.user_type == UserType.SUPERADMIN:
+        scopes, caller = [ALL], ("superadmin",)
+    else:
+        scopes, caller = [tenant_scope(current_user.tenant_id)], (
+            "tenant",
+            current_user.tenant_id,
+        )
+    cache_key = response_cache.key("tenants", caller)
+    not_modified = await conditional_get(
+        request, response, db, "tenants", scopes, caller
+    )
+    if not_modified:
+        return not_modified
+    cached = await response_cache.lookup(cache_key, response.headers["ETag"])
+    if cached:
+        return cached
+
+    query = select(Tenant.id, Tenant.name, Tenant.update_cycle)
+    if current_user is None:
+        query = query.filter(false())
+    elif current_user.user_type != UserType.SUPERADMIN:
+        query = query.filter(Tenant.id == current_user.tenant_id)
+    tenants = (await db.execute(query)).all()
+
+    return await response_cache.store(
+        cache_key,
+        "tenants",
+        scopes,
+        response.headers["ETag"],
+        TenantResponse,
+        [row._asdict() for row in tenants],
+    )
+
 
 @router.post("/tenants", response_model=TenantResponse)
-def create_tenant(
-    tenant: TenantCreate, 
-    db: Session = Depends(get_db), 
-    current_user: User = Depends(check_superadmin_permission)
+async def create_tenant(
+    tenant: TenantCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(check_superadmin_permission),
 ):
-    existing_tenant = db.query(Tenant).filter(Tenant.name == tenant.name).first()
+    existing_tenant = await db.scalar(select(Tenant).filter(Tenant.name == tenant.name))
     if existing_tenant:
-        raise HTTPException(status_code=400, detail="Tenant with this name already exists")
-    
+        raise HTTPException(
+            status_code=400, detail="Tenant with this name already exists"
+        )
+
     db_tenant = Tenant(**tenant.dict())
     db.add(db_tenant)
-    db.commit()
-    db.refresh(db_tenant)
+    await db.flush()
+    changes = Changes()
+    changes.tenant(db_tenant.id)
+    await changes.apply(db)
+    await db.commit()
+    await response_cache.invalidate(changes)
+    await db.refresh(db_tenant)
+    events = Events()
+    events.tenant("created", db_tenant.id, after=db_tenant)
+    await event_feed.publish(events)
     return db_tenant
 
+
 @router.get("/tenants/{tenant_id}", response_model=TenantResponse)
-def get_tenant(
-    tenant_id: int, 
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+async def get_tenant(
+    tenant_id: int,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
-    db_tenant = db.query(Tenant).filter(Tenant.id == tenant_id).first()
+    db_tenant = await db.get(Tenant, tenant_id)
     if db_tenant is None:
         raise HTTPException(status_code=404, detail="Tenant not found")
-    
+
     if current_user and current_user.user_type != UserType.SUPERADMIN:
-        if db_tenant.name != current_user.tenant:
+        if db_tenant.id != current_user.tenant_id:
             raise HTTPException(status_code=403, detail="Permission denied")
-    
+
     return db_tenant
 
+
 @router.put("/tenants/{tenant_id}", response_model=TenantResponse)
-def update_tenant(
-    tenant_id: int, 
-    tenant: TenantUpdate, 
-    db: Session = Depends(get_db),
-    current_user: User = Depends(check_superadmin_permission)
+async def update_tenant(
+    tenant_id: int,
+    tenant: TenantUpdate,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(check_superadmin_permission),
 ):
-    db_tenant = db.query(Tenant).filter(Tenant.id == tenant_id).first()
+    db_tenant = await db.get(Tenant, tenant_id)
     if db_tenant is None:
         raise HTTPException(status_code=404, detail="Tenant not found")
-    
+
     if tenant.name != db_tenant.name:
-        existing_tenant = db.query(Tenant).filter(Tenant.name == tenant.name).first()
+        existing_tenant = await db.scalar(
+            select(Tenant).filter(Tenant.name == tenant.name)
+        )
         if existing_tenant:
-            raise HTTPException(status_code=400, detail="Tenant with this name already exists")
-    
+            raise HTTPException(
+                status_code=400, detail="Tenant with this name already exists"
+            )
+
+    old_name = db_tenant.name
+    before = {"name": old_name, "update_cycle": db_tenant.update_cycle}
     for key, value in tenant.dict().items():
         setattr(db_tenant, key, value)
-    
-    db.commit()
-    db.refresh(db_tenant)
+
+    changes = Changes()
+    changes.tenant(tenant_id)
+    if tenant.name != old_name:
+        # Users follow the tenant by id; their copy of the name is updated with it.
+        await db.execute(
+            update(User).filter(User.tenant_id == tenant_id).values(tenant=tenant.name)
+        )
+        renamed = await db.execute(
+            select(User.project, User.user_type)
+            .filter(User.tenant_id == tenant_id)
+            .distinct()
+        )
+        for row in renamed:
+            changes.user(row, counters_only=True)
+
+    await changes.apply(db)
+    await db.commit()
+    await response_cache.invalidate(changes)
+    await db.refresh(db_tenant)
+    invalidate_tenant(old_name)
+    # Subscribers apply a rename to the users of the tenant themselves.
+    events = Events()
+    events.tenant("updated", tenant_id, before, db_tenant)
+    await event_feed.publish(events)
     return db_tenant
 
+
 @router.delete("/tenants/{tenant_id}")
-def delete_tenant(
-    tenant_id: int, 
-    db: Session = Depends(get_db),
-    current_user: User = Depends(check_superadmin_permission)
+async def delete_tenant(
+    tenant_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(check_superadmin_permission),
 ):
-    db_tenant = db.query(Tenant).filter(Tenant.id == tenant_id).first()
+    db_tenant = await db.get(Tenant, tenant_id)
     if db_tenant is None:
         raise HTTPException(status_code=404, detail="Tenant not found")
-    
-    users_count = db.query(User).filter(User.tenant == db_tenant.name).count()
+
+    users_count = await db.scalar(
+        select(func.count()).select_from(User).filter(User.tenant_id == tenant_id)
+    )
     if users_count > 0:
         raise HTTPException(
-            status_code=400, 
-            detail=f"Cannot delete tenant with {users_count} associated users. Please reassign or delete these users first."
+            status_code=400,
+            detail=(
+                f"Cannot delete tenant with {users_count} associated users. "
+                "Please reassign or delete these users first."
+            ),
         )
-    
-    db.delete(db_tenant)
-    db.commit()
+
+    await db.delete(db_tenant)
+    changes = Changes()
+    changes.tenant(tenant_id)
+    await changes.apply(db)
+    await db.commit()
+    await response_cache.invalidate(changes)
+    invalidate_tenant(db_tenant.name)
+    events = Events()
+    events.tenant("deleted", tenant_id)
+    await event_feed.publish(events)
     return {"message": "Tenant deleted successfully"}
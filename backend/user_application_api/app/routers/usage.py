@@ -0,0 +1,155 @@
+from datetime import date
+from enum import Enum
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..auth import CurrentUser, check_superadmin_permission, get_current_user
+from ..database import Tenant, UsageRollup, UserType, get_db
+from ..usage import current_cycles, cycle_bounds, ensure_current, rebuild
+
+router = APIRouter()
+
+
+class UsageGroupBy(str, Enum):
+    DEPARTMENT = "department"
+    PROJECT = "project"
+
+
+class UsageTotals(BaseModel):
+    users: int = 0
+    tabs_accepted: int = 0
+    premium_requests_used: int = 0
+
+
+class UsageGroup(UsageTotals):
+    department: Optional[str] = None
+    project: Optional[str] = None
+
+
+class TenantUsage(BaseModel):
+    tenant_id: int
+    tenant: str
+    cycle_start: date
+    cycle_end: date
+    totals: UsageTotals
+    groups: List[UsageGroup]
+
+
+class TenantUsageSummary(UsageTotals):
+    tenant_id: int
+    tenant: str
+    cycle_start: date
+    cycle_end: date
+
+
+COUNTERS = (
+    func.sum(UsageRollup.users).label("users"),
+    func.sum(UsageRollup.tabs_accepted).label("tabs_accepted"),
+    func.sum(UsageRollup.premium_requests_used).label("premium_requests_used"),
+)
+
+
+@router.get("/tenants/{tenant_id}/usage", response_model=TenantUsage)
+async def get_tenant_usage(
+    tenant_id: int,
+    group_by: Optional[UsageGroupBy] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    if current_user is None:
+        raise HTTPException(status_code=401, detail="Authentication required")
+
+    db_tenant = await db.get(Tenant, tenant_id)
+    if db_tenant is None:
+        raise HTTPException(status_code=404, detail="Tenant not found")
+
+    if (
+        current_user.user_type != UserType.SUPERADMIN
+        and db_tenant.id != current_user.tenant_id
+    ):
+        raise HTTPException(status_code=403, detail="Permission denied")
+
+    cycle_start = (await ensure_current(db, [db_tenant.id]))[db_tenant.id]
+    scope = (
+        UsageRollup.tenant_id == db_tenant.id,
+        UsageRollup.cycle_start == cycle_start,
+    )
+
+    totals = (await db.execute(select(*COUNTERS).filter(*scope))).one()
+    groups = []
+    if group_by is not None:
+        column = getattr(UsageRollup, group_by.value)
+        rows = await db.execute(
+            select(column, *COUNTERS).filter(*scope).group_by(column).order_by(column)
+        )
+        groups = [row._asdict() for row in rows]
+
+    return {
+        "tenant_id": db_tenant.id,
+        "tenant": db_tenant.name,
+        "cycle_start": cycle_start,
+        "cycle_end": cycle_bounds(db_tenant.update_cycle, cycle_start)[1],
+        "totals": {k: v or 0 for k, v in totals._asdict().items()},
+        "groups": groups,
+    }
+
+
+@router.get("/usage/summary", response_model=List[TenantUsageSummary])
+async def get_usage_summary(
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    if current_user is None:
+        raise HTTPException(status_code=401, detail="Authentication required")
+
+    query = select(Tenant).order_by(Tenant.id)
+    if current_user.user_type != UserType.SUPERADMIN:
+        query = query.filter(Tenant.id == current_user.tenant_id)
+    tenants = (await db.execute(query)).scalars().all()
+    if not tenants:
+        return []
+
+    cycles = await ensure_current(db, [tenant.id for tenant in tenants])
+    rows = await db.execute(
+        select(UsageRollup.tenant_id, UsageRollup.cycle_start, *COUNTERS)
+        .filter(
+            UsageRollup.tenant_id.in_(cycles),
+            UsageRollup.cycle_start >= min(cycles.values()),
+        )
+        .group_by(UsageRollup.tenant_id, UsageRollup.cycle_start)
+    )
+    totals = {
+        row.tenant_id: row for row in rows if row.cycle_start == cycles[row.tenant_id]
+    }
+
+    summary = []
+    for tenant in tenants:
+        row = totals.get(tenant.id)
+        start, end = cycle_bounds(tenant.update_cycle, cycles[tenant.id])
+        summary.append(
+            {
+                "tenant_id": tenant.id,
+                "tenant": tenant.name,
+                "cycle_start": start,
+                "cycle_end": end,
+                "users": row.users if row else 0,
+                "tabs_accepted": row.tabs_accepted if row else 0,
+                "premium_requests_used": row.premium_requests_used if row else 0,
+            }
+        )
+    return summary
+
+
+@router.post("/usage/rebuild")
+async def rebuild_usage(
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(check_superadmin_permission),
+):
+    tenants = (await db.scalars(select(Tenant.id))).all()
+    await rebuild(db, await current_cycles(db, tenants))
+    await db.commit()
+    return {"message": "Usage rollups rebuilt", "tenants": len(tenants)}
@@ -1,17 +1,64 @@
-from fastapi import APIRouter, Depends, HTTPException, Header
-from sqlalchemy.orm import Session
-from typing import List, Optional
-from ..database import get_db, User, UserType
-from pydantic import BaseModel, Field
 from enum import Enum
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from pydantic import BaseModel, Field, ValidationError
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import config
+from ..auth import (
+    CurrentUser,
+    check_admin_permission,
+    get_current_user,
+    invalidate_user,
+    load_user,
+)
+from ..bulk import (
+    BulkResponse,
+    BulkResults,
+    bulk_openapi,
+    read_bulk_items,
+    validation_detail,
+)
+from ..concurrency import (
+    CHANGED_DETAIL,
+    check_version,
+    compare_and_set,
+    compare_and_set_many,
+)
+from ..database import (
+    Application,
+    ArchivedApplication,
+    User,
+    UserType,
+    get_db,
+    get_read_db,
+    read_sessionmaker,
+)
+from ..etags import conditional_get
+from ..events import Events, event_feed
+from ..export import ExportFormat, export_response
+from ..fields import page_model, parse_fields, parse_ids, partial_model
+from ..idempotency import idempotency
+from ..pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, encode_cursor
+from ..response_cache import response_cache
+from ..search import SearchIndex, match_users
+from ..serialization import respond
+from ..tenants import resolve_tenant_id, resolve_tenant_ids
+from ..usage import UsageDeltas
+from ..usage_buffer import usage_buffer
+from ..versions import ALL, SUPERADMINS, Changes, project_scope
 
 router = APIRouter()
 
+
 class UserTypeEnum(str, Enum):
     SUPERADMIN = "超级管理员"
     PROJECT_ADMIN = "项目管理员"
     REGULAR = "普通用户"
 
+
 class UserBase(BaseModel):
     name: str
     email: str
@@ -23,169 +70,829 @@ class UserBase(BaseModel):
     tabs_accepted: int
     premium_requests_used: int
 
+
 class UserCreate(UserBase):
     pass
 
+
 class UserUpdate(UserBase):
-    pass
+    # Usage counters only move through POST /users/{id}/usage; values sent
+    # here are ignored.
+    tabs_accepted: Optional[int] = None
+    premium_requests_used: Optional[int] = None
+    # The version the client last read; the update is refused if it changed.
+    version: Optional[int] = None
+
+
+class UserPatch(BaseModel):
+    name: Optional[str] = None
+    email: Optional[str] = None
+    tenant: Optional[str] = None
+    department: Optional[str] = None
+    project: Optional[str] = None
+    role: Optional[str] = None
+    user_type: Optional[UserTypeEnum] = None
+    version: Optional[int] = None
+
 
 class UserResponse(UserBase):
     id: int
-    
+    tenant_id: Optional[int] = None
+    version: int = 1
+
     class Config:
         orm_mode = True
 
-def get_current_user(current_user_id: Optional[int] = Header(None, alias="user-id"), db: Session = Depends(get_db)):
-    if current_user_id is None:
-        return None
-    
-    user = db.query(User).filter(User.id == current_user_id).first()
-    if user is None:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    return user
 
-def check_admin_permission(current_user: User = Depends(get_current_user)):
-    if current_user is None:
-        raise HTTPException(status_code=401, detail="Authentication required")
-    
-    if current_user.user_type not in [UserType.SUPERADMIN, UserType.PROJECT_ADMIN]:
-        raise HTTPException(status_code=403, detail="Admin permission required")
-    
-    return current_user
+class UserBulkUpdate(UserUpdate):
+    id: int
+
+
+class UsageIncrement(BaseModel):
+    tabs_accepted: int = Field(0, ge=0)
+    premium_requests_used: int = Field(0, ge=0)
+
+
+class UserPage(BaseModel):
+    items: List[UserResponse]
+    next_cursor: Optional[str] = None
 
-def check_superadmin_permission(current_user: User = Depends(get_current_user)):
+
+# Increments of these may still be buffered, so an admin write of the totals
+# it read would undo them.
+COUNTER_FIELDS = {"tabs_accepted", "premium_requests_used"}
+
+USER_COLUMNS = (
+    User.id,
+    User.name,
+    User.email,
+    User.tenant,
+    User.tenant_id,
+    User.department,
+    User.project,
+    User.role,
+    User.user_type,
+    User.tabs_accepted,
+    User.premium_requests_used,
+    User.version,
+)
+
+
+def user_response(db_user: User) -> dict:
+    return {column.key: getattr(db_user, column.key) for column in USER_COLUMNS}
+
+
+def user_columns(fields: Optional[tuple]):
+    # The columns and page model of a ?fields= selection.
+    if fields is None:
+        return USER_COLUMNS, UserPage
+    columns = [column for column in USER_COLUMNS if column.key in fields]
+    return columns, page_model(partial_model(UserResponse, fields))
+
+
+def scope_users_query(query, current_user: Optional[CurrentUser]):
     if current_user is None:
-        raise HTTPException(status_code=401, detail="Authentication required")
-    
-    if current_user.user_type != UserType.SUPERADMIN:
-        raise HTTPException(status_code=403, detail="Super admin permission required")
-    
-    return current_user
-
-@router.get("/users", response_model=List[UserResponse])
-def get_users(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+        return query.filter(User.user_type == UserType.REGULAR)
+    elif current_user.user_type == UserType.SUPERADMIN:
+        return query
+    elif current_user.user_type == UserType.PROJECT_ADMIN:
+        return query.filter(
+            (User.project == current_user.project)
+            | (User.user_type == UserType.SUPERADMIN)
+        )
+    else:
+        return query.filter(User.id == current_user.id)
+
+
+def users_version_scopes(current_user: Optional[CurrentUser]):
+    # The change versions covering what scope_users_query lets the caller see,
+    # and a key for the caller's view of them.
     if current_user is None:
-        users = db.query(User).filter(User.user_type == UserType.REGULAR).all()
+        return [ALL], ("anonymous",)
     elif current_user.user_type == UserType.SUPERADMIN:
-        users = db.query(User).all()
+        return [ALL], ("superadmin",)
     elif current_user.user_type == UserType.PROJECT_ADMIN:
-        users = db.query(User).filter(
-            (User.project == current_user.project) | 
-            (User.user_type == UserType.SUPERADMIN)
-        ).all()
+        return [project_scope(current_user.project), SUPERADMINS], (
+            "project",
+            current_user.project,
+        )
     else:
-        users = [current_user]
-    
-    return users
+        return [project_scope(current_user.project)], ("user", current_user.id)
 
-@router.post("/users", response_model=UserResponse)
-def create_user(
-    user: UserCreate, 
-    db: Session = Depends(get_db), 
-    current_user: User = Depends(check_admin_permission)
+
+@router.get("/users", response_model=UserPage)
+async def get_users(
+    request: Request,
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(
+        None, description="Comma-separated fields to return; id is always included"
+    ),
+    ids: Optional[str] = Query(None, description="Comma-separated user ids to look up"),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
-    if user.user_type != UserTypeEnum.REGULAR and current_user.user_type != UserType.SUPERADMIN:
+    fields = parse_fields(fields, UserResponse)
+    ids = parse_ids(ids)
+    scopes, caller = users_version_scopes(current_user)
+    cache_key = response_cache.key("users", caller, limit, cursor, fields, ids)
+    not_modified = await conditional_get(
+        request, response, db, "users", scopes, caller, limit, cursor, fields, ids
+    )
+    if not_modified:
+        return not_modified
+    cached = await response_cache.lookup(cache_key, response.headers["ETag"])
+    if cached:
+        return cached
+
+    columns, page = user_columns(fields)
+    # The checks of GET /users/{id}, applied to the whole set: ids the caller
+    # may not see are left out like ids that do not exist.
+    query = scope_users_query(select(*columns), current_user)
+    if ids is not None:
+        query = query.filter(User.id.in_(ids))
+
+    if cursor:
+        (last_id,) = decode_cursor(cursor, int)
+        query = query.filter(User.id > last_id)
+
+    # Fetch one extra row to know whether another page follows.
+    users = (await db.execute(query.order_by(User.id).limit(limit + 1))).all()
+
+    next_cursor = None
+    if len(users) > limit:
+        users = users[:limit]
+        next_cursor = encode_cursor(users[-1].id)
+
+    return await response_cache.store(
+        cache_key,
+        "users",
+        scopes,
+        response.headers["ETag"],
+        page,
+        {"items": [row._asdict() for row in users], "next_cursor": next_cursor},
+    )
+
+
+@router.get("/users/search", response_model=UserPage)
+async def search_users(
+    request: Request,
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(
+        None, description="Comma-separated fields to return; id is always included"
+    ),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    # Users matching every term of q in name, email, department or role, best
+    # match first, scoped like GET /users. The cursor is an offset into the ranking.
+    fields = parse_fields(fields, UserResponse)
+    scopes, caller = users_version_scopes(current_user)
+    cache_key = response_cache.key("users/search", caller, q, limit, cursor, fields)
+    not_modified = await conditional_get(
+        request,
+        response,
+        db,
+        "users",
+        scopes,
+        caller,
+        "search",
+        q,
+        limit,
+        cursor,
+        fields,
+    )
+    if not_modified:
+        return not_modified
+    cached = await response_cache.lookup(cache_key, response.headers["ETag"])
+    if cached:
+        return cached
+
+    offset = decode_cursor(cursor, int)[0] if cursor else 0
+    columns, page = user_columns(fields)
+    query = scope_users_query(select(*columns), current_user)
+    query = match_users(db.bind.dialect.name, q, User, query)
+
+    users = []
+    if query is not None:
+        # Only the SEARCH_MAX_MATCHES best matches are paged through, so a
+        # common term sorts no more than that many rows per page.
+        matches = (
+            query.order_by(query.selected_columns.score.desc(), User.id)
+            .limit(config.SEARCH_MAX_MATCHES)
+            .subquery()
+        )
+        users = (
+            await db.execute(
+                select(*(matches.c[column.key] for column in columns))
+                .order_by(matches.c.score.desc(), matches.c.id)
+                .offset(offset)
+                .limit(limit + 1)
+            )
+        ).all()
+
+    next_cursor = None
+    if len(users) > limit:
+        users = users[:limit]
+        next_cursor = encode_cursor(offset + limit)
+
+    return await response_cache.store(
+        cache_key,
+        "users",
+        scopes,
+        response.headers["ETag"],
+        page,
+        {"items": [row._asdict() for row in users], "next_cursor": next_cursor},
+    )
+
+
+def check_create_permission(user: UserCreate, current_user: CurrentUser):
+    if (
+        user.user_type != UserTypeEnum.REGULAR
+        and current_user.user_type != UserType.SUPERADMIN
+    ):
+        raise HTTPException(
+            status_code=403, detail="Only super admins can create admin users"
+        )
+
+    if (
+        current_user.user_type == UserType.PROJECT_ADMIN
+        and user.project != current_user.project
+    ):
+        raise HTTPException(
+            status_code=403,
+            detail="Project admins can only create users in their own project",
+        )
+
+
+def check_update_permission(db_user, user_type: str, current_user: CurrentUser):
+    if (
+        db_user.user_type != UserType.REGULAR
+        and current_user.user_type != UserType.SUPERADMIN
+    ):
+        raise HTTPException(
+            status_code=403, detail="Only super admins can update admin users"
+        )
+
+    if (
+        current_user.user_type == UserType.PROJECT_ADMIN
+        and db_user.project != current_user.project
+    ):
+        raise HTTPException(
+            status_code=403,
+            detail="Project admins can only update users in their own project",
+        )
+
+    if user_type != db_user.user_type and current_user.user_type != UserType.SUPERADMIN:
+        raise HTTPException(
+            status_code=403, detail="Only super admins can change user types"
+        )
+
+
+async def detach_applications(db: AsyncSession, user_ids) -> None:
+    # Applications, hot and archived, outlive their user; their user_id is
+    # cleared so that none points at a deleted row.
+    for model in (Application, ArchivedApplication):
+        await db.execute(
+            update(model).filter(model.user_id.in_(user_ids)).values(user_id=None)
+        )
+
+
+def check_delete_permission(db_user, current_user: CurrentUser):
+    if (
+        db_user.user_type != UserType.REGULAR
+        and current_user.user_type != UserType.SUPERADMIN
+    ):
         raise HTTPException(
-            status_code=403, 
-            detail="Only super admins can create admin users"
+            status_code=403, detail="Only super admins can delete admin users"
         )
-    
-    if (current_user.user_type == UserType.PROJECT_ADMIN and 
-        user.project != current_user.project):
+
+    if (
+        current_user.user_type == UserType.PROJECT_ADMIN
+        and db_user.project != current_user.project
+    ):
         raise HTTPException(
-            status_code=403, 
-            detail="Project admins can only create users in their own project"
+            status_code=403,
+            detail="Project admins can only delete users in their own project",
         )
-    
-    db_user = User(**user.dict())
+
+
+@router.post("/users", response_model=UserResponse)
+async def create_user(
+    user: UserCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(check_admin_permission),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+):
+    check_create_permission(user, current_user)
+
+    retry = idempotency(idempotency_key, f"{current_user.id} POST /users", user.dict())
+    if retry:
+        replayed = await retry.replay(db)
+        if replayed:
+            return replayed
+
+    tenant_id = await resolve_tenant_id(db, user.tenant)
+    if tenant_id is None:
+        raise HTTPException(status_code=400, detail="Tenant not found")
+
+    db_user = User(**user.dict(), tenant_id=tenant_id)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-    return db_user
+    usage = UsageDeltas()
+    usage.add(db_user)
+    await usage.apply(db)
+    changes = Changes()
+    changes.user(db_user)
+    await changes.apply(db)
+    # Flushed for the id and version the response carries.
+    await db.flush()
+    search = SearchIndex(new=True)
+    search.user(db_user)
+    await search.apply(db)
+    events = Events()
+    events.user("created", after=db_user)
+    response = respond(user_response(db_user), UserResponse)
+    if retry:
+        await retry.remember(db, response)
+        replayed = await retry.commit(db)
+        if replayed:
+            return replayed
+    else:
+        await db.commit()
+    await response_cache.invalidate(changes)
+    await event_feed.publish(events)
+    return response
+
+
+@router.get("/users/export")
+async def export_users(
+    request: Request,
+    format: ExportFormat = ExportFormat.NDJSON,
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    query = select(
+        User.id,
+        User.name,
+        User.email,
+        User.tenant,
+        User.department,
+        User.project,
+        User.role,
+        User.user_type,
+        User.tabs_accepted,
+        User.premium_requests_used,
+    )
+    query = scope_users_query(query, current_user).order_by(User.id)
+
+    return export_response(query, format, "users", read_sessionmaker(request))
+
+
+@router.post(
+    "/users/bulk", response_model=BulkResponse, openapi_extra=bulk_openapi(UserCreate)
+)
+async def create_users_bulk(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(check_admin_permission),
+):
+    raw_items = await read_bulk_items(request)
+    results = BulkResults(len(raw_items))
+
+    pending = {}
+    for index, raw in enumerate(raw_items):
+        try:
+            user = UserCreate.parse_obj(raw)
+            check_create_permission(user, current_user)
+        except ValidationError as e:
+            results.error(index, validation_detail(e))
+            continue
+        except HTTPException as e:
+            results.error(index, e.detail)
+            continue
+        pending[index] = user
+
+    tenant_ids = await resolve_tenant_ids(
+        db, {user.tenant for user in pending.values()}
+    )
+    # Emails are unique: reject those already taken or repeated in the batch.
+    emails = [user.email for user in pending.values()]
+    taken = set(
+        (await db.scalars(select(User.email).filter(User.email.in_(emails)))).all()
+    )
+    for index, user in list(pending.items()):
+        if user.tenant not in tenant_ids:
+            results.error(index, "Tenant not found")
+            del pending[index]
+            continue
+        if user.email in taken:
+            results.error(index, "Email already registered")
+            del pending[index]
+        taken.add(user.email)
+
+    if pending:
+        values = [
+            dict(user.dict(), tenant_id=tenant_ids[user.tenant])
+            for user in pending.values()
+        ]
+        ids = (
+            await db.scalars(
+                insert(User).returning(User.id, sort_by_parameter_order=True), values
+            )
+        ).all()
+        usage = UsageDeltas()
+        changes = Changes()
+        search = SearchIndex(new=True)
+        events = Events()
+        for row, user_id in zip(values, ids):
+            created = User(**row, id=user_id, version=1)
+            usage.add(created)
+            changes.user(created)
+            search.user(created)
+            events.user("created", after=created)
+        await usage.apply(db)
+        await changes.apply(db)
+        await search.apply(db)
+        await db.commit()
+        await response_cache.invalidate(changes)
+        await event_feed.publish(events)
+        for index, user_id in zip(pending, ids):
+            results.ok(index, "created", user_id)
+
+    return results.response()
+
+
+@router.put(
+    "/users/bulk",
+    response_model=BulkResponse,
+    openapi_extra=bulk_openapi(UserBulkUpdate),
+)
+async def update_users_bulk(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(check_admin_permission),
+):
+    raw_items = await read_bulk_items(request)
+    results = BulkResults(len(raw_items))
+
+    parsed = {}
+    for index, raw in enumerate(raw_items):
+        try:
+            parsed[index] = UserBulkUpdate.parse_obj(raw)
+        except ValidationError as e:
+            results.error(index, validation_detail(e))
+
+    ids = {user.id for user in parsed.values()}
+    existing = {
+        row.id: row
+        for row in (
+            await db.execute(
+                select(
+                    User.id,
+                    User.email,
+                    User.tenant_id,
+                    User.department,
+                    User.project,
+                    User.user_type,
+                    User.tabs_accepted,
+                    User.premium_requests_used,
+                    User.version,
+                ).filter(User.id.in_(ids))
+            )
+        ).all()
+    }
+    tenant_ids = await resolve_tenant_ids(db, {user.tenant for user in parsed.values()})
+    emails = [user.email for user in parsed.values()]
+    email_owners = dict(
+        (
+            await db.execute(select(User.email, User.id).filter(User.email.in_(emails)))
+        ).all()
+    )
+
+    pending = {}
+    previous = {}
+    for index, user in parsed.items():
+        db_user = existing.pop(user.id, None)
+        if db_user is None:
+            results.error(index, "User not found", user.id)
+            continue
+        try:
+            check_update_permission(db_user, user.user_type, current_user)
+            check_version(user.version, db_user.version)
+        except HTTPException as e:
+            results.error(index, e.detail, user.id)
+            continue
+        if user.tenant not in tenant_ids:
+            results.error(index, "Tenant not found", user.id)
+            continue
+        if email_owners.setdefault(user.email, user.id) != user.id:
+            results.error(index, "Email already registered", user.id)
+            continue
+        pending[index] = dict(
+            user.dict(exclude={"version", *COUNTER_FIELDS}),
+            tenant_id=tenant_ids[user.tenant],
+            version=db_user.version + 1,
+        )
+        previous[user.id] = db_user
+
+    # Each row is written only if it is still at the version read above.
+    changed = await compare_and_set_many(
+        db,
+        User,
+        list(pending.values()),
+        {user_id: db_user.version for user_id, db_user in previous.items()},
+    )
+    for index, values in list(pending.items()):
+        if values["id"] in changed:
+            results.error(index, CHANGED_DETAIL, values["id"])
+            del pending[index]
+
+    if pending:
+        usage = UsageDeltas()
+        changes = Changes()
+        search = SearchIndex()
+        events = Events()
+        for values in pending.values():
+            db_user = previous[values["id"]]
+            updated = User(
+                **values,
+                tabs_accepted=db_user.tabs_accepted,
+                premium_requests_used=db_user.premium_requests_used,
+            )
+            usage.add(db_user, -1)
+            usage.add(updated)
+            changes.user(db_user)
+            changes.user(updated)
+            search.user(updated)
+            events.user("updated", db_user, updated)
+        await usage.apply(db)
+        await changes.apply(db)
+        await search.apply(db)
+        await db.commit()
+        await response_cache.invalidate(changes)
+        await event_feed.publish(events)
+        for index, values in pending.items():
+            invalidate_user(values["id"])
+            results.ok(index, "updated", values["id"])
+
+    return results.response()
+
+
+@router.delete(
+    "/users/bulk",
+    response_model=BulkResponse,
+    openapi_extra=bulk_openapi({"type": "integer"}),
+)
+async def delete_users_bulk(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(check_admin_permission),
+):
+    raw_items = await read_bulk_items(request)
+    results = BulkResults(len(raw_items))
+
+    # JSON true and false pass isinstance(raw, int), so the type is compared.
+    ids = [raw for raw in raw_items if type(raw) is int]
+    existing = {
+        row.id: row
+        for row in (
+            await db.execute(
+                select(
+                    User.id,
+                    User.tenant_id,
+                    User.department,
+                    User.project,
+                    User.user_type,
+                    User.tabs_accepted,
+                    User.premium_requests_used,
+                ).filter(User.id.in_(ids))
+            )
+        ).all()
+    }
+
+    pending = {}
+    removed = []
+    seen = set()
+    for index, user_id in enumerate(raw_items):
+        if type(user_id) is not int:
+            results.error(index, "Expected a user id")
+            continue
+        if user_id in seen:
+            results.error(index, "Duplicate user id", user_id)
+            continue
+        db_user = existing.get(user_id)
+        if db_user is None:
+            results.error(index, "User not found", user_id)
+            continue
+        try:
+            check_delete_permission(db_user, current_user)
+        except HTTPException as e:
+            results.error(index, e.detail, user_id)
+            continue
+        pending[index] = user_id
+        seen.add(user_id)
+        removed.append(db_user)
+
+    if pending:
+        await detach_applications(db, pending.values())
+        await db.execute(delete(User).filter(User.id.in_(pending.values())))
+        usage = UsageDeltas()
+        changes = Changes()
+        search = SearchIndex()
+        events = Events()
+        for db_user in removed:
+            usage.add(db_user, -1)
+            changes.user(db_user)
+            search.remove(db_user.id)
+            events.user("deleted", before=db_user)
+        await usage.apply(db)
+        await changes.apply(db)
+        await search.apply(db)
+        await db.commit()
+        await response_cache.invalidate(changes)
+        await event_feed.publish(events)
+        for index, user_id in pending.items():
+            invalidate_user(user_id)
+            results.ok(index, "deleted", user_id)
+
+    return results.response()
+
 
 @router.get("/users/{user_id}", response_model=UserResponse)
-def get_user(
-    user_id: int, 
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+async def get_user(
+    user_id: int,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
-    db_user = db.query(User).filter(User.id == user_id).first()
+    db_user = await db.get(User, user_id)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
-    
+
     if current_user is None:
         if db_user.user_type != UserType.REGULAR:
             raise HTTPException(status_code=403, detail="Permission denied")
     elif current_user.user_type == UserType.PROJECT_ADMIN:
-        if db_user.project != current_user.project and db_user.user_type != UserType.SUPERADMIN:
+        if (
+            db_user.project != current_user.project
+            and db_user.user_type != UserType.SUPERADMIN
+        ):
             raise HTTPException(status_code=403, detail="Permission denied")
     elif current_user.user_type == UserType.REGULAR:
         if db_user.id != current_user.id:
             raise HTTPException(status_code=403, detail="Permission denied")
-    
+
     return db_user
 
-@router.put("/users/{user_id}", response_model=UserResponse)
-def update_user(
-    user_id: int, 
-    user: UserUpdate, 
-    db: Session = Depends(get_db),
-    current_user: User = Depends(check_admin_permission)
+
+async def write_user(
+    db: AsyncSession,
+    user_id: int,
+    values: dict,
+    version: Optional[int],
+    current_user: CurrentUser,
 ):
-    db_user = db.query(User).filter(User.id == user_id).first()
+    # Shared by PUT and PATCH: values holds the fields to write.
+    db_user = await db.get(User, user_id)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
-    
-    if db_user.user_type != UserType.REGULAR and current_user.user_type != UserType.SUPERADMIN:
-        raise HTTPException(
-            status_code=403, 
-            detail="Only super admins can update admin users"
-        )
-    
-    if (current_user.user_type == UserType.PROJECT_ADMIN and 
-        db_user.project != current_user.project):
-        raise HTTPException(
-            status_code=403, 
-            detail="Project admins can only update users in their own project"
-        )
-    
-    if user.user_type != db_user.user_type and current_user.user_type != UserType.SUPERADMIN:
-        raise HTTPException(
-            status_code=403, 
-            detail="Only super admins can change user types"
-        )
-    
-    for key, value in user.dict().items():
-        setattr(db_user, key, value)
-    
-    db.commit()
-    db.refresh(db_user)
-    return db_user
+    check_version(version, db_user.version)
+
+    check_update_permission(
+        db_user, values.get("user_type", db_user.user_type), current_user
+    )
+
+    if "tenant" in values:
+        tenant_id = await resolve_tenant_id(db, values["tenant"])
+        if tenant_id is None:
+            raise HTTPException(status_code=400, detail="Tenant not found")
+        values["tenant_id"] = tenant_id
+
+    usage = UsageDeltas()
+    changes = Changes()
+    usage.add(db_user, -1)
+    changes.user(db_user)
+
+    # Guarded by the version read above, so a concurrent write between the
+    # read and this update is refused rather than overwritten.
+    updated = await compare_and_set(
+        db, User, user_id, db_user.version, values, USER_COLUMNS
+    )
+    usage.add(updated)
+    changes.user(updated)
+    search = SearchIndex()
+    search.user(updated)
+    events = Events()
+    events.user("updated", db_user, updated)
+
+    await usage.apply(db)
+    await changes.apply(db)
+    await search.apply(db)
+    await db.commit()
+    await response_cache.invalidate(changes)
+    await event_feed.publish(events)
+    invalidate_user(user_id)
+    return updated._asdict()
+
+
+@router.put("/users/{user_id}", response_model=UserResponse)
+async def update_user(
+    user_id: int,
+    user: UserUpdate,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(check_admin_permission),
+):
+    values = user.dict(exclude={"version", *COUNTER_FIELDS})
+    return await write_user(db, user_id, values, user.version, current_user)
+
+
+@router.patch("/users/{user_id}", response_model=UserResponse)
+async def patch_user(
+    user_id: int,
+    user: UserPatch,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(check_admin_permission),
+):
+    # Only the fields sent are written; null means unchanged.
+    values = {
+        key: value
+        for key, value in user.dict(exclude={"version"}).items()
+        if value is not None
+    }
+    # A write of nothing would still bump the version and announce a change.
+    if not values:
+        raise HTTPException(status_code=422, detail="No fields to update")
+    return await write_user(db, user_id, values, user.version, current_user)
+
 
 @router.delete("/users/{user_id}")
-def delete_user(
-    user_id: int, 
-    db: Session = Depends(get_db),
-    current_user: User = Depends(check_admin_permission)
+async def delete_user(
+    user_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(check_admin_permission),
 ):
-    db_user = db.query(User).filter(User.id == user_id).first()
+    db_user = await db.get(User, user_id)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
-    
-    if db_user.user_type != UserType.REGULAR and current_user.user_type != UserType.SUPERADMIN:
-        raise HTTPException(
-            status_code=403, 
-            detail="Only super admins can delete admin users"
-        )
-    
-    if (current_user.user_type == UserType.PROJECT_ADMIN and 
-        db_user.project != current_user.project):
-        raise HTTPException(
-            status_code=403, 
-            detail="Project admins can only delete users in their own project"
-        )
-    
-    db.delete(db_user)
-    db.commit()
+
+    check_delete_permission(db_user, current_user)
+
+    await detach_applications(db, [user_id])
+    await db.delete(db_user)
+    usage = UsageDeltas()
+    usage.add(db_user, -1)
+    await usage.apply(db)
+    changes = Changes()
+    changes.user(db_user)
+    await changes.apply(db)
+    search = SearchIndex()
+    search.remove(user_id)
+    await search.apply(db)
+    await db.commit()
+    await response_cache.invalidate(changes)
+    events = Events()
+    events.user("deleted", before=db_user)
+    await event_feed.publish(events)
+    invalidate_user(user_id)
     return {"message": "User deleted successfully"}
+
+
+@router.post("/users/{user_id}/usage", status_code=202)
+async def increment_usage(
+    user_id: int,
+    increment: UsageIncrement,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    if current_user is None:
+        raise HTTPException(status_code=401, detail="Authentication required")
+
+    # Served from the auth cache, so hot counters do not read the users table.
+    db_user = await load_user(db, user_id)
+    if db_user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    if current_user.id != user_id:
+        if current_user.user_type == UserType.REGULAR:
+            raise HTTPException(status_code=403, detail="Permission denied")
+        if current_user.user_type == UserType.PROJECT_ADMIN and (
+            db_user.project != current_user.project
+            or db_user.user_type != UserType.REGULAR
+        ):
+            raise HTTPException(status_code=403, detail="Permission denied")
+
+    waiter = usage_buffer.add(
+        user_id, increment.tabs_accepted, increment.premium_requests_used
+    )
+    if waiter is None:
+        return {"message": "Usage accepted"}
+
+    try:
+        await waiter
+    except Exception:
+        raise HTTPException(status_code=503, detail="Usage could not be recorded")
+    response.status_code = 200
+    return {"message": "Usage recorded"}
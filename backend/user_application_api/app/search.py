@@ -0,0 +1,206 @@
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import (
+    MetaData,
+    Table,
+    column,
+    func,
+    inspect,
+    literal,
+    literal_column,
+    or_,
+    select,
+    table,
+    text,
+)
+from sqlalchemy.dialects.mysql import match as mysql_match
+from sqlalchemy.engine import Connection
+
+# Text index behind GET /users/search over name, email, department and role.
+# SQLite (FTS5) and PostgreSQL (tsvector) index a copy of those fields in the
+# user_search table, written by the user handlers in the same transaction as
+# the user. Hanzi, kana and hangul are indexed one character per token, so any
+# run of them, such as a two-character name, is matched as a phrase; other
+# text is indexed by word and matched by prefix. MySQL indexes the users table
+# itself with an ngram FULLTEXT index. Other databases fall back to LIKE.
+
+SEARCH_FIELDS = ("name", "email", "department", "role")
+# Relative weight of a match in each field.
+FIELD_WEIGHTS = (10.0, 5.0, 2.0, 1.0)
+# Dialects that keep the user_search table.
+INDEXED_DIALECTS = {"sqlite", "postgresql"}
+
+_CJK = re.compile(
+    "([\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff])"
+)
+_SEPARATORS = re.compile(r"[\W_]+")
+
+
+def normalize(value: Optional[str]) -> str:
+    # Case- and width-folded words separated by single spaces, with every CJK
+    # character a word of its own.
+    folded = unicodedata.normalize("NFKC", value or "").lower()
+    return " ".join(_CJK.sub(r" \1 ", _SEPARATORS.sub(" ", folded)).split())
+
+
+def search_terms(q: str) -> List[List[str]]:
+    # One phrase of tokens per whitespace-separated term of the query.
+    phrases = (normalize(term).split() for term in q.split())
+    return [tokens for tokens in phrases if tokens]
+
+
+def _fts5_query(phrases: List[List[str]]) -> str:
+    # Every phrase must match; the last token of each is a prefix.
+    return " ".join(f'"{" ".join(tokens)}" *' for tokens in phrases)
+
+
+def _tsquery(phrases: List[List[str]]) -> str:
+    return " & ".join(
+        "(" + " <-> ".join(f"'{token}'" for token in tokens) + ":*)"
+        for tokens in phrases
+    )
+
+
+def _boolean_query(q: str) -> str:
+    # MySQL boolean mode: every term required, each matched as an ngram phrase.
+    return " ".join(f'+"{term}"' for term in q.replace('"', " ").split())
+
+
+_SQLITE_INSERT = text(
+    "INSERT INTO user_search (rowid, name, email, department, role) "
+    "VALUES (:id, :name, :email, :department, :role)"
+)
+_SQLITE_DELETE = text("DELETE FROM user_search WHERE rowid = :id")
+_POSTGRESQL_INSERT = text(
+    "INSERT INTO user_search (user_id, document) VALUES (:id, "
+    "setweight(to_tsvector('simple', :name), 'A') || "
+    "setweight(to_tsvector('simple', :email), 'B') || "
+    "setweight(to_tsvector('simple', :department), 'C') || "
+    "setweight(to_tsvector('simple', :role), 'D'))"
+)
+_POSTGRESQL_DELETE = text("DELETE FROM user_search WHERE user_id = :id")
+
+
+def index_statements(
+    dialect: str, users: Iterable, removed: Iterable[int] = (), new: bool = False
+) -> List[Tuple[object, List[dict]]]:
+    # Statements with their parameter sets that replace the indexed copy of
+    # users (rows or objects with id and the search fields) and drop removed
+    # ids; new users have no copy to replace. Empty for dialects without the
+    # user_search table.
+    if dialect not in INDEXED_DIALECTS:
+        return []
+    rows = []
+    for user in users:
+        row = {field: normalize(getattr(user, field)) for field in SEARCH_FIELDS}
+        rows.append(dict(row, id=user.id))
+    ids = [] if new else [{"id": row["id"]} for row in rows]
+    ids += [{"id": user_id} for user_id in removed]
+    if dialect == "sqlite":
+        insert_statement, delete_statement = _SQLITE_INSERT, _SQLITE_DELETE
+    else:
+        insert_statement, delete_statement = _POSTGRESQL_INSERT, _POSTGRESQL_DELETE
+    statements = []
+    if ids:
+        statements.append((delete_statement, ids))
+    if rows:
+        statements.append((insert_statement, rows))
+    return statements
+
+
+def build_index(conn: Connection, batch_size: int = 5000) -> None:
+    # Indexes every user into an empty user_search table, for the migration
+    # that creates it and for data loaded without going through the API.
+    dialect = conn.dialect.name
+    if dialect not in INDEXED_DIALECTS or not inspect(conn).has_table("user_search"):
+        return
+    users = Table("users", MetaData(), autoload_with=conn)
+    columns = [users.c.id, *(users.c[field] for field in SEARCH_FIELDS)]
+    last_id = 0
+    while True:
+        batch = conn.execute(
+            select(*columns)
+            .where(users.c.id > last_id)
+            .order_by(users.c.id)
+            .limit(batch_size)
+        ).all()
+        if not batch:
+            break
+        for statement, params in index_statements(dialect, batch, new=True):
+            conn.execute(statement, params)
+        last_id = batch[-1].id
+
+
+class SearchIndex:
+    # Users a write creates, changes or deletes, re-indexed before the
+    # handler commits, in the same transaction as the write.
+
+    def __init__(self, new: bool = False):
+        self.new = new
+        self._users: Dict[int, object] = {}
+        self._removed: set = set()
+
+    def user(self, user) -> None:
+        self._users[user.id] = user
+        self._removed.discard(user.id)
+
+    def remove(self, user_id: int) -> None:
+        self._users.pop(user_id, None)
+        self._removed.add(user_id)
+
+    async def apply(self, db) -> None:
+        statements = index_statements(
+            db.bind.dialect.name, self._users.values(), self._removed, self.new
+        )
+        for statement, params in statements:
+            await db.execute(statement, params)
+
+
+_fts5_table = table("user_search", column("rowid"))
+_tsvector_table = table("user_search", column("user_id"), column("document"))
+
+
+def match_users(dialect: str, q: str, users, query):
+    # query, a select over users, narrowed to the users matching q, with a
+    # "score" column where higher is a better match. None when q has no terms.
+    phrases = search_terms(q)
+    if not phrases:
+        return None
+
+    if dialect == "sqlite":
+        fts = literal_column("user_search")
+        return (
+            query.add_columns((-func.bm25(fts, *FIELD_WEIGHTS)).label("score"))
+            .join(_fts5_table, _fts5_table.c.rowid == users.id)
+            .filter(fts.match(_fts5_query(phrases)))
+        )
+
+    if dialect == "postgresql":
+        # ts_rank takes weights in [0, 1], ordered from D up to A.
+        top = max(FIELD_WEIGHTS)
+        weights = ",".join(str(weight / top) for weight in reversed(FIELD_WEIGHTS))
+        tsquery = func.to_tsquery("simple", _tsquery(phrases))
+        document = _tsvector_table.c.document
+        return (
+            query.add_columns(
+                func.ts_rank(
+                    literal_column(f"'{{{weights}}}'"), document, tsquery
+                ).label("score")
+            )
+            .join(_tsvector_table, _tsvector_table.c.user_id == users.id)
+            .filter(document.op("@@")(tsquery))
+        )
+
+    columns = [getattr(users, field) for field in SEARCH_FIELDS]
+    if dialect == "mysql":
+        score = mysql_match(*columns, against=_boolean_query(q)).in_boolean_mode()
+        return query.add_columns(score.label("score")).filter(score)
+
+    # Unindexed: every term must appear in one of the fields.
+    query = query.add_columns(literal(0).label("score"))
+    for term in q.split():
+        pattern = f"%{term}%"
+        query = query.filter(or_(*(field.ilike(pattern) for field in columns)))
+    return query
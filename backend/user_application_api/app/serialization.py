@@ -0,0 +1,42 @@
+import json
+from typing import Any, Optional, Type
+
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import BaseModel
+
+from . import config
+
+# Handlers build their responses from selected columns. By default those are
+# still validated against the response model; with FAST_SERIALIZATION they are
+# trusted as they are and encoded by orjson, installed with the `fast` extra.
+# Routes keep their response_model, so the OpenAPI schema is the same either
+# way.
+if config.FAST_SERIALIZATION:
+    import orjson
+
+    DefaultResponse = ORJSONResponse
+else:
+    DefaultResponse = JSONResponse
+
+
+def encode(content: Any, model: Optional[Type[BaseModel]] = None) -> bytes:
+    if config.FAST_SERIALIZATION:
+        return orjson.dumps(content)
+    if isinstance(content, list) and model is not None:
+        content = [model.parse_obj(item) for item in content]
+    elif model is not None:
+        content = model.parse_obj(content)
+    # Encoded as FastAPI's JSONResponse would.
+    return json.dumps(
+        jsonable_encoder(content), ensure_ascii=False, separators=(",", ":")
+    ).encode()
+
+
+def respond(
+    content: Any, model: Optional[Type[BaseModel]] = None, **kwargs: Any
+) -> Response:
+    return Response(
+        content=encode(content, model), media_type="application/json", **kwargs
+    )
@@ -0,0 +1,46 @@
+import argparse
+import asyncio
+import os
+
+import uvicorn
+
+from . import config
+from .database import engine, init_db, run_migrations
+
+# Production entry point. Migrations and seed data run once here, before any
+# worker starts, instead of in every worker's startup racing on the same
+# database. Workers then only open their own connection pools:
+#
+#     python -m app.serve --workers 4 --port 8000
+
+
+async def _prepare() -> None:
+    await run_migrations()
+    await init_db()
+    # No pooled connection may outlive this event loop or reach the workers.
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the API with N workers.")
+    parser.add_argument("--host", default=config.HOST)
+    parser.add_argument("--port", type=int, default=config.PORT)
+    parser.add_argument("--workers", type=int, default=config.WEB_CONCURRENCY)
+    args = parser.parse_args()
+
+    asyncio.run(_prepare())
+
+    # Read by the workers' settings, and by this process's when it serves
+    # a single worker itself.
+    os.environ["DB_INIT_ON_STARTUP"] = "false"
+    config.DB_INIT_ON_STARTUP = False
+    uvicorn.run(
+        "app.main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import logging
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+
+class RequestSQL:
+    # SQL issued while serving one request. Statements are counted by their
+    # text, so the same query repeated with different parameters shows up as
+    # one entry with a high count.
+
+    def __init__(self):
+        self.statements = 0
+        self.db_time = 0.0
+        self.rows = 0
+        self.by_statement: Counter = Counter()
+
+    def record(self, statement: str, elapsed: float, rows: int) -> None:
+        self.statements += 1
+        self.db_time += elapsed
+        self.rows += max(rows, 0)
+        self.by_statement[statement] += 1
+
+    def repeated(self, threshold: int) -> Optional[tuple]:
+        # The most repeated statement when it ran at least threshold times.
+        if threshold <= 0 or not self.by_statement:
+            return None
+        statement, count = self.by_statement.most_common(1)[0]
+        return (statement, count) if count >= threshold else None
+
+
+_request_sql: ContextVar[Optional[RequestSQL]] = ContextVar("request_sql", default=None)
+
+
+def start_request() -> RequestSQL:
+    # SQLAlchemy runs cursor events in the caller's context, so statements
+    # executed by the request's handler are recorded on this object.
+    sql = RequestSQL()
+    _request_sql.set(sql)
+    return sql
+
+
+def shorten(statement: str, limit: int = 500) -> str:
+    statement = " ".join(statement.split())
+    return statement if len(statement) <= limit else statement[:limit] + "..."
+
+
+class StatementCounter:
+    # Statements sent to the database by this process, so load tests can
+    # report statements per request. Also times each statement for the
+    # current request and logs those slower than SLOW_QUERY_MS.
+
+    def __init__(self, slow_ms: float):
+        self.slow_ms = slow_ms
+        self._lock = threading.Lock()
+        self.statements = 0
+        self.slow = 0
+
+    def attach(self, engine: AsyncEngine) -> None:
+        event.listen(engine.sync_engine, "before_cursor_execute", self._before)
+        event.listen(engine.sync_engine, "after_cursor_execute", self._after)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info["statement_start"] = time.perf_counter()
+        with self._lock:
+            self.statements += 1
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info.pop("statement_start")
+        sql = _request_sql.get()
+        if sql is not None:
+            # Drivers that buffer results report the rows a select returned;
+            # SQLite only reports rows changed by writes.
+            sql.record(statement, elapsed, cursor.rowcount)
+        if self.slow_ms > 0 and elapsed * 1000 >= self.slow_ms:
+            with self._lock:
+                self.slow += 1
+            logger.warning(
+                "Slow query (%.1f ms): %s", elapsed * 1000, shorten(statement)
+            )
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"statements": self.statements, "slow_statements": self.slow}
+
+
+statement_counter = StatementCounter(slow_ms=config.SLOW_QUERY_MS)
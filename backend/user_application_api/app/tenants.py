@@ -0,0 +1,41 @@
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import config
+from .cache import TTLCache
+from .database import Tenant
+
+# Clients still send tenant names; rows and joins use tenant ids. Unknown names
+# are not cached, so a tenant is resolvable as soon as it is created.
+_tenant_ids = TTLCache(maxsize=config.TENANT_CACHE_SIZE, ttl=config.TENANT_CACHE_TTL)
+
+
+def invalidate_tenant(name: str) -> None:
+    _tenant_ids.delete(name)
+
+
+async def resolve_tenant_ids(db: AsyncSession, names: Iterable[str]) -> Dict[str, int]:
+    resolved = {}
+    missing = set()
+    for name in set(names):
+        tenant_id = _tenant_ids.get(name)
+        if tenant_id is None:
+            missing.add(name)
+        else:
+            resolved[name] = tenant_id
+
+    if missing:
+        rows = await db.execute(
+            select(Tenant.name, Tenant.id).filter(Tenant.name.in_(missing))
+        )
+        for name, tenant_id in rows:
+            _tenant_ids.set(name, tenant_id)
+            resolved[name] = tenant_id
+
+    return resolved
+
+
+async def resolve_tenant_id(db: AsyncSession, name: str) -> Optional[int]:
+    return (await resolve_tenant_ids(db, [name])).get(name)
@@ -0,0 +1,19 @@
+from sqlalchemy import Table
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+
+def increment(dialect: str, table: Table, key: dict, increments: dict):
+    # Upsert that inserts the row identified by key, or adds the increments to
+    # its counters when it already exists. key must match a unique constraint.
+    if dialect == "mysql":
+        stmt = mysql.insert(table).values(**key, **increments)
+        return stmt.on_duplicate_key_update(
+            {c: table.c[c] + stmt.inserted[c] for c in increments}
+        )
+
+    dialect_insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    stmt = dialect_insert(table).values(**key, **increments)
+    return stmt.on_conflict_do_update(
+        index_elements=list(key),
+        set_={c: table.c[c] + stmt.excluded[c] for c in increments},
+    )
@@ -0,0 +1,132 @@
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, literal, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .database import Tenant, UsageRollup, User
+from .upsert import increment
+
+# Billing cycles are counted from a fixed epoch in steps of the tenant's
+# update_cycle, so every process derives the same cycle boundaries.
+CYCLE_EPOCH = date(1970, 1, 1)
+DEFAULT_UPDATE_CYCLE = 30
+
+GROUP_COLUMNS = ("department", "project")
+COUNTER_COLUMNS = ("users", "tabs_accepted", "premium_requests_used")
+
+
+def cycle_bounds(update_cycle: Optional[int], today: Optional[date] = None):
+    days = update_cycle or DEFAULT_UPDATE_CYCLE
+    today = today or date.today()
+    start = CYCLE_EPOCH + timedelta(days=(today - CYCLE_EPOCH).days // days * days)
+    return start, start + timedelta(days=days)
+
+
+async def current_cycles(db: AsyncSession, tenants: Iterable[int]) -> Dict[int, date]:
+    tenants = set(tenants)
+    cycles = dict(
+        (
+            await db.execute(
+                select(Tenant.id, Tenant.update_cycle).filter(Tenant.id.in_(tenants))
+            )
+        ).all()
+    )
+    return {tenant: cycle_bounds(cycles.get(tenant))[0] for tenant in tenants}
+
+
+async def _materialized(db: AsyncSession, cycles: Dict[int, date]) -> set:
+    if not cycles:
+        return set()
+    rows = await db.execute(
+        select(UsageRollup.tenant_id, UsageRollup.cycle_start)
+        .filter(UsageRollup.tenant_id.in_(cycles))
+        .distinct()
+    )
+    return {tenant for tenant, start in rows if cycles[tenant] == start}
+
+
+async def rebuild(db: AsyncSession, cycles: Dict[int, date]) -> None:
+    # Recompute each tenant's current cycle from the users table.
+    for tenant, cycle_start in cycles.items():
+        await db.execute(
+            delete(UsageRollup).filter(
+                UsageRollup.tenant_id == tenant, UsageRollup.cycle_start == cycle_start
+            )
+        )
+        totals = (
+            select(
+                User.tenant_id,
+                literal(cycle_start),
+                User.department,
+                User.project,
+                func.count(),
+                func.coalesce(func.sum(User.tabs_accepted), 0),
+                func.coalesce(func.sum(User.premium_requests_used), 0),
+            )
+            .filter(User.tenant_id == tenant)
+            .group_by(User.tenant_id, User.department, User.project)
+        )
+        await db.execute(
+            insert(UsageRollup).from_select(
+                ["tenant_id", "cycle_start", *GROUP_COLUMNS, *COUNTER_COLUMNS], totals
+            )
+        )
+
+
+async def ensure_current(db: AsyncSession, tenants: Iterable[int]) -> Dict[int, date]:
+    # The first read of a cycle materializes it; later writes keep it current.
+    cycles = await current_cycles(db, tenants)
+    done = await _materialized(db, cycles)
+    missing = {tenant: start for tenant, start in cycles.items() if tenant not in done}
+    if missing:
+        await rebuild(db, missing)
+        await db.commit()
+    return cycles
+
+
+class UsageDeltas:
+    # Accumulates the usage change of a write, per group, so that one
+    # upsert per touched group is issued before the handler commits.
+
+    def __init__(self):
+        self._groups: Dict[Tuple[int, str, str], List[int]] = defaultdict(
+            lambda: [0, 0, 0]
+        )
+
+    def add(self, user, sign: int = 1) -> None:
+        group = self._groups[(user.tenant_id, user.department, user.project)]
+        group[0] += sign
+        group[1] += sign * (user.tabs_accepted or 0)
+        group[2] += sign * (user.premium_requests_used or 0)
+
+    def increment(self, user, tabs_accepted: int, premium_requests_used: int) -> None:
+        group = self._groups[(user.tenant_id, user.department, user.project)]
+        group[1] += tabs_accepted
+        group[2] += premium_requests_used
+
+    async def apply(self, db: AsyncSession) -> None:
+        # Users without a tenant are not part of any tenant's usage.
+        changed = {
+            key: d for key, d in self._groups.items() if key[0] is not None and any(d)
+        }
+        if not changed:
+            return
+
+        cycles = await current_cycles(db, {tenant for tenant, _, _ in changed})
+        # Cycles not yet materialized pick the write up when they are rebuilt.
+        done = await _materialized(db, cycles)
+        dialect = db.bind.dialect.name
+
+        for (tenant, department, project), deltas in changed.items():
+            if tenant not in done:
+                continue
+            key = {
+                "tenant_id": tenant,
+                "cycle_start": cycles[tenant],
+                "department": department,
+                "project": project,
+            }
+            increments = dict(zip(COUNTER_COLUMNS, deltas))
+            await db.execute(increment(dialect, UsageRollup.__table__, key, increments))
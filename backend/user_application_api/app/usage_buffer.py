@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import bindparam, func, select, update
+
+from . import config
+from .database import SessionLocal, User
+from .events import Events, event_feed
+from .response_cache import response_cache
+from .usage import UsageDeltas
+from .versions import Changes
+
+logger = logging.getLogger(__name__)
+
+_users = User.__table__
+
+# Executed once per batch with one parameter set per user, so each row is
+# changed in place by the database instead of being read and rewritten.
+_increment_users = (
+    update(_users)
+    .where(_users.c.id == bindparam("user_key"))
+    .values(
+        tabs_accepted=func.coalesce(_users.c.tabs_accepted, 0) + bindparam("d_tabs"),
+        premium_requests_used=(
+            func.coalesce(_users.c.premium_requests_used, 0) + bindparam("d_premium")
+        ),
+    )
+)
+
+
+class UsageBuffer:
+    # Write-behind buffer for usage counters. Increments are coalesced per user
+    # and written in batches when max_users users are pending or every
+    # interval seconds. With durable set, add() returns a future that resolves
+    # once the batch holding the increment is committed.
+
+    def __init__(self, max_users: int, interval: float, durable: bool = False):
+        self.max_users = max_users
+        self.interval = interval
+        self.durable = durable
+        self._pending: Dict[int, List[int]] = {}
+        self._waiters: List[asyncio.Future] = []
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._accepted = 0
+        self._flushes = 0
+        self._flushed_users = 0
+        self._failures = 0
+        self._last_flush_ms = 0.0
+
+    def add(
+        self, user_id: int, tabs_accepted: int, premium_requests_used: int
+    ) -> Optional[asyncio.Future]:
+        deltas = self._pending.setdefault(user_id, [0, 0])
+        deltas[0] += tabs_accepted
+        deltas[1] += premium_requests_used
+        self._accepted += 1
+
+        waiter = None
+        if self.durable:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+        # Durable writers are waiting, so flush now; increments arriving
+        # during that flush are committed together in the next batch.
+        if self.durable or len(self._pending) >= self.max_users:
+            self._wakeup.set()
+        return waiter
+
+    async def flush(self) -> int:
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            pending, self._pending = self._pending, {}
+            waiters, self._waiters = self._waiters, []
+
+            started = time.perf_counter()
+            try:
+                await _write(pending)
+            except Exception as exc:
+                self._failures += 1
+                logger.exception("Flushing usage for %d users failed", len(pending))
+                if waiters:
+                    # The callers see the error, so nothing is retried for them.
+                    for waiter in waiters:
+                        if not waiter.done():
+                            waiter.set_exception(exc)
+                else:
+                    self._requeue(pending)
+                return 0
+
+            self._flushes += 1
+            self._flushed_users += len(pending)
+            self._last_flush_ms = (time.perf_counter() - started) * 1000
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_result(None)
+            return len(pending)
+
+    def _requeue(self, pending: Dict[int, List[int]]) -> None:
+        for user_id, (tabs, premium) in pending.items():
+            deltas = self._pending.setdefault(user_id, [0, 0])
+            deltas[0] += tabs
+            deltas[1] += premium
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self) -> None:
+        if self._task is None:
+            # Bound to the running loop, which differs per server process.
+            self._wakeup = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Whatever is still buffered is written before the process exits.
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "pending_users": len(self._pending),
+            "accepted": self._accepted,
+            "flushes": self._flushes,
+            "flushed_users": self._flushed_users,
+            "failures": self._failures,
+            "last_flush_ms": round(self._last_flush_ms, 3),
+            "durable": self.durable,
+        }
+
+
+async def _write(pending: Dict[int, List[int]]) -> None:
+    user_ids = list(pending)
+    async with SessionLocal() as db:
+        await db.execute(
+            _increment_users,
+            [
+                {"user_key": user_id, "d_tabs": tabs, "d_premium": premium}
+                for user_id, (tabs, premium) in pending.items()
+            ],
+        )
+        # Read the groups after the update, so the rows are already locked
+        # and the rollup is charged to the group the user is in now.
+        rows = await db.execute(
+            select(
+                User.id, User.tenant_id, User.department, User.project, User.user_type
+            ).filter(User.id.in_(user_ids))
+        )
+        usage = UsageDeltas()
+        changes = Changes()
+        events = Events()
+        for row in rows:
+            usage.increment(row, *pending[row.id])
+            changes.user(row, counters_only=True)
+            events.usage(row, *pending[row.id])
+        await usage.apply(db)
+        await changes.apply(db)
+        await db.commit()
+        await response_cache.invalidate(changes)
+    await event_feed.publish(events)
+
+
+usage_buffer = UsageBuffer(
+    max_users=config.USAGE_FLUSH_MAX_USERS,
+    interval=config.USAGE_FLUSH_INTERVAL,
+    durable=config.USAGE_DURABLE,
+)
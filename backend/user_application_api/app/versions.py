@@ -0,0 +1,79 @@
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .database import ChangeVersion, UserType
+from .upsert import increment
+
+# Each list endpoint reads the scopes its caller can see, and every write bumps
+# the scopes of the rows it touches, so a write in one project or tenant leaves
+# the versions, and ETags, of the others unchanged.
+ALL = "*"
+SUPERADMINS = "type:superadmin"
+
+
+def project_scope(project: Optional[str]) -> str:
+    return f"project:{project}"
+
+
+def tenant_scope(tenant_id: Optional[int]) -> str:
+    return f"tenant:{tenant_id}"
+
+
+async def current_versions(
+    db: AsyncSession, table: str, scopes: Iterable[str]
+) -> Dict[str, int]:
+    scopes = set(scopes)
+    rows = await db.execute(
+        select(ChangeVersion.scope, ChangeVersion.version).filter(
+            ChangeVersion.table_name == table, ChangeVersion.scope.in_(scopes)
+        )
+    )
+    versions = dict.fromkeys(scopes, 0)
+    versions.update(rows.all())
+    return versions
+
+
+class Changes:
+    # Collects the scopes a write touches, so that each version is bumped once
+    # before the handler commits, in the same transaction as the write.
+
+    def __init__(self):
+        self._scopes: Set[Tuple[str, str]] = set()
+
+    @property
+    def scopes(self) -> Set[Tuple[str, str]]:
+        return self._scopes
+
+    def user(self, user, counters_only: bool = False) -> None:
+        self._scopes.add(("users", ALL))
+        self._scopes.add(("users", project_scope(user.project)))
+        if user.user_type == UserType.SUPERADMIN:
+            self._scopes.add(("users", SUPERADMINS))
+        # Application lists show the name and project of each user, but none
+        # of the usage counters.
+        if not counters_only:
+            self.application(user.project)
+
+    def application(self, project: Optional[str]) -> None:
+        self._scopes.add(("applications", ALL))
+        if project is not None:
+            self._scopes.add(("applications", project_scope(project)))
+
+    def tenant(self, tenant_id: int) -> None:
+        self._scopes.add(("tenants", ALL))
+        self._scopes.add(("tenants", tenant_scope(tenant_id)))
+
+    async def apply(self, db: AsyncSession) -> None:
+        dialect = db.bind.dialect.name
+        # A fixed order keeps concurrent writers from deadlocking on the rows.
+        for table, scope in sorted(self._scopes):
+            await db.execute(
+                increment(
+                    dialect,
+                    ChangeVersion.__table__,
+                    {"table_name": table, "scope": scope},
+                    {"version": 1},
+                )
+            )
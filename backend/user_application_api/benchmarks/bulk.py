@@ -0,0 +1,80 @@
+import argparse
+import os
+import tempfile
+import time
+
+# Compares creating N users and N applications one request at a time with a
+# single bulk request, in-process through the ASGI app:
+#
+#     python -m benchmarks.bulk --rows 10000
+
+
+def _user(prefix, i):
+    return {
+        "name": f"用户{i}",
+        "email": f"{prefix}{i}@example.com",
+        "tenant": "租户A",
+        "department": "研发部",
+        "project": "项目1",
+        "role": "开发工程师",
+        "tabs_accepted": 0,
+        "premium_requests_used": 0,
+    }
+
+
+def _application(i):
+    return {
+        "application_date": "2025-01-01",
+        "target_product": "C" if i % 2 else "W",
+        "status": "申请中",
+        "user_id": 3,
+    }
+
+
+def _timed(label, rows, fn):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed:8.2f}s {rows / elapsed:10.0f} rows/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Single-item vs bulk writes.")
+    parser.add_argument("--rows", type=int, default=10_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bulk.db')}"
+
+        from fastapi.testclient import TestClient
+
+        from app.main import app
+
+        admin = {"user-id": "1"}
+        rows = args.rows
+        with TestClient(app) as client:
+
+            def single_users():
+                for i in range(rows):
+                    client.post("/users", json=_user("single", i), headers=admin)
+
+            def bulk_users():
+                items = [_user("bulk", i) for i in range(rows)]
+                client.post("/users/bulk", json=items, headers=admin)
+
+            def single_applications():
+                for i in range(rows):
+                    client.post("/applications", json=_application(i))
+
+            def bulk_applications():
+                items = [_application(i) for i in range(rows)]
+                client.post("/applications/bulk", json=items)
+
+            _timed("POST /users x N", rows, single_users)
+            _timed("POST /users/bulk", rows, bulk_users)
+            _timed("POST /applications x N", rows, single_applications)
+            _timed("POST /applications/bulk", rows, bulk_applications)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import argparse
+import json
+import sys
+
+# Diffs two benchmarks.load results and exits with status 1 when a latency
+# percentile or statements per request grew by more than --threshold percent:
+#
+#     python -m benchmarks.compare baseline.json load.json --threshold 10
+
+METRICS = ("p50_ms", "p95_ms", "p99_ms")
+
+
+def _change(before: float, after: float) -> float:
+    if not before:
+        return 0.0
+    return (after - before) / before * 100
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two load test results.")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0)
+    args = parser.parse_args()
+
+    with open(args.baseline) as baseline_file, open(args.candidate) as candidate_file:
+        baseline, candidate = json.load(baseline_file), json.load(candidate_file)
+
+    before = {(e["method"], e["name"]): e for e in baseline["endpoints"]}
+    after = {(e["method"], e["name"]): e for e in candidate["endpoints"]}
+    rows = [("total", baseline["total"], candidate["total"])]
+    rows += [(" ".join(key), before[key], after[key]) for key in before if key in after]
+
+    regressions = []
+    print(f"{'endpoint':<40}" + "".join(f"{metric:>22}" for metric in METRICS))
+    for name, old, new in rows:
+        cells = []
+        for metric in METRICS:
+            change = _change(old[metric], new[metric])
+            cells.append(f"{old[metric]:>7.0f} -> {new[metric]:<7.0f}{change:+5.0f}%")
+            if change > args.threshold:
+                regressions.append(f"{name} {metric} {change:+.0f}%")
+        print(f"{name:<40}" + "".join(f"{cell:>22}" for cell in cells))
+
+    change = _change(
+        baseline["statements_per_request"], candidate["statements_per_request"]
+    )
+    print(
+        f"statements/request {baseline['statements_per_request']} -> "
+        f"{candidate['statements_per_request']} ({change:+.0f}%)"
+    )
+    if change > args.threshold:
+        regressions.append(f"statements/request {change:+.0f}%")
+
+    if regressions:
+        print("\nRegressions over threshold:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
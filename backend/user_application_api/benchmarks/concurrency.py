@@ -0,0 +1,133 @@
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+from sqlalchemy import create_engine
+
+from app import migrations
+from benchmarks.seed import seed
+
+# Drives a local uvicorn with many concurrent clients and reports throughput and
+# latency percentiles. --app-dir points at another checkout of this directory
+# (e.g. a git worktree of an older commit) to compare two versions on the same
+# seeded database:
+#
+#     python -m benchmarks.concurrency --clients 500
+#     python -m benchmarks.concurrency --clients 500 --app-dir ../worktree-sync
+
+PATHS = [
+    ("/users?limit=50", {"user-id": "1"}),
+    ("/users?limit=50", {"user-id": "2"}),
+    ("/applications?limit=50", {}),
+    ("/tenants", {"user-id": "1"}),
+]
+
+# Admission limits are off unless set in the environment, so the clients
+# measure the server's capacity rather than its per-tenant limits.
+UNLIMITED = {"ADMISSION_TENANT_CONCURRENCY": "0", "ADMISSION_ROUTE_CONCURRENCY": "0"}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _wait_until_ready(client: httpx.AsyncClient, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/healthz")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("server did not become ready")
+
+
+async def _client(client, stop_at, latencies, errors, offset):
+    i = offset
+    while time.monotonic() < stop_at:
+        path, headers = PATHS[i % len(PATHS)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            response = await client.get(path, headers=headers)
+            if response.status_code != 200:
+                errors.append(response.status_code)
+                continue
+        except httpx.HTTPError as error:
+            errors.append(type(error).__name__)
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+
+
+async def _run(base_url, clients, duration):
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(
+        base_url=base_url, limits=limits, timeout=60.0
+    ) as client:
+        await _wait_until_ready(client)
+        latencies, errors = [], []
+        stop_at = time.monotonic() + duration
+        await asyncio.gather(
+            *(_client(client, stop_at, latencies, errors, i) for i in range(clients))
+        )
+    return latencies, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Load a local uvicorn with concurrent clients."
+    )
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--applications", type=int, default=100_000)
+    parser.add_argument("--app-dir", default=os.getcwd())
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "load.db")
+        engine = create_engine(f"sqlite:///{path}")
+        with engine.connect() as conn:
+            migrations.upgrade(conn)
+        seed(engine, tenants=10, users=args.users, applications=args.applications)
+        engine.dispose()
+
+        port = _free_port()
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port)],
+            cwd=args.app_dir,
+            env={**UNLIMITED, **os.environ, "DATABASE_URL": f"sqlite:///{path}"},
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            latencies, errors = asyncio.run(
+                _run(f"http://127.0.0.1:{port}", args.clients, args.duration)
+            )
+        finally:
+            server.terminate()
+            server.wait()
+
+    if not latencies:
+        print(f"no successful requests, {len(errors)} errors")
+        return
+
+    cuts = statistics.quantiles(latencies, n=100)
+    print(f"clients={args.clients} duration={args.duration}s")
+    print(f"requests={len(latencies)} errors={len(errors)}")
+    print(f"throughput={len(latencies) / args.duration:.1f} req/s")
+    print(f"p50={cuts[49]:.1f} ms p95={cuts[94]:.1f} ms p99={cuts[98]:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+import itertools
+import os
+import shutil
+import tempfile
+from datetime import date
+
+import pytest
+
+# pytest-benchmark microbenchmarks of every route handler, in-process through
+# the ASGI app on a seeded SQLite file. The file name keeps them out of a plain
+# pytest run; name it explicitly and keep the JSON to compare runs:
+#
+#     pytest benchmarks/handlers.py --benchmark-json=handlers.json
+#     pytest benchmarks/handlers.py --benchmark-compare --benchmark-autosave
+#
+# BENCH_USERS and BENCH_APPLICATIONS set the seeded size.
+
+BENCH_USERS = int(os.getenv("BENCH_USERS", 10_000))
+BENCH_APPLICATIONS = int(os.getenv("BENCH_APPLICATIONS", 100_000))
+
+# The app reads its settings on import, so they are set before it is imported.
+_tmp = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'handlers.db')}"
+# Every request reaches the handler instead of the response cache.
+os.environ.setdefault("RESPONSE_CACHE_SIZE", "0")
+# No rows move between the hot and archive tables while handlers are timed.
+os.environ.setdefault("ARCHIVE_INTERVAL", "0")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+
+from app import migrations  # noqa: E402
+from app.database import UserType  # noqa: E402
+from benchmarks.seed import role_ids, seed  # noqa: E402
+
+ROLE_IDS = role_ids(BENCH_USERS)
+SUPERADMIN = {"user-id": str(ROLE_IDS[UserType.SUPERADMIN][0])}
+PROJECT_ADMIN = {"user-id": str(ROLE_IDS[UserType.PROJECT_ADMIN][0])}
+REGULAR_ID = ROLE_IDS[UserType.REGULAR][0]
+REGULAR = {"user-id": str(REGULAR_ID)}
+
+# A month before the default archive horizon, read from both tables.
+_ARCHIVED_MONTH = f"{date.today().year - 2}-{date.today().month:02d}"
+
+_unique = itertools.count()
+# Response fields a write request does not send back.
+_SERVER_FIELDS = ("id", "tenant_id", "version")
+
+
+@pytest.fixture(scope="module")
+def client():
+    engine = create_engine(os.environ["DATABASE_URL"])
+    with engine.connect() as conn:
+        migrations.upgrade(conn)
+    seed(engine, tenants=10, users=BENCH_USERS, applications=BENCH_APPLICATIONS)
+    engine.dispose()
+
+    from app.main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
+    shutil.rmtree(_tmp, ignore_errors=True)
+
+
+@pytest.fixture(scope="module")
+def regular_user(client):
+    return client.get(f"/users/{REGULAR_ID}", headers=SUPERADMIN).json()
+
+
+def _new_user(template):
+    user = {k: v for k, v in template.items() if k not in _SERVER_FIELDS}
+    user.update(email=f"bench-{next(_unique)}@example.com", user_type="普通用户")
+    return user
+
+
+def _application(user_id):
+    return {
+        "application_date": date.today().isoformat(),
+        "target_product": "C",
+        "status": "申请中",
+        "user_id": user_id,
+    }
+
+
+def _ok(response):
+    assert response.status_code < 400, response.text
+    return response
+
+
+@pytest.mark.parametrize(
+    "path, headers",
+    [
+        ("/users?limit=100", SUPERADMIN),
+        ("/users?limit=100", PROJECT_ADMIN),
+        ("/users?limit=100", REGULAR),
+        ("/users?fields=id,name&limit=100", SUPERADMIN),
+        (f"/users?ids={','.join(map(str, range(1, 101)))}", PROJECT_ADMIN),
+        (f"/users/{REGULAR_ID}", SUPERADMIN),
+        ("/users/search?q=用户12", SUPERADMIN),
+        ("/users/search?q=研发 user1", PROJECT_ADMIN),
+        ("/users/search?q=产品经理", PROJECT_ADMIN),
+        ("/applications?limit=100", {}),
+        (f"/applications?month={date.today():%Y-%m}&limit=100", {}),
+        (f"/applications?month={_ARCHIVED_MONTH}&limit=100", {}),
+        ("/applications?project=项目0-0&limit=100", {}),
+        ("/applications?fields=status,target_product&limit=100", {}),
+        (f"/applications?ids={','.join(map(str, range(1, 101)))}", {}),
+        ("/tenants", SUPERADMIN),
+        ("/tenants/1", SUPERADMIN),
+        ("/tenants/1/usage?group_by=project", SUPERADMIN),
+        ("/usage/summary", SUPERADMIN),
+    ],
+    ids=lambda value: value if isinstance(value, str) else None,
+)
+def test_read(benchmark, client, path, headers):
+    benchmark(lambda: _ok(client.get(path, headers=headers)))
+
+
+def test_read_not_modified(benchmark, client):
+    etag = _ok(client.get("/users?limit=100", headers=SUPERADMIN)).headers["ETag"]
+    headers = {**SUPERADMIN, "If-None-Match": etag}
+    response = benchmark(lambda: client.get("/users?limit=100", headers=headers))
+    assert response.status_code == 304
+
+
+@pytest.mark.parametrize("path", ["/users/export", "/applications/export"])
+def test_export(benchmark, client, path):
+    benchmark.pedantic(
+        lambda: _ok(client.get(path, headers=SUPERADMIN)).content, rounds=3
+    )
+
+
+def test_create_user(benchmark, client, regular_user):
+    def run():
+        _ok(client.post("/users", json=_new_user(regular_user), headers=SUPERADMIN))
+
+    benchmark(run)
+
+
+def test_update_user(benchmark, client, regular_user):
+    user = {k: v for k, v in regular_user.items() if k not in _SERVER_FIELDS}
+    benchmark(
+        lambda: _ok(client.put(f"/users/{REGULAR_ID}", json=user, headers=SUPERADMIN))
+    )
+
+
+def test_delete_user(benchmark, client, regular_user):
+    def setup():
+        created = _ok(
+            client.post("/users", json=_new_user(regular_user), headers=SUPERADMIN)
+        )
+        return (created.json()["id"],), {}
+
+    benchmark.pedantic(
+        lambda user_id: _ok(client.delete(f"/users/{user_id}", headers=SUPERADMIN)),
+        setup=setup,
+        rounds=100,
+    )
+
+
+def test_increment_usage(benchmark, client):
+    body = {"tabs_accepted": 1, "premium_requests_used": 1}
+
+    def run():
+        _ok(client.post(f"/users/{REGULAR_ID}/usage", json=body, headers=REGULAR))
+
+    benchmark(run)
+
+
+@pytest.mark.parametrize("size", [100, 1000])
+def test_bulk_users(benchmark, client, regular_user, size):
+    def setup():
+        return ([_new_user(regular_user) for _ in range(size)],), {}
+
+    def run(items):
+        created = _ok(client.post("/users/bulk", json=items, headers=SUPERADMIN)).json()
+        ids = [item["id"] for item in created["items"]]
+        updates = [dict(item, id=user_id) for item, user_id in zip(items, ids)]
+        _ok(client.put("/users/bulk", json=updates, headers=SUPERADMIN))
+        _ok(client.request("DELETE", "/users/bulk", json=ids, headers=SUPERADMIN))
+
+    benchmark.pedantic(run, setup=setup, rounds=5)
+
+
+def test_create_application(benchmark, client):
+    benchmark(lambda: _ok(client.post("/applications", json=_application(REGULAR_ID))))
+
+
+def test_update_application(benchmark, client):
+    application_id = _ok(
+        client.post("/applications", json=_application(REGULAR_ID))
+    ).json()["id"]
+    body = _application(REGULAR_ID)
+    benchmark(lambda: _ok(client.put(f"/applications/{application_id}", json=body)))
+
+
+def test_delete_application(benchmark, client):
+    def setup():
+        created = _ok(client.post("/applications", json=_application(REGULAR_ID)))
+        return (created.json()["id"],), {}
+
+    benchmark.pedantic(
+        lambda application_id: _ok(client.delete(f"/applications/{application_id}")),
+        setup=setup,
+        rounds=100,
+    )
+
+
+@pytest.mark.parametrize("size", [100, 1000])
+def test_bulk_applications(benchmark, client, size):
+    items = [_application(REGULAR_ID) for _ in range(size)]
+
+    def run():
+        created = _ok(client.post("/applications/bulk", json=items)).json()
+        ids = [item["id"] for item in created["items"]]
+        updates = [dict(item, id=item_id) for item, item_id in zip(items, ids)]
+        _ok(client.put("/applications/bulk", json=updates))
+        _ok(client.request("DELETE", "/applications/bulk", json=ids))
+
+    benchmark.pedantic(run, rounds=5)
+
+
+def test_tenant_writes(benchmark, client):
+    def run():
+        name = f"压测租户{next(_unique)}"
+        tenant = _ok(
+            client.post(
+                "/tenants", json={"name": name, "update_cycle": 30}, headers=SUPERADMIN
+            )
+        ).json()
+        _ok(
+            client.put(
+                f"/tenants/{tenant['id']}",
+                json={"name": f"{name}-改", "update_cycle": 15},
+                headers=SUPERADMIN,
+            )
+        )
+        _ok(client.delete(f"/tenants/{tenant['id']}", headers=SUPERADMIN))
+
+    benchmark(run)
+
+
+def test_rebuild_usage(benchmark, client):
+    benchmark.pedantic(
+        lambda: _ok(client.post("/usage/rebuild", headers=SUPERADMIN)), rounds=5
+    )
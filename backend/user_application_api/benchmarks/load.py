@@ -0,0 +1,182 @@
+import argparse
+import csv
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import httpx
+from sqlalchemy import create_engine
+
+from app import migrations
+from benchmarks.concurrency import UNLIMITED, _free_port
+from benchmarks.seed import seed
+
+# Runs the locustfile scenario against a local uvicorn on a seeded SQLite file
+# and writes latency percentiles, throughput and statements per request to
+# JSON, for benchmarks.compare to diff between runs:
+#
+#     python -m benchmarks.load --clients 200 --duration 60 --output load.json
+#     python -m benchmarks.load --database bench.db --users 1000000 --output load.json
+
+LOCUSTFILE = os.path.join(os.path.dirname(__file__), "locustfile.py")
+
+
+def _wait_until_ready(base_url: str, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/healthz").status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("server did not become ready")
+
+
+def _statements(base_url: str) -> int:
+    return httpx.get(f"{base_url}/healthz/sql").json()["statements"]
+
+
+def _number(value: str) -> float:
+    return float(value) if value not in ("", "N/A") else 0.0
+
+
+def _read_stats(prefix: str) -> dict:
+    endpoints = []
+    total = None
+    with open(f"{prefix}_stats.csv", newline="") as stats:
+        for row in csv.DictReader(stats):
+            entry = {
+                "method": row["Type"],
+                "name": row["Name"],
+                "requests": int(row["Request Count"]),
+                "failures": int(row["Failure Count"]),
+                "rps": _number(row["Requests/s"]),
+                "avg_ms": _number(row["Average Response Time"]),
+                "p50_ms": _number(row["50%"]),
+                "p95_ms": _number(row["95%"]),
+                "p99_ms": _number(row["99%"]),
+            }
+            if row["Name"] == "Aggregated":
+                total = entry
+            else:
+                endpoints.append(entry)
+    return {"total": total, "endpoints": endpoints}
+
+
+def _git_commit(app_dir: str) -> str:
+    result = subprocess.run(
+        ["git", "rev-parse", "--short", "HEAD"],
+        cwd=app_dir,
+        capture_output=True,
+        text=True,
+    )
+    return result.stdout.strip() or "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Load a local uvicorn with the locust scenario."
+    )
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--spawn-rate", type=float, default=50.0)
+    parser.add_argument("--duration", type=int, default=60)
+    parser.add_argument("--tenants", type=int, default=100)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--applications", type=int, default=100_000)
+    parser.add_argument(
+        "--database", help="existing database seeded by benchmarks.seed with --users"
+    )
+    parser.add_argument("--app-dir", default=os.getcwd())
+    parser.add_argument("--output", default="load.json")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.database or os.path.join(tmp, "load.db")
+        if not args.database:
+            engine = create_engine(f"sqlite:///{path}")
+            with engine.connect() as conn:
+                migrations.upgrade(conn)
+            seed(engine, args.tenants, args.users, args.applications)
+            engine.dispose()
+
+        port = _free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port)],
+            cwd=args.app_dir,
+            env={
+                **UNLIMITED,
+                **os.environ,
+                "DATABASE_URL": f"sqlite:///{os.path.abspath(path)}",
+            },
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            _wait_until_ready(base_url)
+            statements_before = _statements(base_url)
+            prefix = os.path.join(tmp, "locust")
+            subprocess.run(
+                [
+                    sys.executable,
+                    "-m",
+                    "locust",
+                    "-f",
+                    LOCUSTFILE,
+                    "--headless",
+                    "--host",
+                    base_url,
+                    "--users",
+                    str(args.clients),
+                    "--spawn-rate",
+                    str(args.spawn_rate),
+                    "--run-time",
+                    f"{args.duration}s",
+                    "--csv",
+                    prefix,
+                    "--only-summary",
+                ],
+                env={**os.environ, "BENCH_USERS": str(args.users)},
+                check=False,
+            )
+            statements = _statements(base_url) - statements_before
+            results = _read_stats(prefix)
+        finally:
+            server.terminate()
+            server.wait()
+
+    requests = results["total"]["requests"] if results["total"] else 0
+    report = {
+        "run": {
+            "finished_at": datetime.now(timezone.utc).isoformat(),
+            "commit": _git_commit(args.app_dir),
+            "clients": args.clients,
+            "duration_s": args.duration,
+            "users": args.users,
+            "applications": args.applications if not args.database else None,
+            "database": args.database,
+        },
+        **results,
+        "statements": statements,
+        "statements_per_request": round(statements / requests, 2) if requests else 0.0,
+    }
+    with open(args.output, "w") as output:
+        json.dump(report, output, indent=2, ensure_ascii=False)
+
+    total = report["total"] or {}
+    print(
+        f"requests={requests} failures={total.get('failures', 0)} "
+        f"rps={total.get('rps', 0):.1f} p50={total.get('p50_ms', 0):.0f} ms "
+        f"p95={total.get('p95_ms', 0):.0f} ms p99={total.get('p99_ms', 0):.0f} ms "
+        f"statements/request={report['statements_per_request']}"
+    )
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+import os
+import random
+import uuid
+from datetime import date
+
+from locust import HttpUser, between, task
+
+from app.database import UserType
+from benchmarks.seed import role_ids
+
+# Mixed read/write traffic per role against a database seeded by
+# benchmarks.seed with BENCH_USERS users. Run through benchmarks.load, or on
+# its own against a running server:
+#
+#     BENCH_USERS=10000 locust -f benchmarks/locustfile.py --host http://127.0.0.1:8000
+
+ROLE_IDS = role_ids(int(os.getenv("BENCH_USERS", 10_000)))
+
+
+class _Caller(HttpUser):
+    abstract = True
+    wait_time = between(0.05, 0.5)
+    role = UserType.REGULAR
+
+    def on_start(self):
+        self.user_id = random.choice(ROLE_IDS[self.role])
+        self.headers = {"user-id": str(self.user_id)}
+        self.etags = {}
+        me = self.client.get(
+            f"/users/{self.user_id}", headers=self.headers, name="/users/{id}"
+        ).json()
+        self.project = me["project"]
+        self.tenant = me["tenant"]
+        self.tenant_id = me.get("tenant_id")
+
+    def poll(self, path, name=None):
+        # Dashboards revalidate with the ETag of their last copy.
+        headers = dict(self.headers)
+        if path in self.etags:
+            headers["If-None-Match"] = self.etags[path]
+        response = self.client.get(path, headers=headers, name=name or path)
+        if "ETag" in response.headers:
+            self.etags[path] = response.headers["ETag"]
+
+    def new_user(self):
+        return {
+            "name": "压测用户",
+            "email": f"load-{uuid.uuid4().hex}@example.com",
+            "tenant": self.tenant,
+            "department": "研发部",
+            "project": self.project,
+            "role": "开发工程师",
+            "tabs_accepted": 0,
+            "premium_requests_used": 0,
+        }
+
+    def create_and_delete_user(self):
+        created = self.client.post("/users", json=self.new_user(), headers=self.headers)
+        if created.status_code == 200:
+            user = created.json()
+            user["role"] = "测试工程师"
+            self.client.put(
+                f"/users/{user['id']}",
+                json=user,
+                headers=self.headers,
+                name="/users/{id}",
+            )
+            self.client.delete(
+                f"/users/{user['id']}", headers=self.headers, name="/users/{id}"
+            )
+
+    def search(self):
+        # A name prefix, as typed into a search box.
+        q = f"用户{random.randrange(1000)}"
+        self.client.get(
+            f"/users/search?q={q}&limit=20", headers=self.headers, name="/users/search"
+        )
+
+
+class Superadmin(_Caller):
+    weight = 1
+    role = UserType.SUPERADMIN
+
+    @task(5)
+    def users(self):
+        self.poll("/users?limit=100")
+
+    @task(3)
+    def search_users(self):
+        self.search()
+
+    @task(3)
+    def tenants(self):
+        self.poll("/tenants")
+
+    @task(3)
+    def applications(self):
+        month = f"{date.today():%Y-%m}"
+        self.poll(f"/applications?month={month}&limit=100", "/applications?month")
+
+    @task(2)
+    def usage_summary(self):
+        self.client.get("/usage/summary", headers=self.headers)
+
+    @task(1)
+    def write_users(self):
+        self.create_and_delete_user()
+
+
+class ProjectAdmin(_Caller):
+    weight = 3
+    role = UserType.PROJECT_ADMIN
+
+    @task(5)
+    def users(self):
+        self.poll("/users?limit=100")
+
+    @task(3)
+    def search_users(self):
+        self.search()
+
+    @task(3)
+    def applications(self):
+        path = f"/applications?project={self.project}&limit=100"
+        self.poll(path, "/applications?project")
+
+    @task(2)
+    def tenant_usage(self):
+        if self.tenant_id is not None:
+            self.client.get(
+                f"/tenants/{self.tenant_id}/usage?group_by=project",
+                headers=self.headers,
+                name="/tenants/{id}/usage",
+            )
+
+    @task(1)
+    def write_users(self):
+        self.create_and_delete_user()
+
+
+class Regular(_Caller):
+    weight = 16
+    role = UserType.REGULAR
+
+    @task(5)
+    def own_user(self):
+        self.poll("/users")
+
+    @task(3)
+    def applications(self):
+        path = f"/applications?project={self.project}&limit=100"
+        self.poll(path, "/applications?project")
+
+    @task(5)
+    def record_usage(self):
+        self.client.post(
+            f"/users/{self.user_id}/usage",
+            json={"tabs_accepted": random.randint(1, 5), "premium_requests_used": 1},
+            headers=self.headers,
+            name="/users/{id}/usage",
+        )
+
+    @task(1)
+    def apply(self):
+        self.client.post(
+            "/applications",
+            json={
+                "application_date": date.today().isoformat(),
+                "target_product": random.choice(["C", "W"]),
+                "status": "申请中",
+                "user_id": self.user_id,
+            },
+        )
@@ -0,0 +1,42 @@
+import argparse
+import sqlite3
+import time
+
+# Simulates a lagging read replica for two SQLite files: copies the primary
+# into the replica every --lag seconds, so the replica is up to that far
+# behind. Run it next to a server started with both URLs:
+#
+#     python -m benchmarks.replica sql_app.db replica.db --lag 2
+#     DATABASE_REPLICA_URL=sqlite:///./replica.db uvicorn app.main:app
+
+
+def copy(primary: str, replica: str) -> None:
+    source = sqlite3.connect(primary)
+    target = sqlite3.connect(replica, timeout=30)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Copy a SQLite primary on a delay.")
+    parser.add_argument("primary")
+    parser.add_argument("replica")
+    parser.add_argument("--lag", type=float, default=2.0)
+    parser.add_argument("--once", action="store_true")
+    args = parser.parse_args()
+
+    while True:
+        start = time.perf_counter()
+        copy(args.primary, args.replica)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        print(f"Copied {args.primary} to {args.replica} in {elapsed_ms:.0f} ms")
+        if args.once:
+            break
+        time.sleep(args.lag)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import MetaData, Table, create_engine, insert
+from sqlalchemy.engine import Engine
+
+from app import migrations
+from app.database import ApplicationStatus, TargetProduct, Tenant, UserType, month_key
+from app.search import build_index
+
+# Scales init_db()'s data to benchmark sizes. Also usable on its own, to keep a
+# seeded database between load runs:
+#
+#     python -m benchmarks.seed sqlite:///bench.db --tenants 10000 --users 1000000
+
+BATCH_SIZE = 50_000
+DEPARTMENTS = ["研发部", "产品部", "管理部", "市场部", "运营部"]
+ROLES = ["开发工程师", "产品经理", "测试工程师", "设计师"]
+
+
+def _batches(rows, size=BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def role_ids(users: int) -> dict:
+    # User ids per role as seed() assigns them: superadmins, then project
+    # admins, then regular users.
+    superadmins = max(1, users // 10_000)
+    admins = superadmins + max(1, users // 100)
+    return {
+        UserType.SUPERADMIN: range(1, superadmins + 1),
+        UserType.PROJECT_ADMIN: range(superadmins + 1, admins + 1),
+        UserType.REGULAR: range(admins + 1, users + 1),
+    }
+
+
+def seed(
+    engine: Engine,
+    tenants: int = 10,
+    users: int = 10_000,
+    applications: int = 100_000,
+    projects_per_tenant: int = 10,
+    days: int = 365,
+    random_seed: int = 0,
+):
+    # Same shape as init_db(), scaled up: tenant/project names are reused across
+    # users so filters hit realistic fractions of the table.
+    rng = random.Random(random_seed)
+    today = date.today()
+    roles = role_ids(users)
+
+    def user_rows():
+        for i in range(users):
+            tenant = i % tenants
+            user_type = next(role for role, ids in roles.items() if i + 1 in ids)
+            yield {
+                "id": i + 1,
+                "name": f"用户{i}",
+                "email": f"user{i}@example.com",
+                "tenant": f"租户{tenant}",
+                "tenant_id": tenant + 1,
+                "department": rng.choice(DEPARTMENTS),
+                "project": f"项目{tenant}-{rng.randrange(projects_per_tenant)}",
+                "role": rng.choice(ROLES),
+                "user_type": user_type.value,
+                "tabs_accepted": rng.randrange(100),
+                "premium_requests_used": rng.randrange(50),
+            }
+
+    def application_rows():
+        for i in range(applications):
+            day = today - timedelta(days=rng.randrange(days))
+            yield {
+                "id": i + 1,
+                "application_date": day,
+                "application_month": month_key(day),
+                "target_product": rng.choice(list(TargetProduct)).value,
+                "status": rng.choice(list(ApplicationStatus)).value,
+                "user_id": rng.randrange(users) + 1,
+            }
+
+    with engine.begin() as conn:
+        # Reflected, so older schema versions without users.tenant_id or
+        # applications.application_month work too.
+        users_table = Table("users", MetaData(), autoload_with=conn)
+        applications_table = Table("applications", MetaData(), autoload_with=conn)
+        conn.execute(
+            insert(Tenant),
+            [
+                {"id": i + 1, "name": f"租户{i}", "update_cycle": rng.choice([15, 30])}
+                for i in range(tenants)
+            ],
+        )
+        for table, rows in (
+            (users_table, user_rows()),
+            (applications_table, application_rows()),
+        ):
+            for batch in _batches(rows):
+                batch = [
+                    {k: v for k, v in row.items() if k in table.c} for row in batch
+                ]
+                conn.execute(insert(table), batch)
+        # Loaded without the API, so the search index is filled afterwards.
+        build_index(conn)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Create a database at the latest schema and seed it."
+    )
+    parser.add_argument("url", help="sync SQLAlchemy URL, e.g. sqlite:///bench.db")
+    parser.add_argument("--tenants", type=int, default=10_000)
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--applications", type=int, default=5_000_000)
+    parser.add_argument("--projects-per-tenant", type=int, default=10)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--random-seed", type=int, default=0)
+    args = parser.parse_args()
+
+    engine = create_engine(args.url)
+    with engine.connect() as conn:
+        migrations.upgrade(conn)
+    start = time.perf_counter()
+    seed(
+        engine,
+        tenants=args.tenants,
+        users=args.users,
+        applications=args.applications,
+        projects_per_tenant=args.projects_per_tenant,
+        days=args.days,
+        random_seed=args.random_seed,
+    )
+    engine.dispose()
+    print(f"Seeded in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import itertools
+import os
+import shutil
+import tempfile
+from datetime import date
+
+import pytest
+
+# The app reads its settings on import, so they are set before any test module
+# imports it. Every test shares one SQLite file, migrated and seeded by the
+# app's startup; tests create the rows they change.
+_tmp = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'tests.db')}"
+os.environ["ARCHIVE_INTERVAL"] = "0"
+
+SUPERADMIN = {"user-id": "1"}
+PROJECT_ADMIN = {"user-id": "2"}
+REGULAR = {"user-id": "3"}
+
+_unique = itertools.count()
+
+
+def new_user(**fields) -> dict:
+    # A POST /users body with an email no other test uses.
+    user = {
+        "name": "测试用户",
+        "email": f"test-{next(_unique)}@example.com",
+        "tenant": "租户A",
+        "department": "研发部",
+        "project": "项目1",
+        "role": "开发工程师",
+        "tabs_accepted": 0,
+        "premium_requests_used": 0,
+    }
+    user.update(fields)
+    return user
+
+
+def new_application(user_id: int = 3, **fields) -> dict:
+    application = {
+        "application_date": date.today().isoformat(),
+        "target_product": "C",
+        "status": "申请中",
+        "user_id": user_id,
+    }
+    application.update(fields)
+    return application
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
+    shutil.rmtree(_tmp, ignore_errors=True)
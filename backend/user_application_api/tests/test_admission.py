@@ -0,0 +1,141 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.admission import (
+    ANONYMOUS,
+    Admission,
+    AdmissionMiddleware,
+    admission,
+    caller_tenant,
+)
+
+
+def _limited(**limits):
+    # A one-route app behind admission control with the given limits; GET
+    # /slow holds its slots until released is set.
+    settings = dict(
+        tenant_rate=0,
+        tenant_burst=1,
+        tenant_concurrency=0,
+        route_concurrency=0,
+        queue_size=0,
+        queue_timeout=1.0,
+    )
+    settings.update(limits)
+    limiter = Admission(**settings)
+    app = FastAPI()
+    app.add_middleware(AdmissionMiddleware, admission=limiter)
+    app.state.released = asyncio.Event()
+
+    @app.get("/slow")
+    async def slow():
+        await app.state.released.wait()
+        return {"ok": True}
+
+    return app, limiter
+
+
+async def _while_one_is_held(app, limiter, until_answered=True):
+    # The response to a second request sent while a first holds its slots,
+    # until the second is answered or, otherwise, until it waits for a slot.
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        first = asyncio.create_task(client.get("/slow"))
+        while not limiter.stats()["admitted"]:
+            await asyncio.sleep(0.001)
+        second = asyncio.create_task(client.get("/slow"))
+        while not second.done() and (until_answered or not _waiting(limiter)):
+            await asyncio.sleep(0.001)
+        app.state.released.set()
+        assert (await first).status_code == 200
+        return await second
+
+
+def _waiting(limiter) -> int:
+    stats = limiter.stats()
+    return sum(
+        slots["waiting"]
+        for slots in [*stats["routes"].values(), *stats["tenants"].values()]
+    )
+
+
+def test_tenant_rate_answers_429():
+    app, limiter = _limited(tenant_rate=0.5, tenant_burst=1)
+    app.state.released.set()
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://t"
+        ) as client:
+            return [await client.get("/slow") for _ in range(2)]
+
+    first, second = asyncio.run(run())
+    assert first.status_code == 200
+    assert second.status_code == 429
+    assert second.headers["Retry-After"] == "2"
+    assert limiter.stats()["rejected"] == {"tenant_rate": 1}
+
+
+@pytest.mark.parametrize(
+    "limits, status, reason",
+    [
+        ({"route_concurrency": 1}, 503, "route_queue_full"),
+        (
+            {"route_concurrency": 1, "queue_size": 1, "queue_timeout": 0.05},
+            503,
+            "route_timeout",
+        ),
+        ({"tenant_concurrency": 1}, 429, "tenant_queue_full"),
+    ],
+)
+def test_concurrency_limits_shed_load(limits, status, reason):
+    app, limiter = _limited(**limits)
+    response = asyncio.run(_while_one_is_held(app, limiter))
+    assert response.status_code == status
+    assert response.headers["Retry-After"] == "1"
+    assert limiter.stats()["rejected"] == {reason: 1}
+    # Every slot was given back.
+    assert limiter.stats()["routes"] == {} and limiter.stats()["tenants"] == {}
+
+
+def test_queued_request_runs_when_a_slot_frees():
+    app, limiter = _limited(route_concurrency=1, queue_size=1)
+    response = asyncio.run(_while_one_is_held(app, limiter, until_answered=False))
+    assert response.status_code == 200
+    assert limiter.stats()["queued"] == {"route": 1}
+
+
+def test_rejections_are_labelled_by_route(client, monkeypatch):
+    monkeypatch.setattr(admission, "tenant_rate", 0.001)
+    monkeypatch.setattr(admission, "tenant_burst", 0)
+    monkeypatch.setattr(admission, "_buckets", {})
+    response = client.get("/applications/stats?month=2024-05")
+    assert response.status_code == 429
+    monkeypatch.undo()
+
+    metrics = client.get("/metrics").text
+    assert (
+        'http_requests_total{method="GET",route="/applications/stats",status="429"} 1'
+        in metrics
+    )
+    assert (
+        'admission_requests_total{outcome="rejected",reason="tenant_rate"}' in metrics
+    )
+
+
+def test_unknown_callers_are_looked_up_once(client, monkeypatch):
+    lookups = []
+
+    async def load_user(db, user_id):
+        lookups.append(user_id)
+        return None
+
+    monkeypatch.setattr("app.admission.load_user", load_user)
+    scope = {"headers": [(b"user-id", b"987654")]}
+    for _ in range(3):
+        assert client.portal.call(caller_tenant, scope) == ANONYMOUS
+    assert lookups == [987654]
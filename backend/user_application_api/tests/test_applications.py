@@ -0,0 +1,28 @@
+from app.sql_stats import statement_counter
+from tests.conftest import new_application
+
+
+def _statements(client, path: str) -> int:
+    before = statement_counter.stats()["statements"]
+    response = client.get(path)
+    assert response.status_code == 200, response.text
+    return statement_counter.stats()["statements"] - before
+
+
+def _add_applications(client, count: int) -> None:
+    items = [new_application(user_id=3 + i % 2) for i in range(count)]
+    response = client.post("/applications/bulk", json=items)
+    assert response.status_code < 400, response.text
+
+
+def test_list_statements_do_not_grow_with_rows(client):
+    # Rows and their users come from one joined query, so a page of 10x the
+    # applications costs the same statements.
+    _add_applications(client, 50)
+    small = _statements(client, "/applications?limit=1000")
+    _add_applications(client, 450)
+    large = _statements(client, "/applications?limit=1000")
+
+    assert small == large
+    # The change versions behind the ETag, then the page.
+    assert large == 2
@@ -0,0 +1,32 @@
+from tests.conftest import SUPERADMIN, new_user
+
+
+def _lookups(client) -> tuple:
+    stats = client.get("/healthz/auth-cache").json()
+    return stats["hits"], stats["misses"]
+
+
+def _get_self(client, user_id: int):
+    # Admission and the handler each look the caller up.
+    return client.get(f"/users/{user_id}", headers={"user-id": str(user_id)})
+
+
+def test_callers_are_looked_up_once_until_they_change(client):
+    user_id = client.post("/users", json=new_user(), headers=SUPERADMIN).json()["id"]
+
+    hits, misses = _lookups(client)
+    assert _get_self(client, user_id).status_code == 200
+    assert _lookups(client) == (hits + 1, misses + 1)
+    assert _get_self(client, user_id).status_code == 200
+    assert _lookups(client) == (hits + 3, misses + 1)
+
+    # A write to the user drops its entry, so the next request reads it again.
+    client.patch(f"/users/{user_id}", json={"name": "renamed"}, headers=SUPERADMIN)
+    hits, misses = _lookups(client)
+    assert _get_self(client, user_id).json()["name"] == "renamed"
+    assert _lookups(client) == (hits + 1, misses + 1)
+
+    client.delete(f"/users/{user_id}", headers=SUPERADMIN)
+    response = _get_self(client, user_id)
+    assert response.status_code == 404
+    assert response.json()["detail"] == "User not found"
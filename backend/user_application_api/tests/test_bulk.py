@@ -0,0 +1,93 @@
+from sqlalchemy import select
+
+from app.archive import archiver
+from app.database import Application, ArchivedApplication, SessionLocal
+from tests.conftest import SUPERADMIN, new_application, new_user
+
+
+def _create_users(client, count: int) -> list:
+    body = [new_user() for _ in range(count)]
+    response = client.post("/users/bulk", json=body, headers=SUPERADMIN).json()
+    return [item["id"] for item in response["items"]]
+
+
+def _user_ids(client, model, ids) -> dict:
+    # The user_id of each row, read from the database the app writes to.
+    async def read():
+        async with SessionLocal() as db:
+            rows = await db.execute(
+                select(model.id, model.user_id).filter(model.id.in_(ids))
+            )
+            return dict(rows.all())
+
+    return client.portal.call(read)
+
+
+def _statuses(response) -> list:
+    return [item["detail"] or item["status"] for item in response.json()["items"]]
+
+
+def test_bulk_delete_users_clears_their_applications(client):
+    user_ids = _create_users(client, 2)
+    application_ids = [
+        client.post("/applications", json=new_application(user_id)).json()["id"]
+        for user_id in user_ids
+    ]
+
+    response = client.request(
+        "DELETE", "/users/bulk", json=user_ids, headers=SUPERADMIN
+    )
+    assert _statuses(response) == ["deleted", "deleted"]
+    assert _user_ids(client, Application, application_ids) == {
+        application_id: None for application_id in application_ids
+    }
+
+
+def test_deleting_users_clears_their_archived_applications(client):
+    user_ids = _create_users(client, 2)
+    old = new_application(application_date="2000-01-15", status="已完成")
+    application_ids = [
+        client.post("/applications", json=dict(old, user_id=user_id)).json()["id"]
+        for user_id in user_ids
+    ]
+    # The newest application always stays in the hot table.
+    client.post("/applications", json=new_application())
+    client.portal.call(archiver.run)
+    assert _user_ids(client, ArchivedApplication, application_ids) == dict(
+        zip(application_ids, user_ids)
+    )
+
+    client.delete(f"/users/{user_ids[0]}", headers=SUPERADMIN)
+    client.request("DELETE", "/users/bulk", json=user_ids[1:], headers=SUPERADMIN)
+    assert _user_ids(client, ArchivedApplication, application_ids) == {
+        application_id: None for application_id in application_ids
+    }
+
+
+def test_bulk_delete_users_reports_each_bad_item(client):
+    (user_id,) = _create_users(client, 1)
+    body = [user_id, user_id, True, "1", 10**9]
+    response = client.request("DELETE", "/users/bulk", json=body, headers=SUPERADMIN)
+    assert _statuses(response) == [
+        "deleted",
+        "Duplicate user id",
+        "Expected a user id",
+        "Expected a user id",
+        "User not found",
+    ]
+    # True is not read as user 1.
+    assert client.get("/users/1", headers=SUPERADMIN).status_code == 200
+
+
+def test_bulk_delete_applications_reports_each_bad_item(client):
+    application_id = client.post("/applications", json=new_application()).json()["id"]
+    body = [application_id, application_id, True, 10**9]
+    response = client.request("DELETE", "/applications/bulk", json=body)
+    assert _statuses(response) == [
+        "deleted",
+        "Duplicate application id",
+        "Expected an application id",
+        "Application not found",
+    ]
+    # True is not read as application 1.
+    assert 1 in _user_ids(client, Application, [1])
@@ -0,0 +1,39 @@
+from app.response_cache import response_cache
+from tests.conftest import SUPERADMIN, new_user
+
+
+def test_matching_etag_is_not_modified(client):
+    first = client.get("/users?limit=100", headers=SUPERADMIN)
+    assert first.status_code == 200
+
+    headers = {**SUPERADMIN, "If-None-Match": first.headers["ETag"]}
+    second = client.get("/users?limit=100", headers=headers)
+    assert second.status_code == 304
+    assert second.headers["ETag"] == first.headers["ETag"]
+    assert second.content == b""
+
+
+def test_write_changes_etag(client):
+    first = client.get("/users?limit=1000", headers=SUPERADMIN)
+    created = client.post("/users", json=new_user(), headers=SUPERADMIN).json()
+
+    headers = {**SUPERADMIN, "If-None-Match": first.headers["ETag"]}
+    second = client.get("/users?limit=1000", headers=headers)
+    assert second.status_code == 200
+    assert second.headers["ETag"] != first.headers["ETag"]
+    assert created["id"] in {user["id"] for user in second.json()["items"]}
+
+
+def test_cached_body_is_not_served_after_another_process_writes(client, monkeypatch):
+    # A write made by another worker commits without dropping this process's
+    # cache entries.
+    client.get("/users?limit=1000", headers=SUPERADMIN)
+    monkeypatch.setattr(response_cache, "invalidate", _no_invalidation)
+    created = client.post("/users", json=new_user(), headers=SUPERADMIN).json()
+
+    listed = client.get("/users?limit=1000", headers=SUPERADMIN).json()
+    assert created["id"] in {user["id"] for user in listed["items"]}
+
+
+async def _no_invalidation(changes):
+    return 0
@@ -0,0 +1,79 @@
+import json
+
+from app.events import event_feed
+from app.routers.events import ENTITIES, _stream
+from tests.conftest import PROJECT_ADMIN, SUPERADMIN, new_user
+
+
+def _changes(client, user_id, after, count):
+    # The first count change events of the stream a caller resuming after
+    # that id receives.
+    async def read():
+        stream = _stream(user_id, ENTITIES, after)
+        events = []
+        try:
+            async for message in stream:
+                if message.startswith("id:"):
+                    fields = dict(
+                        line.split(": ", 1) for line in message.splitlines() if line
+                    )
+                    data = json.loads(fields["data"])
+                    events.append((fields["id"], fields["event"], data))
+                    if len(events) == count:
+                        return events
+        finally:
+            await stream.aclose()
+
+    # The feed lives in the event loop the app runs in.
+    return client.portal.call(read)
+
+
+def _last_id(client):
+    return client.portal.call(event_feed.backend.last_id)
+
+
+def test_changes_are_filtered_by_role(client):
+    start = _last_id(client)
+    other = client.post(
+        "/users", json=new_user(project="项目9"), headers=SUPERADMIN
+    ).json()
+    own = client.post(
+        "/users", json=new_user(project="项目1"), headers=SUPERADMIN
+    ).json()
+
+    seen = _changes(client, int(SUPERADMIN["user-id"]), start, 2)
+    assert [(event, data["id"]) for _, event, data in seen] == [
+        ("change", other["id"]),
+        ("change", own["id"]),
+    ]
+    assert seen[0][2]["op"] == "created"
+    assert "visible" not in seen[0][2]
+
+    # The project admin of 项目1 only sees the user created in 项目1.
+    seen = _changes(client, int(PROJECT_ADMIN["user-id"]), start, 1)
+    assert seen[0][2]["id"] == own["id"]
+
+
+def test_resume_after_last_event_id(client):
+    start = _last_id(client)
+    first = client.post("/users", json=new_user(), headers=SUPERADMIN).json()
+    second = client.patch(
+        f"/users/{first['id']}", json={"role": "设计师"}, headers=SUPERADMIN
+    ).json()
+
+    [(first_id, _, created)] = _changes(client, None, start, 1)
+    assert created["id"] == first["id"]
+    # Reconnecting with the id of the last event received continues after it.
+    [(_, _, updated)] = _changes(client, None, first_id, 1)
+    assert updated == {
+        "entity": "users",
+        "id": second["id"],
+        "op": "updated",
+        "fields": {"role": "设计师", "version": second["version"]},
+    }
+
+
+def test_unknown_event_id_resets(client):
+    [(_, event, data)] = _changes(client, None, "unknown-1", 1)
+    assert event == "reset"
+    assert data == {"last_id": _last_id(client)}
@@ -0,0 +1,70 @@
+import csv
+import io
+import json
+
+from tests.conftest import PROJECT_ADMIN, REGULAR, SUPERADMIN, new_application
+
+USER_COLUMNS = [
+    "id",
+    "name",
+    "email",
+    "tenant",
+    "department",
+    "project",
+    "role",
+    "user_type",
+    "tabs_accepted",
+    "premium_requests_used",
+]
+
+
+def _export(client, path: str, fmt: str, headers=SUPERADMIN):
+    response = client.get(path, params={"format": fmt}, headers=headers)
+    assert response.status_code == 200
+    return response
+
+
+def test_users_export_as_csv(client):
+    response = _export(client, "/users/export", "csv")
+    assert response.headers["content-type"].startswith("text/csv")
+    assert 'filename="users.csv"' in response.headers["content-disposition"]
+
+    header, *rows = csv.reader(io.StringIO(response.text))
+    assert header == USER_COLUMNS
+    listed = client.get("/users", params={"limit": 1000}, headers=SUPERADMIN)
+    assert [int(row[0]) for row in rows] == [
+        user["id"] for user in listed.json()["items"]
+    ]
+
+
+def test_users_export_as_ndjson_is_scoped_by_role(client):
+    def exported(headers) -> list:
+        response = _export(client, "/users/export", "ndjson", headers)
+        assert response.headers["content-type"] == "application/x-ndjson"
+        return [json.loads(line) for line in response.text.splitlines()]
+
+    (own,) = exported(REGULAR)
+    assert own["id"] == 3 and list(own) == USER_COLUMNS
+    # Project admins see their project and the superadmins, not user 4.
+    visible = exported(PROJECT_ADMIN)
+    assert {1, 2, 3} <= {user["id"] for user in visible}
+    assert all(
+        user["project"] == "项目1" or user["user_type"] == "超级管理员"
+        for user in visible
+    )
+    assert 4 in {user["id"] for user in exported(SUPERADMIN)}
+
+
+def test_applications_export_filters_by_month(client):
+    created = client.post(
+        "/applications", json=new_application(application_date="1999-07-04")
+    ).json()
+    response = client.get(
+        "/applications/export", params={"month": "1999-07", "format": "ndjson"}
+    )
+    assert response.status_code == 200
+    assert 'filename="applications-1999-07.ndjson"' in (
+        response.headers["content-disposition"]
+    )
+    (row,) = [json.loads(line) for line in response.text.splitlines()]
+    assert row["id"] == created["id"]
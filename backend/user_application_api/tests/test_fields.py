@@ -0,0 +1,41 @@
+from tests.conftest import PROJECT_ADMIN, REGULAR, SUPERADMIN, new_application
+
+
+def _lookup(client, path: str, headers=SUPERADMIN, **params) -> list:
+    response = client.get(path, params=params, headers=headers)
+    assert response.status_code == 200
+    return response.json()["items"]
+
+
+def test_id_lookups_leave_out_hidden_rows(client):
+    ids = "4,3,2,1,999999"
+    assert [user["id"] for user in _lookup(client, "/users", ids=ids)] == [1, 2, 3, 4]
+    # User 4 is in another project than the project admin.
+    assert [
+        user["id"] for user in _lookup(client, "/users", PROJECT_ADMIN, ids=ids)
+    ] == [1, 2, 3]
+    assert [user["id"] for user in _lookup(client, "/users", REGULAR, ids=ids)] == [3]
+
+
+def test_fields_narrow_the_rows(client):
+    names = [user["name"] for user in _lookup(client, "/users", ids="1,3")]
+    assert _lookup(client, "/users", ids="1,3", fields="name") == [
+        {"id": 1, "name": names[0]},
+        {"id": 3, "name": names[1]},
+    ]
+
+    created = client.post("/applications", json=new_application()).json()
+    (application,) = _lookup(
+        client, "/applications", ids=str(created["id"]), fields="status"
+    )
+    assert application == {
+        "id": created["id"],
+        "application_date": created["application_date"],
+        "status": created["status"],
+    }
+
+
+def test_bad_lookups_are_refused(client):
+    for params in ({"ids": "1,x"}, {"fields": "name,password"}):
+        response = client.get("/users", params=params, headers=SUPERADMIN)
+        assert response.status_code == 400
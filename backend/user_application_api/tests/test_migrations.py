@@ -0,0 +1,43 @@
+import os
+import shutil
+
+import pytest
+from sqlalchemy import create_engine, inspect
+
+from app import migrations
+
+# The database committed with the app, created before schema_version existed.
+BASELINE_DB = os.path.join(os.path.dirname(__file__), os.pardir, "sql_app.db")
+LATEST = migrations.MIGRATIONS[-1][0]
+
+
+def _upgrade(path, target=None):
+    engine = create_engine(f"sqlite:///{path}")
+    try:
+        with engine.connect() as conn:
+            version = migrations.upgrade(conn, target)
+            tables = set(inspect(conn).get_table_names())
+    finally:
+        engine.dispose()
+    return version, tables
+
+
+def test_upgrade_empty_database(tmp_path):
+    version, tables = _upgrade(tmp_path / "empty.db")
+    assert version == LATEST
+    assert {"users", "applications", "applications_archive", "user_search"} <= tables
+
+
+def test_upgrade_baseline_database(tmp_path):
+    path = tmp_path / "baseline.db"
+    shutil.copy(BASELINE_DB, path)
+    assert _upgrade(path)[0] == LATEST
+    # A second run finds nothing left to do.
+    assert _upgrade(path)[0] == LATEST
+
+
+@pytest.mark.parametrize("start", range(1, LATEST))
+def test_upgrade_from_each_version(tmp_path, start):
+    path = tmp_path / "partial.db"
+    assert _upgrade(path, start)[0] == start
+    assert _upgrade(path)[0] == LATEST
@@ -0,0 +1,43 @@
+from tests.conftest import SUPERADMIN, new_application, new_user
+
+
+def _pages(client, path: str, limit: int, headers=SUPERADMIN) -> list:
+    # Follows next_cursor to the end, returning the ids of each page.
+    pages, params = [], {"limit": limit}
+    while True:
+        response = client.get(path, params=params, headers=headers)
+        assert response.status_code == 200
+        body = response.json()
+        pages.append([item["id"] for item in body["items"]])
+        if body["next_cursor"] is None:
+            return pages
+        params["cursor"] = body["next_cursor"]
+
+
+def test_user_pages_cover_the_list_once(client):
+    for _ in range(3):
+        client.post("/users", json=new_user(), headers=SUPERADMIN)
+    everything = client.get("/users", params={"limit": 1000}, headers=SUPERADMIN)
+    ids = [user["id"] for user in everything.json()["items"]]
+
+    pages = _pages(client, "/users", 2)
+    assert all(len(page) == 2 for page in pages[:-1])
+    assert [user_id for page in pages for user_id in page] == ids
+    assert ids == sorted(ids)
+
+
+def test_application_pages_follow_date_then_id(client):
+    for date in ("2001-03-02", "2001-03-01", "2001-03-02"):
+        client.post("/applications", json=new_application(application_date=date))
+    everything = client.get("/applications", params={"limit": 1000}).json()["items"]
+    ids = [application["id"] for application in everything]
+    keys = [(item["application_date"], item["id"]) for item in everything]
+
+    pages = _pages(client, "/applications", 2)
+    assert [application_id for page in pages for application_id in page] == ids
+    assert keys == sorted(keys)
+
+
+def test_a_bad_cursor_is_refused(client):
+    response = client.get("/users", params={"cursor": "nope"}, headers=SUPERADMIN)
+    assert response.status_code == 400
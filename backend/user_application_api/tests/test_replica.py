@@ -0,0 +1,44 @@
+import time
+
+from app import config, database
+from tests.conftest import SUPERADMIN, new_user
+
+
+class _Replica:
+    # Stands in for the replica's sessionmaker, counting the reads sent to
+    # it; the sessions are the primary's, so every read finds the rows.
+
+    def __init__(self):
+        self.sessions = 0
+
+    def __call__(self):
+        self.sessions += 1
+        return database.SessionLocal()
+
+
+def test_reads_follow_a_write_to_the_primary_until_it_expires(client, monkeypatch):
+    replica = _Replica()
+    monkeypatch.setattr(database, "ReplicaSessionLocal", replica)
+    monkeypatch.setattr(config, "REPLICA_STICKY_SECONDS", 1)
+    client.cookies.clear()
+    try:
+        assert client.get("/users/1", headers=SUPERADMIN).status_code == 200
+        assert replica.sessions == 1
+
+        created = client.post("/users", json=new_user(), headers=SUPERADMIN)
+        assert created.headers[database.READ_PRIMARY_HEADER] == "1"
+        path = f"/users/{created.json()['id']}"
+        assert client.get(path, headers=SUPERADMIN).status_code == 200
+        assert replica.sessions == 1
+
+        # The cookie lasts REPLICA_STICKY_SECONDS.
+        time.sleep(1.1)
+        assert client.get(path, headers=SUPERADMIN).status_code == 200
+        assert replica.sessions == 2
+
+        # Clients that do not keep cookies send the header back instead.
+        headers = {**SUPERADMIN, database.READ_PRIMARY_HEADER: "1"}
+        assert client.get(path, headers=headers).status_code == 200
+        assert replica.sessions == 2
+    finally:
+        client.cookies.clear()
@@ -0,0 +1,136 @@
+import asyncio
+import fnmatch
+
+from app.response_cache import RedisBackend, ResponseCache
+from app.versions import Changes
+
+
+def _bytes(value) -> bytes:
+    return value if isinstance(value, bytes) else str(value).encode()
+
+
+class FakeRedis:
+    # The part of the redis.asyncio client RedisBackend uses, over a dict,
+    # returning bytes as Redis does. Keys expire when now passes their TTL.
+
+    def __init__(self):
+        self.now = 0.0
+        self.data = {}
+        self.expires = {}
+
+    def _live(self, key):
+        key = _bytes(key)
+        if key in self.expires and self.expires[key] <= self.now:
+            self.data.pop(key, None)
+            del self.expires[key]
+        return key
+
+    async def hmget(self, key, *fields):
+        entry = self.data.get(self._live(key), {})
+        return [entry.get(_bytes(field)) for field in fields]
+
+    def hset(self, key, mapping):
+        entry = self.data.setdefault(self._live(key), {})
+        entry.update({_bytes(name): _bytes(value) for name, value in mapping.items()})
+
+    def expire(self, key, seconds):
+        self.expires[_bytes(key)] = self.now + seconds
+
+    def sadd(self, key, *members):
+        self.data.setdefault(self._live(key), set()).update(map(_bytes, members))
+
+    def smembers(self, key):
+        return set(self.data.get(self._live(key), ()))
+
+    def hstrlen(self, key, field):
+        return len(self.data.get(self._live(key), {}).get(_bytes(field), b""))
+
+    async def delete(self, *keys):
+        return sum(self.data.pop(_bytes(key), None) is not None for key in keys)
+
+    async def scan_iter(self, match):
+        for key in list(self.data):
+            if key in self.data and fnmatch.fnmatchcase(
+                self._live(key).decode(), match
+            ):
+                yield key
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    # Queues calls and runs them on execute, returning their results.
+
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        method = getattr(self.client, name)
+        return lambda *args, **kwargs: self.calls.append((method, args, kwargs))
+
+    async def execute(self):
+        calls, self.calls = self.calls, []
+        return [method(*args, **kwargs) for method, args, kwargs in calls]
+
+
+def _changes(project: str) -> Changes:
+    changes = Changes()
+    changes.application(project)
+    return changes
+
+
+def test_redis_backend_round_trip():
+    async def run():
+        redis = FakeRedis()
+        cache = ResponseCache(RedisBackend(redis, ttl=60))
+        key = cache.key("applications", "project:项目1")
+        await cache.store(key, "applications", ["project:项目1"], '"v1"', None, [1])
+
+        hit = await cache.lookup(key, '"v1"')
+        assert hit.body == b"[1]" and hit.headers["ETag"] == '"v1"'
+        # A body built at another version is never served.
+        assert await cache.lookup(key, '"v2"') is None
+        assert (await cache.stats())["entries"] == 1
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    asyncio.run(run())
+
+
+def test_redis_backend_entries_expire():
+    async def run():
+        redis = FakeRedis()
+        backend = RedisBackend(redis, ttl=0.2)
+        await backend.set("[1]", ["users|*"], '"v1"', b"{}")
+        # Redis TTLs are whole seconds, so the TTL is rounded up to one.
+        assert set(redis.expires.values()) == {1}
+        assert await backend.get("[1]") == ('"v1"', b"{}")
+
+        redis.now = 1
+        assert await backend.get("[1]") is None
+        assert await backend.sizes() == {}
+
+    asyncio.run(run())
+
+
+def test_redis_backend_invalidates_by_tag():
+    async def run():
+        cache = ResponseCache(RedisBackend(FakeRedis(), ttl=60))
+        for project in ("项目1", "项目2"):
+            key = cache.key("applications", project)
+            await cache.store(
+                key, "applications", [f"project:{project}"], '"v1"', None, []
+            )
+
+        assert await cache.invalidate(_changes("项目1")) == 1
+        assert await cache.lookup(cache.key("applications", "项目1"), '"v1"') is None
+        assert await cache.lookup(cache.key("applications", "项目2"), '"v1"')
+
+    asyncio.run(run())
@@ -0,0 +1,32 @@
+from app import config
+from tests.conftest import PROJECT_ADMIN, REGULAR, SUPERADMIN, new_user
+
+
+def _search(client, q: str, headers=SUPERADMIN) -> list:
+    response = client.get("/users/search", params={"q": q}, headers=headers)
+    assert response.status_code == 200
+    return [user["id"] for user in response.json()["items"]]
+
+
+def test_best_matches_are_kept_over_the_cap(client, monkeypatch):
+    # The role match is created first, so it comes first in index order.
+    by_role = client.post(
+        "/users", json=new_user(role="qzranker"), headers=SUPERADMIN
+    ).json()["id"]
+    by_name = client.post(
+        "/users", json=new_user(name="qzranker"), headers=SUPERADMIN
+    ).json()["id"]
+
+    assert _search(client, "qzranker") == [by_name, by_role]
+    monkeypatch.setattr(config, "SEARCH_MAX_MATCHES", 1)
+    assert _search(client, "qzrank") == [by_name]
+
+
+def test_search_is_scoped_like_the_user_list(client):
+    other_project = client.post(
+        "/users", json=new_user(name="qzscoped", project="项目2"), headers=SUPERADMIN
+    ).json()["id"]
+
+    assert _search(client, "qzscoped") == [other_project]
+    assert _search(client, "qzscoped", PROJECT_ADMIN) == []
+    assert _search(client, "qzscoped", REGULAR) == []
@@ -0,0 +1,32 @@
+from tests.conftest import SUPERADMIN, new_user
+
+
+def test_users_follow_their_tenant_by_id(client):
+    tenant = client.post(
+        "/tenants", json={"name": "qz租户", "update_cycle": 30}, headers=SUPERADMIN
+    ).json()
+    user = client.post(
+        "/users", json=new_user(tenant="qz租户"), headers=SUPERADMIN
+    ).json()
+    assert user["tenant_id"] == tenant["id"]
+
+    renamed = client.put(
+        f"/tenants/{tenant['id']}",
+        json={"name": "qz租户2", "update_cycle": 30},
+        headers=SUPERADMIN,
+    )
+    assert renamed.status_code == 200
+    user = client.get(f"/users/{user['id']}", headers=SUPERADMIN).json()
+    assert (user["tenant"], user["tenant_id"]) == ("qz租户2", tenant["id"])
+
+    # The old name no longer resolves, from the cache or the table.
+    response = client.post("/users", json=new_user(tenant="qz租户"), headers=SUPERADMIN)
+    assert (response.status_code, response.json()["detail"]) == (
+        400,
+        "Tenant not found",
+    )
+
+    response = client.delete(f"/tenants/{tenant['id']}", headers=SUPERADMIN)
+    assert response.status_code == 400
+    client.delete(f"/users/{user['id']}", headers=SUPERADMIN)
+    assert client.delete(f"/tenants/{tenant['id']}", headers=SUPERADMIN).is_success
@@ -0,0 +1,40 @@
+from app.usage_buffer import usage_buffer
+from tests.conftest import SUPERADMIN, new_user
+
+
+def _usage(client, tenant_id: int) -> dict:
+    response = client.get(
+        f"/tenants/{tenant_id}/usage",
+        params={"group_by": "department"},
+        headers=SUPERADMIN,
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_rollups_follow_users_and_usage(client):
+    user = client.post(
+        "/users", json=new_user(department="qzrollup"), headers=SUPERADMIN
+    ).json()
+    for tabs, premium in ((10, 1), (5, 2)):
+        client.post(
+            f"/users/{user['id']}/usage",
+            json={"tabs_accepted": tabs, "premium_requests_used": premium},
+            headers=SUPERADMIN,
+        )
+    client.portal.call(usage_buffer.flush)
+
+    usage = _usage(client, user["tenant_id"])
+    groups = {group["department"]: group for group in usage["groups"]}
+    assert groups["qzrollup"] == {
+        "department": "qzrollup",
+        "project": None,
+        "users": 1,
+        "tabs_accepted": 15,
+        "premium_requests_used": 3,
+    }
+    assert usage["totals"]["users"] == sum(group["users"] for group in groups.values())
+
+    # The rollups kept up incrementally match a rebuild from the users table.
+    assert client.post("/usage/rebuild", headers=SUPERADMIN).status_code == 200
+    assert _usage(client, user["tenant_id"]) == usage
@@ -0,0 +1,151 @@
+import uuid
+
+import pytest
+
+from app.concurrency import compare_and_set_many
+from app.database import Application, SessionLocal
+from app.events import event_feed
+from app.usage_buffer import usage_buffer
+from tests.conftest import SUPERADMIN, new_application, new_user
+
+
+def _count(client, path: str, headers=None) -> int:
+    return len(client.get(f"{path}?limit=1000", headers=headers).json()["items"])
+
+
+@pytest.fixture
+def user(client):
+    return client.post("/users", json=new_user(), headers=SUPERADMIN).json()
+
+
+@pytest.fixture
+def application(client):
+    return client.post("/applications", json=new_application()).json()
+
+
+def test_stale_user_version_conflicts(client, user):
+    path = f"/users/{user['id']}"
+    current = client.patch(path, json={"role": "设计师"}, headers=SUPERADMIN).json()
+    assert current["version"] == user["version"] + 1
+
+    stale = {"role": "测试工程师", "version": user["version"]}
+    response = client.patch(path, json=stale, headers=SUPERADMIN)
+    assert response.status_code == 409
+    assert client.get(path, headers=SUPERADMIN).json() == current
+
+
+def test_stale_application_version_conflicts(client, application):
+    path = f"/applications/{application['id']}"
+    current = client.patch(path, json={"status": "已完成"}).json()
+
+    body = dict(new_application(target_product="W"), version=application["version"])
+    response = client.put(path, json=body)
+    assert response.status_code == 409
+    row = client.get(f"/applications?ids={application['id']}").json()["items"][0]
+    assert row == current
+
+
+def test_admin_writes_leave_usage_counters_alone(client, user):
+    path = f"/users/{user['id']}"
+    increment = {"tabs_accepted": 3, "premium_requests_used": 1}
+    assert client.post(f"{path}/usage", json=increment, headers=SUPERADMIN).is_success
+
+    body = dict(user, role="设计师", tabs_accepted=0, premium_requests_used=0)
+    del body["version"]
+    assert client.put(path, json=body, headers=SUPERADMIN).is_success
+    response = client.patch(path, json={"tabs_accepted": 0}, headers=SUPERADMIN)
+    assert response.status_code == 422
+    bulk = client.put("/users/bulk", json=[body], headers=SUPERADMIN).json()
+    assert bulk["succeeded"] == 1
+
+    client.portal.call(usage_buffer.flush)
+    row = client.get(path, headers=SUPERADMIN).json()
+    assert (row["tabs_accepted"], row["premium_requests_used"]) == (3, 1)
+
+
+def test_versioned_application_write_explains_a_miss(client, application):
+    path = f"/applications/{application['id']}"
+    client.patch(path, json={"status": "已完成"})
+
+    stale = {"target_product": "W", "version": application["version"]}
+    response = client.patch(path, json=stale)
+    assert response.status_code == 409
+    current = application["version"] + 1
+    assert response.json()["detail"] == (
+        f"Version conflict: the current version is {current}"
+    )
+    response = client.patch("/applications/999999999", json=stale)
+    assert response.status_code == 404
+
+
+def test_bulk_update_skips_rows_changed_since_read(client):
+    ids = [
+        client.post("/applications", json=new_application()).json()["id"]
+        for _ in range(2)
+    ]
+
+    async def write():
+        # The second row is read at a version another request has moved past.
+        async with SessionLocal() as db:
+            rows = [{"id": row_id, "status": "已完成", "version": 2} for row_id in ids]
+            changed = await compare_and_set_many(
+                db, Application, rows, {ids[0]: 1, ids[1]: 0}
+            )
+            await db.commit()
+            return changed
+
+    assert client.portal.call(write) == {ids[1]}
+    rows = client.get(f"/applications?ids={ids[0]},{ids[1]}").json()["items"]
+    assert [(row["status"], row["version"]) for row in rows] == [
+        ("已完成", 2),
+        ("申请中", 1),
+    ]
+
+
+@pytest.mark.parametrize(
+    "path, body, headers",
+    [
+        ("/users", new_user(), SUPERADMIN),
+        ("/applications", new_application(), {}),
+    ],
+)
+def test_idempotency_key_replays_without_writing(client, path, body, headers):
+    headers = {**headers, "Idempotency-Key": str(uuid.uuid4())}
+    first = client.post(path, json=body, headers=headers)
+    assert first.status_code == 200
+    rows = _count(client, path, SUPERADMIN)
+
+    retry = client.post(path, json=body, headers=headers)
+    assert retry.status_code == 200
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json() == first.json()
+    assert _count(client, path, SUPERADMIN) == rows
+
+
+@pytest.mark.parametrize(
+    "path, body, other, headers",
+    [
+        ("/users", new_user(), new_user(), SUPERADMIN),
+        ("/applications", new_application(), new_application(status="已完成"), {}),
+    ],
+)
+def test_idempotency_key_reused_with_other_body(client, path, body, other, headers):
+    headers = {**headers, "Idempotency-Key": str(uuid.uuid4())}
+    assert client.post(path, json=body, headers=headers).status_code == 200
+    rows = _count(client, path, SUPERADMIN)
+
+    response = client.post(path, json=other, headers=headers)
+    assert response.status_code == 422
+    assert _count(client, path, SUPERADMIN) == rows
+
+
+def test_empty_patch_is_refused(client, user, application):
+    published = event_feed.published
+    for path, headers, row in (
+        (f"/users/{user['id']}", SUPERADMIN, user),
+        (f"/applications/{application['id']}", {}, application),
+    ):
+        response = client.patch(path, json={"version": row["version"]}, headers=headers)
+        assert response.status_code == 422
+    assert client.get(f"/users/{user['id']}", headers=SUPERADMIN).json() == user
+    assert event_feed.published == published